@@ -0,0 +1,175 @@
+"""상담/가이드 통계용 열 기반 스냅숏과 집계.
+
+상담 인덱스(history_index)와 가이드 저장소(guide_store)의 메타데이터를 pandas DataFrame 하나씩으로
+모아 두고, 상담원별 상담 수/평균 상담 시간/상담당 메시지 수와 가이드 원인 분포를 벡터 연산으로 집계합니다.
+
+- 상담 스냅숏: 인덱스 세대가 바뀌면 (mtime_ns, size)가 달라진 행과 새로 생기거나 사라진 행만 고칩니다.
+  파일은 다시 읽지 않습니다 (메타데이터는 인덱스가 이미 가지고 있습니다).
+- 보관 스냅숏: 보관된 상담(history_archive)의 색인에서 만들며, 색인 파일이 바뀌면 다시 만듭니다.
+- 가이드 스냅숏: 저장소 버전이 바뀌면 메모리에 있는 가이드 목록에서 다시 만듭니다.
+
+반환된 DataFrame은 여러 세션이 함께 보므로 호출하는 쪽에서 수정하면 안 됩니다.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+import guide_store
+import history_archive
+import history_index
+import metrics
+
+# --- 상수 정의 ---
+HISTORY_COLUMNS = ("title", "counselor", "start", "end", "duration_min", "message_count", "mtime_ns", "size")
+GUIDE_COLUMNS = ("cause", "counselor", "created")
+UNKNOWN_COUNSELOR = "미지정"
+UNKNOWN_CAUSE = "미분류"
+
+_lock = threading.Lock()
+_history_snapshots = {}  # history_dir -> (인덱스 세대, DataFrame: 경로 -> HISTORY_COLUMNS)
+_archive_snapshots = {}  # history_dir -> (보관 색인 버전, DataFrame: 이름 -> HISTORY_COLUMNS)
+_guide_snapshots = {}  # db_path -> (저장소 버전, DataFrame: GUIDE_COLUMNS)
+
+
+# --- 스냅숏: 상담 ---
+def _history_frame(entries):
+    """[(경로, 인덱스 항목), ...] -> DataFrame. 날짜 변환과 상담 시간 계산은 열 단위로 합니다."""
+    paths = [path for path, _ in entries]
+    metas = [entry for _, entry in entries]
+    start = pd.to_datetime(pd.Series([m.get("start_time") for m in metas], index=paths, dtype=object), errors="coerce")
+    end = pd.to_datetime(pd.Series([m.get("end_time") for m in metas], index=paths, dtype=object), errors="coerce")
+    duration = (end - start).dt.total_seconds() / 60
+    frame = pd.DataFrame({
+        "title": [m.get("title", "") for m in metas],
+        "counselor": [m.get("counselor_name") or UNKNOWN_COUNSELOR for m in metas],
+        "start": start, "end": end,
+        "duration_min": duration.where(duration >= 0),
+        "message_count": np.array([m.get("message_count", 0) for m in metas], dtype=np.int64),
+        "mtime_ns": np.array([m.get("mtime_ns", 0) for m in metas], dtype=np.int64),
+        "size": np.array([m.get("size", 0) for m in metas], dtype=np.int64),
+    }, index=pd.Index(paths, name="path"))
+    return frame
+
+@metrics.timed("analytics.history_snapshot")
+def history_snapshot(history_dir):
+    """상담 메타데이터 DataFrame (인덱스: 경로). 인덱스 세대가 그대로면 이전 스냅숏을 그대로 씁니다."""
+    generation = history_index.generation(history_dir)
+    with _lock:
+        cached = _history_snapshots.get(history_dir)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+        entries = history_index.list_entries(history_dir)
+        if cached is None:
+            frame = _history_frame(entries)
+            metrics.count("analytics.rebuilt_rows", len(frame))
+        else:
+            frame = cached[1]
+            current = pd.DataFrame(
+                {"mtime_ns": [e.get("mtime_ns", 0) for _, e in entries], "size": [e.get("size", 0) for _, e in entries]},
+                index=[path for path, _ in entries],
+            )
+            known = frame[["mtime_ns", "size"]].reindex(current.index)
+            changed = current.index[(known["mtime_ns"] != current["mtime_ns"]) | (known["size"] != current["size"])]
+            removed = frame.index.difference(current.index)
+            if len(changed) or len(removed):
+                changed_set = set(changed)
+                updated = _history_frame([(path, entry) for path, entry in entries if path in changed_set])
+                frame = pd.concat([frame.drop(index=changed.union(removed), errors="ignore"), updated])
+            metrics.count("analytics.rebuilt_rows", len(changed))
+        _history_snapshots[history_dir] = (generation, frame)
+        return frame
+
+@metrics.timed("analytics.archive_snapshot")
+def archive_snapshot(history_dir):
+    """보관된 상담의 메타데이터 DataFrame (인덱스: 상담 이름). 열은 history_snapshot()과 같습니다."""
+    version = history_archive.version(history_dir)
+    with _lock:
+        cached = _archive_snapshots.get(history_dir)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        frame = _history_frame(history_archive.list_entries(history_dir))
+        _archive_snapshots[history_dir] = (version, frame)
+        return frame
+
+def consultation_snapshot(history_dir):
+    """history 폴더의 상담과 보관된 상담을 합친 DataFrame."""
+    hot, archived = history_snapshot(history_dir), archive_snapshot(history_dir)
+    return pd.concat([hot, archived]) if not archived.empty else hot
+
+
+# --- 스냅숏: 가이드 ---
+@metrics.timed("analytics.guide_snapshot")
+def guide_snapshot(db_path):
+    """가이드 메타데이터 DataFrame (원인, 작성 상담원, 작성 시각)."""
+    version = guide_store.get_version(db_path)
+    with _lock:
+        cached = _guide_snapshots.get(db_path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        guides = guide_store.list_guides(db_path)
+        frame = pd.DataFrame({
+            "cause": [g.get("cause") or UNKNOWN_CAUSE for g in guides],
+            "counselor": [g.get("counselor_name") or UNKNOWN_COUNSELOR for g in guides],
+            "created": pd.to_datetime(pd.Series([g.get("created_at") for g in guides], dtype=object), errors="coerce"),
+        })
+        _guide_snapshots[db_path] = (version, frame)
+        return frame
+
+
+# --- 집계 ---
+def _in_period(dates, date_from=None, date_to=None):
+    """날짜 열이 [date_from, date_to] (포함, 'YYYY-MM-DD')에 드는 행의 마스크. 날짜가 없으면 범위 지정 시 제외합니다."""
+    mask = np.ones(len(dates), dtype=bool)
+    days = dates.dt.normalize()
+    if date_from:
+        mask &= (days >= pd.Timestamp(date_from)).to_numpy()
+    if date_to:
+        mask &= (days <= pd.Timestamp(date_to)).to_numpy()
+    return mask
+
+def filter_histories(frame, date_from=None, date_to=None):
+    """시작 시각 기준으로 기간에 드는 상담만 남깁니다."""
+    if not (date_from or date_to):
+        return frame
+    return frame[_in_period(frame["start"], date_from, date_to)]
+
+def counselor_summary(frame):
+    """상담원별 상담 수, 종료된 상담 수, 평균 상담 시간(분), 상담당 평균/전체 메시지 수."""
+    if frame.empty:
+        return pd.DataFrame(columns=["상담원", "상담 수", "종료된 상담", "평균 상담 시간(분)", "상담당 메시지", "전체 메시지"])
+    grouped = frame.groupby("counselor", sort=False)
+    summary = pd.DataFrame({
+        "상담 수": grouped.size(),
+        "종료된 상담": grouped["duration_min"].count(),
+        "평균 상담 시간(분)": grouped["duration_min"].mean().round(1),
+        "상담당 메시지": grouped["message_count"].mean().round(1),
+        "전체 메시지": grouped["message_count"].sum(),
+    })
+    return summary.sort_values("상담 수", ascending=False).rename_axis("상담원").reset_index()
+
+def daily_counts(frame):
+    """시작일별 상담 수 (빈 날은 0)."""
+    starts = frame["start"].dropna()
+    if starts.empty:
+        return pd.Series(dtype=np.int64, name="상담 수")
+    return starts.dt.normalize().value_counts().sort_index().asfreq("D", fill_value=0).rename("상담 수")
+
+def cause_distribution(frame, date_from=None, date_to=None):
+    """가이드 원인 분류별 건수와 비율 (작성 시각 기준 기간)."""
+    if date_from or date_to:
+        frame = frame[_in_period(frame["created"], date_from, date_to)]
+    counts = frame["cause"].value_counts()
+    return pd.DataFrame({
+        "원인": counts.index, "가이드 수": counts.to_numpy(),
+        "비율": (counts / max(counts.sum(), 1)).round(3).to_numpy(),
+    })
+
+def message_histogram(frame, bins=10):
+    """상담당 메시지 수 분포. (구간 라벨, 상담 수) DataFrame."""
+    counts = frame["message_count"].to_numpy()
+    if counts.size == 0:
+        return pd.DataFrame(columns=["메시지 수", "상담 수"])
+    hist, edges = np.histogram(counts, bins=min(bins, max(int(counts.max() - counts.min()) + 1, 1)))
+    labels = [f"{int(lo)}–{int(hi)}" for lo, hi in zip(edges[:-1], edges[1:])]
+    return pd.DataFrame({"메시지 수": labels, "상담 수": hist})
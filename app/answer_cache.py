@@ -0,0 +1,254 @@
+"""반복되는 질문에 대한 응답 캐시 (SQLite, TTL + LRU).
+
+정규화한 질문을 키로 답변/출처를 저장해 서버를 재시작해도 유지합니다.
+답변을 만들 때 참고한 가이드가 수정/삭제되거나, 같은 질문의 가이드가 새로 추가되면
+해당 항목을 지웁니다(guide_store가 호출). 적중/미적중 횟수는 stats()로 확인합니다.
+
+조회(get)는 읽기만 합니다. 적중/미적중 횟수, last_access(LRU 기준), 만료 항목 삭제는
+모았다가 STATS_FLUSH_DELAY 뒤(또는 flush()) 한 트랜잭션으로 씁니다.
+"""
+import atexit
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import metrics
+from sqlite_util import connect, transaction
+
+# --- 상수 정의 ---
+CACHE_FILENAME = "answer_cache.db"
+TTL_SECONDS = float(os.environ.get("ANSWER_CACHE_TTL", str(7 * 24 * 3600)))
+MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "10000"))
+SQL_CHUNK_SIZE = 500 # IN (...) 한 번에 넣는 값 수 (SQLite 변수 개수 제한 아래)
+# 조회마다 쓰기 트랜잭션을 열지 않도록 횟수/last_access를 이만큼 모았다가 씁니다.
+# 그 사이 프로세스가 죽으면 모아 둔 횟수만 잃습니다 (LRU 순서가 조금 늦게 반영될 뿐 답변은 그대로).
+STATS_FLUSH_DELAY = float(os.environ.get("ANSWER_CACHE_FLUSH_DELAY", "5.0"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    key TEXT PRIMARY KEY,
+    prompt TEXT NOT NULL,
+    response TEXT NOT NULL,
+    source TEXT,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_answers_last_access ON answers(last_access);
+CREATE TABLE IF NOT EXISTS answer_guides (
+    key TEXT NOT NULL,
+    guide_id TEXT NOT NULL,
+    PRIMARY KEY (key, guide_id)
+);
+CREATE INDEX IF NOT EXISTS idx_answer_guides_guide_id ON answer_guides(guide_id);
+CREATE TABLE IF NOT EXISTS cache_stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_stats (name, value) VALUES ('hits', 0), ('misses', 0);
+-- entries: answers 행 수. COUNT(*) 대신 쓰기마다 갱신합니다 (기존 캐시는 처음 열 때 한 번 셉니다).
+INSERT OR IGNORE INTO cache_stats (name, value) SELECT 'entries', COUNT(*) FROM answers;
+"""
+
+_NON_WORD_RE = re.compile(r"[^\w\s]")
+_SPACE_RE = re.compile(r"\s+")
+_initialized = set()
+
+# path -> {"hits": int, "misses": int, "touched": {key: last_access}, "expired": {key: created_at},
+#          "timer": threading.Timer | None}
+_pending = {}
+_lock = threading.Lock()
+
+
+def cache_path(guide_db_path):
+    """가이드 저장소와 같은 폴더(볼륨)에 캐시를 둡니다."""
+    return os.path.join(os.path.dirname(guide_db_path), CACHE_FILENAME)
+
+def normalize_prompt(prompt):
+    """대소문자, 문장부호, 공백 차이를 무시하는 캐시 키를 만듭니다."""
+    text = unicodedata.normalize("NFKC", prompt or "").lower()
+    text = _NON_WORD_RE.sub(" ", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+def _connect(path):
+    conn = connect(path)
+    if path not in _initialized:
+        conn.executescript(_SCHEMA)
+        _initialized.add(path)
+    return conn
+
+def _add_stat(conn, name, delta):
+    if delta:
+        conn.execute("UPDATE cache_stats SET value = value + ? WHERE name = ?", (delta, name))
+
+def _delete_keys(conn, keys):
+    """항목들을 지우고 entries를 맞춥니다 (트랜잭션 안에서 호출)."""
+    keys = [(k,) for k in keys]
+    _add_stat(conn, "entries", -conn.executemany("DELETE FROM answers WHERE key = ?", keys).rowcount)
+    conn.executemany("DELETE FROM answer_guides WHERE key = ?", keys)
+
+
+# --- 조회 / 저장 ---
+@metrics.timed("answer_cache.get")
+def get(path, prompt):
+    """캐시된 {"response", "source"}를 반환합니다. 없거나 만료되었으면 None."""
+    key = normalize_prompt(prompt)
+    if not key:
+        return None
+    now = time.time()
+    row = _connect(path).execute(
+        "SELECT response, source, created_at FROM answers WHERE key = ?", (key,)
+    ).fetchone()
+    expired = row is not None and now - row["created_at"] > TTL_SECONDS
+    with _lock:
+        pending = _pending_for(path)
+        if row is None or expired:
+            pending["misses"] += 1
+            if expired:
+                pending["expired"][key] = row["created_at"]
+        else:
+            pending["hits"] += 1
+            pending["touched"][key] = now
+        _schedule_flush(path, pending)
+    if row is None or expired:
+        metrics.count("answer_cache.misses")
+        return None
+    metrics.count("answer_cache.hits")
+    return {"response": row["response"], "source": row["source"]}
+
+@metrics.timed("answer_cache.put")
+def put(path, prompt, response, source=None, guide_ids=()):
+    """답변을 저장합니다. guide_ids는 답변에 참고한 가이드(무효화 기준)입니다."""
+    key = normalize_prompt(prompt)
+    if not key:
+        return
+    now = time.time()
+    conn = _connect(path)
+    with transaction(conn):
+        if conn.execute("SELECT 1 FROM answers WHERE key = ?", (key,)).fetchone() is None:
+            _add_stat(conn, "entries", 1)
+        conn.execute(
+            "INSERT OR REPLACE INTO answers (key, prompt, response, source, created_at, last_access) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, prompt, response, source, now, now),
+        )
+        conn.execute("DELETE FROM answer_guides WHERE key = ?", (key,))
+        conn.executemany(
+            "INSERT OR IGNORE INTO answer_guides (key, guide_id) VALUES (?, ?)",
+            [(key, guide_id) for guide_id in guide_ids if guide_id],
+        )
+        _evict(conn)
+
+def _evict(conn):
+    """MAX_ENTRIES를 넘는 만큼 가장 오래 사용되지 않은 항목부터 지웁니다."""
+    excess = _stat(conn, "entries") - MAX_ENTRIES
+    if excess <= 0:
+        return
+    keys = [row[0] for row in conn.execute(
+        "SELECT key FROM answers ORDER BY last_access ASC LIMIT ?", (excess,)
+    )]
+    _delete_keys(conn, keys)
+
+def _stat(conn, name):
+    row = conn.execute("SELECT value FROM cache_stats WHERE name = ?", (name,)).fetchone()
+    return row[0] if row is not None else 0
+
+
+# --- 조회 기록 (적중/미적중 횟수, last_access) ---
+def _pending_for(path):
+    pending = _pending.get(path)
+    if pending is None:
+        pending = _pending[path] = {"hits": 0, "misses": 0, "touched": {}, "expired": {}, "timer": None}
+    return pending
+
+def _schedule_flush(path, pending):
+    if pending["timer"] is None:
+        timer = threading.Timer(STATS_FLUSH_DELAY, flush, args=(path,))
+        timer.daemon = True
+        pending["timer"] = timer
+        timer.start()
+
+def _merge_back(path, pending):
+    """쓰지 못한 기록을 다음 flush로 돌려놓습니다 (_lock 안에서 호출)."""
+    target = _pending_for(path)
+    target["hits"] += pending["hits"]
+    target["misses"] += pending["misses"]
+    for key, last_access in pending["touched"].items():
+        target["touched"][key] = max(last_access, target["touched"].get(key, 0))
+    for key, created_at in pending["expired"].items():
+        target["expired"].setdefault(key, created_at)
+    _schedule_flush(path, target)
+
+@metrics.timed("answer_cache.flush")
+def flush(path):
+    """모아 둔 조회 기록을 지금 씁니다. 실패하면 다시 예약합니다."""
+    with _lock:
+        pending = _pending.pop(path, None)
+        if pending is None:
+            return
+        if pending["timer"] is not None:
+            pending["timer"].cancel()
+    conn = _connect(path)
+    try:
+        with transaction(conn):
+            _add_stat(conn, "hits", pending["hits"])
+            _add_stat(conn, "misses", pending["misses"])
+            conn.executemany(
+                "UPDATE answers SET last_access = MAX(last_access, ?) WHERE key = ?",
+                [(last_access, key) for key, last_access in pending["touched"].items()],
+            )
+            # 조회한 뒤 같은 질문이 다시 저장되었다면(created_at이 다르면) 지우지 않습니다.
+            expired = [key for key, created_at in pending["expired"].items() if conn.execute(
+                "SELECT 1 FROM answers WHERE key = ? AND created_at = ?", (key, created_at)
+            ).fetchone()]
+            _delete_keys(conn, expired)
+    except sqlite3.Error:
+        with _lock:
+            _merge_back(path, pending)
+
+def flush_all():
+    """모든 캐시의 남은 조회 기록을 씁니다. 프로세스가 정상 종료될 때 자동으로 호출됩니다."""
+    for path in list(_pending):
+        try:
+            flush(path)
+        except Exception:
+            pass
+
+atexit.register(flush_all)
+
+
+# --- 무효화 ---
+def invalidate_guides(path, upserts=(), removals=()):
+    """가이드 변경과 관련된 캐시 항목을 지웁니다.
+
+    - 수정/삭제된 가이드를 참고해 만든 답변
+    - 추가/수정된 가이드와 같은 질문(정규화 기준)에 대한 답변
+    """
+    guide_ids = [g.get("id") for g in upserts if g.get("id")] + list(removals)
+    prompt_keys = [normalize_prompt(g.get("prompt")) for g in upserts]
+    conn = _connect(path)
+    with transaction(conn):
+        keys = set(k for k in prompt_keys if k)
+        for start in range(0, len(guide_ids), SQL_CHUNK_SIZE):
+            chunk = guide_ids[start:start + SQL_CHUNK_SIZE]
+            keys.update(row[0] for row in conn.execute(
+                f"SELECT key FROM answer_guides WHERE guide_id IN ({', '.join('?' * len(chunk))})", chunk
+            ))
+        _delete_keys(conn, keys)
+
+def stats(path):
+    """저장된 횟수에 아직 쓰지 않은 조회 기록을 더합니다. 화면이 다시 그릴 때마다 부르므로 쓰지 않습니다."""
+    conn = _connect(path)
+    counts = {row["name"]: row["value"] for row in conn.execute("SELECT name, value FROM cache_stats")}
+    with _lock:
+        pending = _pending.get(path) or {"hits": 0, "misses": 0}
+        hits = counts.get("hits", 0) + pending["hits"]
+        misses = counts.get("misses", 0) + pending["misses"]
+    return {
+        "hits": hits,
+        "misses": misses,
+        "entries": counts.get("entries", 0),
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+    }
@@ -1,13 +1,21 @@
 import streamlit as st
-from datetime import datetime
-import json
 import os
-import glob
-import shutil
+import uuid
+import fileio
+import metrics
+import service
+import ui
 
 # --- 페이지 기본 설정 ---
 st.set_page_config(layout="wide", page_title="상담 관리 시스템")
 
+# --- 계측 시작 (구간별 시간/입출력량, 관리 화면: pages/admin.py) ---
+# 주소에 ?profile=1을 붙이면 이 세션의 실행을 cProfile로 기록하고 화면 아래에 요약을 보여줍니다.
+if 'metrics_session' not in st.session_state:
+    st.session_state.metrics_session = uuid.uuid4().hex
+profiling = st.query_params.get("profile") == "1"
+metrics.begin_rerun("app", st.session_state.metrics_session, profile=profiling)
+
 # --- 사이드바 네비게이션 숨기기 ---
 hide_pages_nav_css = """
     <style> [data-testid="stSidebarNav"] {display: none;} </style>
@@ -16,104 +24,161 @@ st.markdown(hide_pages_nav_css, unsafe_allow_html=True)
 
 
 # --- 상수 정의 ---
-HISTORY_DIR = "history"
-GUIDE_DIR = "guide"
-ATTACHMENT_DIR = os.path.join(GUIDE_DIR, "attachments")
-GUIDE_FILE_PATH = os.path.join(GUIDE_DIR, "guide.json") # [핵심 수정] 단일 가이드 파일 경로
-
-os.makedirs(HISTORY_DIR, exist_ok=True)
-os.makedirs(GUIDE_DIR, exist_ok=True)
-os.makedirs(ATTACHMENT_DIR, exist_ok=True)
-
-# --- 헬퍼 함수: 파일 처리 (History) ---
-def get_history_files():
-    # [핵심 수정] 최신순으로 정렬하기 위해 reverse=True 추가
-    return sorted(glob.glob(os.path.join(HISTORY_DIR, "history*.json")), reverse=True)
-
-def load_data(filepath):
-    """범용 JSON 로더"""
-    if os.path.exists(filepath):
-        with open(filepath, 'r', encoding='utf-8') as f:
-            try: return json.load(f)
-            except json.JSONDecodeError: return None
-    return None
-
-def save_history_data(filepath, data):
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-def create_new_history(counselor_name="담당자 미지정"):
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    new_filepath = os.path.join(HISTORY_DIR, f"history{timestamp}.json")
-    new_data = {
-        "title": f"새 상담 ({timestamp})", "summary": "이곳에 상담 요약을 작성하세요.",
-        "counselor_name": counselor_name, "start_time": datetime.now().isoformat(),
-        "end_time": None, "messages": []
-    }
-    save_history_data(new_filepath, new_data)
-    return new_filepath
-
-# --- 헬퍼 함수: 단일 파일에 가이드 저장 ---
-def save_new_guide(guide_data):
-    """새로운 가이드 데이터를 단일 guide.json 파일에 추가합니다."""
-    guides = load_data(GUIDE_FILE_PATH)
-    if guides is None or not isinstance(guides, list):
-        guides = [] # 파일이 없거나 내용이 잘못된 경우 새로 시작
-
-    guides.append(guide_data) # 새 가이드를 리스트에 추가
-
-    with open(GUIDE_FILE_PATH, 'w', encoding='utf-8') as f:
-        json.dump(guides, f, ensure_ascii=False, indent=2)
+HISTORY_PAGE_SIZE = 20 # 사이드바에 한 번에 그리는 상담 버튼 수
+CHAT_WINDOW_SIZE = 30 # 대화 화면에 처음 그리는(및 '이전 메시지'로 더 불러오는) 메시지 수
+ARCHIVE_PAGE_SIZE = 10 # 사이드바 '보관된 상담'에 한 번에 그리는 상담 수
+
+# 저장소 경로와 업무 로직은 service 모듈에 있습니다. 이 화면은 service를 호출해 그리기만 합니다.
+service.init()
 
 # --- 상태 관리 ---
 if 'current_history_file' not in st.session_state:
-    history_files = get_history_files()
-    st.session_state.current_history_file = history_files[0] if history_files else None
+    st.session_state.current_history_file = service.latest_history()
+
+if 'history_page' not in st.session_state:
+    st.session_state.history_page = 0
+if 'history_filter_key' not in st.session_state:
+    st.session_state.history_filter_key = None
 
 if 'current_counselor' not in st.session_state:
     st.session_state.current_counselor = "담당자A"
 
+if 'chat_window' not in st.session_state:
+    st.session_state.chat_window = CHAT_WINDOW_SIZE
+    st.session_state.chat_window_file = None
+
+if 'viewing_archive' not in st.session_state:
+    st.session_state.viewing_archive = None # 읽기 전용으로 열어 본 보관 상담 이름
+if 'history_notice' not in st.session_state:
+    st.session_state.history_notice = None # 메시지를 기록하지 못한 이유. 다음 실행에 한 번 보여줍니다.
+
 if 'editing_guide' not in st.session_state:
     st.session_state.editing_guide = False
-if 'guide_editor_data' not in st.session_state:
-    st.session_state.guide_editor_data = None
+if 'guide_draft_ref' not in st.session_state:
+    st.session_state.guide_draft_ref = None # (상담 경로, 답변 메시지 위치). 초안 내용은 service가 만듭니다.
+if 'pending_guide' not in st.session_state:
+    st.session_state.pending_guide = None # (저장하려던 가이드, 비슷한 기존 가이드 목록)
+
+ui.init_state() # 백그라운드 작업 알림 상태
+
+# --- 현재 상담 (사이드바의 제목 수정과 대화 화면이 이 결과를 함께 씁니다) ---
+# 최근 chat_window개 메시지와 메타데이터를 한 번에 받습니다. service가 메모리 작업 사본에서 돌려주므로
+# 상담이 바뀌지 않았다면 rerun마다 파일을 다시 읽지 않습니다.
+# 대화 창 크기는 화면에 보이는 상담(보관 상담을 열었으면 그 상담)이 바뀔 때 처음으로 돌립니다.
+shown_history = st.session_state.viewing_archive or st.session_state.current_history_file
+if st.session_state.chat_window_file != shown_history:
+    st.session_state.chat_window_file = shown_history
+    st.session_state.chat_window = CHAT_WINDOW_SIZE
+current_view = None
+if st.session_state.current_history_file:
+    current_view = service.get_message_window(st.session_state.current_history_file, st.session_state.chat_window)
+
+def flush_current_history():
+    """현재 상담에 모아 둔 메시지를 기록합니다. 그 사이 상담 파일이 사라졌으면 다음 화면에 알립니다."""
+    try:
+        service.flush_history(st.session_state.current_history_file)
+    except FileNotFoundError:
+        st.session_state.history_notice = (
+            "다른 곳에서 상담이 보관되었거나 삭제되어 저장 대기 중인 메시지를 기록하지 못했습니다. "
+            "메시지는 이 서버의 메모리에 남아 있습니다."
+        )
+
+def switch_history(history_file):
+    """다른 상담으로 이동합니다. 떠나는 상담에 모아 둔 메시지는 먼저 기록합니다."""
+    flush_current_history()
+    st.session_state.current_history_file = history_file
+    st.session_state.viewing_archive = None
+    st.session_state.editing_guide = False
 
 # --------------------------------------------------------------------------
 # 사이드바
 # --------------------------------------------------------------------------
+metrics.section("render.sidebar")
 st.sidebar.title("🗂️ 상담 목록")
 st.sidebar.text_input(
     "현재 상담원 이름", key="current_counselor",
     help="새로운 상담/가이드를 저장할 때 이 이름으로 담당자가 설정됩니다."
 )
 if st.sidebar.button("➕ 새 상담 시작하기", use_container_width=True):
-    new_file = create_new_history(counselor_name=st.session_state.current_counselor)
-    st.session_state.current_history_file = new_file
-    st.session_state.editing_guide = False
+    switch_history(service.create_history(counselor_name=st.session_state.current_counselor))
     st.rerun()
 
 st.sidebar.divider()
+filter_container = st.sidebar.expander("🔍 상담 검색/필터")
+with filter_container:
+    filter_title = st.text_input("제목", key="history_filter_title", placeholder="제목으로 검색...")
+    counselor_slot = st.empty() # 선택지(담당자 목록)는 아래 목록 조회 결과로 채웁니다.
+    filter_dates = st.date_input("상담 기간", value=(), key="history_filter_dates")
+filter_counselor = st.session_state.get("history_filter_counselor", "전체")
+
+date_from = filter_dates[0].isoformat() if len(filter_dates) > 0 else None
+date_to = filter_dates[-1].isoformat() if len(filter_dates) > 0 else None
+
+# 필터가 바뀌면 첫 페이지부터 다시 보여줍니다.
+filter_key = (filter_title, filter_counselor, date_from, date_to)
+if st.session_state.history_filter_key != filter_key:
+    st.session_state.history_filter_key = filter_key
+    st.session_state.history_page = 0
+
+history_list = service.list_histories(
+    title=filter_title, counselor=None if filter_counselor == "전체" else filter_counselor,
+    date_from=date_from, date_to=date_to,
+    page=st.session_state.history_page, page_size=HISTORY_PAGE_SIZE,
+)
+counselor_slot.selectbox("담당자", options=["전체"] + history_list["counselors"], key="history_filter_counselor")
+page = history_list["page"]
+page_count = history_list["page_count"]
+
 nav_container = st.sidebar.container(height=350)
-history_files = get_history_files()
-for history_file in history_files:
-    data = load_data(history_file)
-    if data:
-        title = data.get('title', os.path.basename(history_file))
-        counselor = data.get('counselor_name', '미지정')
-        button_label = f"{title} (담당: {counselor})"
-        is_current = (history_file == st.session_state.current_history_file)
-        if nav_container.button(button_label, use_container_width=True, disabled=is_current):
-            st.session_state.current_history_file = history_file
+for history_file, meta in history_list["entries"]:
+    title = meta.get('title', os.path.basename(history_file))
+    counselor = meta.get('counselor_name', '미지정')
+    button_label = f"{title} (담당: {counselor})"
+    is_current = (history_file == st.session_state.current_history_file)
+    if nav_container.button(button_label, use_container_width=True, disabled=is_current):
+        switch_history(history_file)
+        st.rerun()
+
+page_cols = st.sidebar.columns([1, 2, 1])
+if page_cols[0].button("◀", key="history_prev_page", disabled=page == 0, use_container_width=True):
+    st.session_state.history_page = page - 1
+    st.rerun()
+page_cols[1].caption(f"{page + 1} / {page_count} 페이지 (총 {history_list['total']}건)")
+if page_cols[2].button("▶", key="history_next_page", disabled=page >= page_count - 1, use_container_width=True):
+    st.session_state.history_page = page + 1
+    st.rerun()
+
+# 오래된 상담은 history_archive가 보관 묶음으로 옮깁니다. 여기서 찾아 읽기 전용으로 엽니다.
+with st.sidebar.expander("🗄️ 보관된 상담"):
+    archive_title = st.text_input("보관 상담 제목", key="archive_filter_title", placeholder="제목으로 검색...")
+    archived_list = service.list_archived(title=archive_title, page_size=ARCHIVE_PAGE_SIZE)
+    for archived_name, archived_meta in archived_list["entries"]:
+        label = f"{archived_meta.get('title', archived_name)} (담당: {archived_meta.get('counselor_name') or '미지정'})"
+        if st.button(label, key=f"archived_{archived_name}", use_container_width=True,
+                     disabled=archived_name == st.session_state.viewing_archive):
+            st.session_state.viewing_archive = archived_name
             st.session_state.editing_guide = False
             st.rerun()
+    if archived_list["total"] > len(archived_list["entries"]):
+        st.caption(f"총 {archived_list['total']}건 중 최근 {len(archived_list['entries'])}건입니다. 제목으로 검색해 찾으세요.")
+    elif not archived_list["total"]:
+        st.caption("보관된 상담이 없습니다.")
 
 # 사이드바에 선택된 상담의 제목 수정 기능 추가
-if st.session_state.current_history_file:
+if current_view:
     st.sidebar.divider()
     st.sidebar.header("✍️ 상담 제목 수정")
     
-    current_data_for_edit = load_data(st.session_state.current_history_file)
+    current_data_for_edit = current_view["meta"]
     if current_data_for_edit:
+        # 직전 화면에 보여 준 (파일, rev). 저장 시 그 사이 다른 세션이 수정했는지 비교합니다.
+        seen = st.session_state.get("title_edit_seen")
+        current_rev = current_data_for_edit.get('rev', 0)
+        if seen and seen[0] == st.session_state.current_history_file:
+            expected_rev = seen[1]
+        else:
+            expected_rev = current_rev
+        st.session_state.title_edit_seen = (st.session_state.current_history_file, current_rev)
         with st.sidebar.form(key="title_edit_form"):
             new_title = st.text_input(
                 "수정할 제목", 
@@ -121,33 +186,59 @@ if st.session_state.current_history_file:
                 label_visibility="collapsed"
             )
             if st.form_submit_button("💾 제목 저장", use_container_width=True):
-                current_data_for_edit['title'] = new_title
-                save_history_data(st.session_state.current_history_file, current_data_for_edit)
-                st.rerun()
+                try:
+                    st.session_state.current_history_file = service.update_title(
+                        st.session_state.current_history_file, new_title, expected_rev=expected_rev,
+                    )
+                except fileio.VersionConflict:
+                    st.sidebar.warning("다른 사용자가 먼저 제목을 수정했습니다. 최신 제목을 확인한 뒤 다시 저장하세요.")
+                else:
+                    st.rerun()
+
+    if current_view["pending"]:
+        pending_cols = st.sidebar.columns([2, 1])
+        pending_cols[0].caption(f"저장 대기 중인 메시지 {current_view['pending']}개 (잠시 뒤 자동 저장)")
+        if pending_cols[1].button("💾 저장", key="flush_history", use_container_width=True):
+            flush_current_history()
+            st.rerun()
+
+cache_stats = service.cache_stats()
+st.sidebar.caption(
+    f"응답 캐시: 적중 {cache_stats['hits']} / 미적중 {cache_stats['misses']} "
+    f"(적중률 {cache_stats['hit_rate']:.0%}, {cache_stats['entries']}건 저장)"
+)
+st.sidebar.page_link("pages/report.py", label="📊 상담 통계")
+st.sidebar.page_link("pages/admin.py", label="📈 성능 지표")
 
 # --- 챗봇 UI 함수 ---
-def display_chat_interface(chat_data):
-    counselor_name = chat_data.get('counselor_name', '미지정')
+def display_chat_interface(history_file, view):
+    counselor_name = view["meta"].get('counselor_name', '미지정')
     st.header(f"💬 챗봇 대화 (담당: {counselor_name})")
-    
+
+    # 최근 chat_window개만 그립니다 (current_view).
+    window = st.session_state.chat_window
+    messages, total = view["messages"], view["total"]
+
     chat_container = st.container(height=600)
-    messages = chat_data.get('messages', [])
-    for i, message in enumerate(messages):
+    if total > window:
+        if chat_container.button(f"⬆️ 이전 메시지 더 보기 ({total - window}개)", key="load_earlier_messages", use_container_width=True):
+            st.session_state.chat_window += CHAT_WINDOW_SIZE
+            st.rerun()
+    for j, message in enumerate(messages):
+        if j == 0 and view["has_context"]:
+            continue # 앞 메시지는 '가이드에 추가'의 질문을 찾는 용도로만 읽었습니다.
+        i = view["first_index"] + j
         with chat_container.chat_message(message["role"]):
             st.markdown(message["content"])
             if message["role"] == "assistant" and message.get("source"):
                 st.caption(f"출처: {message['source']}")
             
-            if message["role"] == "assistant" and i > 0:
-                prompt_message = messages[i-1]
+            if message["role"] == "assistant" and j > 0:
+                prompt_message = messages[j-1]
                 if prompt_message["role"] == "user":
                     if st.button(f"가이드에 추가", key=f"guide_btn_{i}"):
                         st.session_state.editing_guide = True
-                        st.session_state.guide_editor_data = {
-                            "prompt": prompt_message["content"],
-                            "response": message["content"],
-                            "source": message.get("source", "출처 없음")
-                        }
+                        st.session_state.guide_draft_ref = (history_file, i)
                         st.rerun()
 
     with st.form(key="chat_form", clear_on_submit=True):
@@ -155,20 +246,50 @@ def display_chat_interface(chat_data):
         submitted = st.form_submit_button("전송", use_container_width=True)
 
     if submitted and prompt:
-        def get_chatbot_response(question):
-            return f"'{question}'에 대한 답변입니다. 이 답변은 예시입니다.", "https://docs.streamlit.io"
-        chat_data['messages'].append({"role": "user", "content": prompt})
-        response, source = get_chatbot_response(prompt)
-        chat_data['messages'].append({
-            "role": "assistant", "content": response, "source": source,
-            "timestamp": datetime.now().isoformat()
-        })
-        save_history_data(st.session_state.current_history_file, chat_data)
+        # 답변은 도착하는 조각부터 바로 그리고, 출처/시각은 스트림이 끝난 뒤에 기록합니다.
+        with chat_container.chat_message("user"):
+            st.markdown(prompt)
+        with chat_container.chat_message("assistant"):
+            stream, cached = service.start_answer(prompt, history=messages)
+            st.write_stream(stream)
+            if stream.error:
+                st.error(stream.error)
+        st.session_state.current_history_file = service.finish_answer(
+            st.session_state.current_history_file, prompt, stream, cached=cached,
+        )
         st.rerun()
 
+def display_archived(name):
+    """보관된 상담을 읽기 전용으로 그립니다."""
+    data = service.get_archived(name)
+    if data is None:
+        st.error(f"보관된 상담 {name}을(를) 찾을 수 없습니다.")
+        st.session_state.viewing_archive = None
+        return
+    header_cols = st.columns([0.8, 0.2])
+    header_cols[0].header(f"🗄️ {data.get('title', name)} (담당: {data.get('counselor_name') or '미지정'})")
+    if header_cols[1].button("닫기", key="close_archive", use_container_width=True):
+        st.session_state.viewing_archive = None
+        st.rerun()
+    st.caption(f"보관된 상담 (읽기 전용) · 시작 {data.get('start_time') or '-'} · 메시지 {len(data.get('messages', []))}개")
+
+    messages = data.get("messages", [])
+    window = st.session_state.chat_window
+    chat_container = st.container(height=600)
+    if len(messages) > window:
+        if chat_container.button(f"⬆️ 이전 메시지 더 보기 ({len(messages) - window}개)", key="load_earlier_archived", use_container_width=True):
+            st.session_state.chat_window += CHAT_WINDOW_SIZE
+            st.rerun()
+    for message in messages[-window:]:
+        with chat_container.chat_message(message["role"]):
+            st.markdown(message["content"])
+            if message["role"] == "assistant" and message.get("source"):
+                st.caption(f"출처: {message['source']}")
+
 # --------------------------------------------------------------------------
 # 메인 패널 UI
 # --------------------------------------------------------------------------
+metrics.section("render.chat")
 title_col, button_col = st.columns([0.8, 0.2])
 with title_col:
     st.title("🤖 상담 시스템")
@@ -177,28 +298,47 @@ with button_col:
     st.page_link("pages/guide.py", label="📚 가이드로 이동", use_container_width=True)
 
 
+if st.session_state.history_notice:
+    st.warning(st.session_state.history_notice)
+    st.session_state.history_notice = None
+
+if st.session_state.viewing_archive:
+    display_archived(st.session_state.viewing_archive)
+    st.stop()
+
 if not st.session_state.current_history_file:
     st.info("새 상담을 시작하거나 사이드바에서 기존 상담을 선택해주세요.")
     st.stop()
 
-current_data = load_data(st.session_state.current_history_file)
-if current_data is None:
+if current_view is None:
     st.error(f"{st.session_state.current_history_file} 파일을 불러오는 데 실패했습니다.")
     st.session_state.current_history_file = None
     st.stop()
 
+ui.show_jobs()
+
 if st.session_state.editing_guide:
     main_col, guide_col = st.columns([1, 1])
     with main_col:
-        display_chat_interface(current_data)
+        display_chat_interface(st.session_state.current_history_file, current_view)
 else:
-    display_chat_interface(current_data)
+    display_chat_interface(st.session_state.current_history_file, current_view)
+
+def finish_guide_edit():
+    st.session_state.pending_guide = None
+    st.session_state.editing_guide = False
+    st.session_state.guide_draft_ref = None
+    st.rerun()
 
 # --- 가이드 편집 패널 ---
-if st.session_state.editing_guide and st.session_state.guide_editor_data:
+metrics.section("render.guide_editor")
+guide_draft = None
+if st.session_state.editing_guide and st.session_state.guide_draft_ref:
+    guide_draft = service.build_guide_draft(*st.session_state.guide_draft_ref)
+if st.session_state.editing_guide and guide_draft:
     with guide_col:
         st.header("📝 새 가이드 생성")
-        data = st.session_state.guide_editor_data
+        data = guide_draft
         
         with st.form(key="guide_editor_form"):
             with st.container(height=600):
@@ -233,22 +373,25 @@ if st.session_state.editing_guide and st.session_state.guide_editor_data:
             if final_cause == "선택하세요":
                 st.warning("원인/분석 분류를 선택해주세요.")
             else:
-                file_path = None
-                if uploaded_file is not None:
-                    file_path = os.path.join(ATTACHMENT_DIR, uploaded_file.name)
-                    with open(file_path, "wb") as f: f.write(uploaded_file.getbuffer())
-                
-                new_guide_content = {
-                    "prompt": data["prompt"], "response": new_response, "cause": final_cause,
-                    "attachment_path": file_path, "counselor_name": st.session_state.current_counselor,
-                    "created_at": datetime.now().isoformat(), "original_source": data.get('source', '정보 없음')
-                }
-                save_new_guide(new_guide_content)
-                st.success(f"가이드가 성공적으로 저장되었습니다!")
-                st.session_state.editing_guide = False
-                st.session_state.guide_editor_data = None
-                st.rerun()
+                guide = service.new_guide(
+                    data["prompt"], new_response, final_cause,
+                    counselor_name=st.session_state.current_counselor,
+                    original_source=data.get('source', '정보 없음'),
+                )
+                duplicates = service.find_duplicate_guides(guide)
+                if duplicates: # 저장하기 전에 합칠지 묻기
+                    st.session_state.pending_guide = (guide, duplicates)
+                else:
+                    # 첨부 저장과 가이드 저장은 작업 스레드가 합니다. 진행 상황은 ui.show_jobs()가 그립니다.
+                    ui.watch_job(service.submit_guide(guide, uploaded_file, owner=st.session_state.metrics_session), "가이드 저장")
+                    finish_guide_edit()
         if cancel_edit:
-            st.session_state.editing_guide = False
-            st.session_state.guide_editor_data = None
-            st.rerun()
+            finish_guide_edit()
+        if st.session_state.pending_guide:
+            ui.resolve_duplicate_guide(finish_guide_edit, uploaded_file)
+
+# --- 계측 끝 ---
+if profiling and metrics.last_profile(st.session_state.metrics_session):
+    with st.expander("🔬 직전 실행 프로파일 (cProfile)"):
+        st.code(metrics.last_profile(st.session_state.metrics_session))
+metrics.end_rerun()
@@ -0,0 +1,132 @@
+"""가이드 첨부 파일 저장/다운로드.
+
+- 업로드는 고정 크기 블록 단위로 임시 파일에 쓰면서 SHA-256을 계산합니다.
+- 백그라운드 작업으로 저장할 때는 업로드를 spool_upload()로 받아 두기만 하고, 작업에서
+  spooled_fields()로 해시를 계산한 뒤 save_spooled()로 옮깁니다.
+- 파일은 내용 해시 경로(`attachments/sha256/ab/abcd...`)에 한 번만 저장되므로
+  이름이 같은 다른 파일이 서로 덮어쓰지 않고, 같은 파일은 중복 저장되지 않습니다.
+- 다운로드는 Streamlit 페이지에 파일 내용을 싣지 않고, nginx가 첨부 폴더를 직접
+  서비스하는 URL(`ATTACHMENT_BASE_URL`)로 연결합니다. nginx 정적 파일 서비스는
+  HTTP Range 요청(이어받기, 부분 다운로드)을 그대로 지원합니다.
+"""
+import hashlib
+import os
+import tempfile
+from urllib.parse import quote
+
+import fileio
+
+# --- 상수 정의 ---
+CHUNK_SIZE = 1024 * 1024
+CAS_DIRNAME = "sha256"
+SPOOL_DIRNAME = "incoming" # 백그라운드 작업이 처리하기 전의 업로드 (내용 해시 폴더 안, 같은 볼륨)
+# nginx가 첨부 폴더를 서비스하는 경로. 비워 두면(nginx 없이 개발할 때) 앱이 직접 내려줍니다.
+ATTACHMENT_BASE_URL = os.environ.get("ATTACHMENT_BASE_URL", "/attachments")
+
+
+def _place(tmp_path, sha256, cas_root):
+    """다 쓴 임시 파일을 내용 해시 경로로 옮기고 그 경로를 반환합니다.
+
+    nginx(root가 아닌 작업 프로세스)가 읽을 수 있도록 옮기기 전에 권한을 0644(umask 적용)로 바꿉니다.
+    """
+    final_dir = os.path.join(cas_root, sha256[:2])
+    final_path = os.path.join(final_dir, sha256)
+    os.makedirs(final_dir, exist_ok=True)
+    if os.path.exists(final_path):
+        os.remove(tmp_path) # 같은 내용이 이미 있으면 기존 파일을 그대로 씁니다.
+    else:
+        os.chmod(tmp_path, fileio.PUBLIC_FILE_MODE)
+        os.replace(tmp_path, final_path)
+    return final_path
+
+def save_upload(uploaded_file, attachment_dir):
+    """업로드 파일을 내용 해시 경로에 저장하고 가이드에 넣을 첨부 필드를 반환합니다."""
+    cas_root = os.path.join(attachment_dir, CAS_DIRNAME)
+    os.makedirs(cas_root, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    uploaded_file.seek(0)
+    fd, tmp_path = tempfile.mkstemp(dir=cas_root, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = uploaded_file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        sha256 = digest.hexdigest()
+        final_path = _place(tmp_path, sha256, cas_root)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return {
+        "attachment_path": final_path,
+        "attachment_name": uploaded_file.name,
+        "attachment_sha256": sha256,
+        "attachment_size": size,
+    }
+
+def spool_upload(uploaded_file, attachment_dir):
+    """업로드 파일을 받아 두기만 하고 {"path", "name"}을 반환합니다 (백그라운드 작업에 넘길 때).
+
+    해시 계산과 내용 해시 경로로의 이동은 작업에서 spooled_fields()/save_spooled()가 합니다.
+    """
+    spool_dir = os.path.join(attachment_dir, CAS_DIRNAME, SPOOL_DIRNAME)
+    return {"path": fileio.spool(uploaded_file, spool_dir, chunk_size=CHUNK_SIZE), "name": uploaded_file.name}
+
+def spooled_fields(spooled, attachment_dir):
+    """spool_upload()로 받아 둔 파일의 해시를 계산해 첨부 필드를 반환합니다. 파일은 아직 옮기지 않습니다."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(spooled["path"], "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+    sha256 = digest.hexdigest()
+    return {
+        "attachment_path": os.path.join(attachment_dir, CAS_DIRNAME, sha256[:2], sha256),
+        "attachment_name": spooled["name"],
+        "attachment_sha256": sha256,
+        "attachment_size": size,
+    }
+
+def save_spooled(spooled, fields):
+    """받아 둔 파일을 spooled_fields()의 경로로 옮깁니다 (복사 없이 이름만 바꿈).
+
+    이미 옮겼다면(작업이 다시 실행된 경우) 아무 일도 하지 않습니다.
+    """
+    if os.path.exists(spooled["path"]):
+        cas_root = os.path.dirname(os.path.dirname(fields["attachment_path"]))
+        _place(spooled["path"], fields["attachment_sha256"], cas_root)
+    return fields
+
+def display_name(guide):
+    path = guide.get("attachment_path")
+    return guide.get("attachment_name") or (os.path.basename(path) if path else None)
+
+def download_url(guide, attachment_dir):
+    """nginx가 서비스하는 다운로드 URL. 첨부 폴더 밖의 파일이거나 URL이 설정되지 않았으면 None.
+
+    내용 해시 경로에는 원래 파일 이름을 마지막 경로로 덧붙여, 브라우저가 그 이름으로 저장하도록 합니다.
+    """
+    path = guide.get("attachment_path")
+    if not ATTACHMENT_BASE_URL or not path:
+        return None
+    relative = os.path.relpath(os.path.abspath(path), os.path.abspath(attachment_dir))
+    if relative.startswith(os.pardir):
+        return None
+    relative = relative.replace(os.sep, "/")
+    if relative.startswith(CAS_DIRNAME + "/"):
+        relative += "/" + (guide.get("attachment_name") or "download")
+    return f"{ATTACHMENT_BASE_URL.rstrip('/')}/{quote(relative)}"
+
+def read_bytes(guide):
+    """URL 다운로드를 쓸 수 없을 때, 사용자가 요청한 경우에만 파일 내용을 읽습니다."""
+    with open(guide["attachment_path"], "rb") as f:
+        return f.read()
@@ -0,0 +1,376 @@
+"""가이드/상담 일괄 가져오기·내보내기 (CSV, JSONL, Excel).
+
+파일을 한 줄(행)씩 읽어 검증하고 BATCH_SIZE개씩 모아 한 번에 기록하므로, 레코드 수와 관계없이
+메모리에는 한 묶음만 올라갑니다.
+- 가이드: 묶음 하나가 guide_store.add_guides() 한 트랜잭션입니다. 이미 있는 id는 건너뜁니다.
+- 상담: 묶음 하나를 history_store.write_histories()로 새 파일들에 쓰고 한 번에 fsync 한 뒤,
+  history_index.record_many()로 인덱스에 한 번 반영합니다. 같은 이름의 상담은 건너뜁니다.
+잘못된 행은 건너뛰고 (행 번호, 이유)를 결과에 모읍니다.
+
+형식 (확장자로 판단):
+- 가이드 CSV/Excel: 한 행이 가이드 하나. 열은 GUIDE_COLUMNS (prompt, response 필수).
+- 가이드 JSONL: 한 줄이 가이드 dict 하나.
+- 상담 JSONL: 한 줄이 상담 하나 ({"title", "counselor_name", "start_time", ..., "messages": [...]}).
+- 상담 CSV/Excel: 한 행이 메시지 하나. 연속한 행 중 consultation 열이 같은 것이 한 상담이며,
+  제목/담당자 등은 그 상담의 첫 행에서 읽습니다.
+내보내기는 같은 형식으로 쓰므로 그대로 다시 가져올 수 있습니다. Excel은 openpyxl이 필요합니다.
+
+사용법:
+    python bulk_io.py import guides    <파일> [guide.db]
+    python bulk_io.py import histories <파일> [history 폴더]
+    python bulk_io.py export guides    <파일> [guide.db]
+    python bulk_io.py export histories <파일> [history 폴더]
+"""
+import csv
+import io
+import json
+import os
+import re
+import sys
+import uuid
+from datetime import date, datetime
+from fnmatch import fnmatch
+
+import guide_store
+import history_archive
+import history_index
+import history_store
+import metrics
+
+# --- 상수 정의 ---
+FORMATS = ("csv", "jsonl", "xlsx")
+BATCH_SIZE = 2000 # 한 번에 기록하는 레코드 수
+MAX_REPORTED_ERRORS = 100 # 결과에 자세히 남기는 오류 행 수
+# attachments.save_upload()가 남기는 첨부 정보. 내보내기/가져오기로 옮겨도 첨부를 잃지 않도록 함께 씁니다.
+ATTACHMENT_META_FIELDS = ("attachment_name", "attachment_sha256", "attachment_size")
+GUIDE_COLUMNS = (
+    "id", "prompt", "response", "cause", "counselor_name", "created_at", "original_source",
+    "attachment_path", *ATTACHMENT_META_FIELDS,
+)
+HISTORY_COLUMNS = (
+    "consultation", "title", "summary", "counselor_name", "start_time", "end_time",
+    "role", "content", "source", "timestamp",
+)
+HISTORY_HEADER_FIELDS = ("title", "summary", "counselor_name", "start_time", "end_time")
+MESSAGE_FIELDS = ("role", "content", "source", "timestamp")
+MESSAGE_ROLES = ("user", "assistant")
+
+
+def detect_format(filename):
+    """파일 이름의 확장자로 형식('csv', 'jsonl', 'xlsx')을 정합니다. 모르는 확장자면 ValueError."""
+    ext = os.path.splitext(filename)[1].lower().lstrip(".")
+    fmt = {"ndjson": "jsonl"}.get(ext, ext) # 예전 Excel(.xls)은 openpyxl이 읽지 못합니다.
+    if fmt not in FORMATS:
+        raise ValueError(f"지원하지 않는 형식입니다: {filename} (CSV, JSONL, XLSX만 가능)")
+    return fmt
+
+def _openpyxl():
+    try:
+        import openpyxl
+    except ImportError as e:
+        raise ValueError("Excel(.xlsx) 파일을 다루려면 openpyxl이 필요합니다: pip install openpyxl") from e
+    return openpyxl
+
+
+# --- 읽기: 행 단위 ---
+def _cell(value):
+    """셀/필드 값을 저장 형식의 문자열로. 비어 있으면 None."""
+    if value is None:
+        return None
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    value = str(value).strip()
+    return value or None
+
+def _read_rows(source, fmt):
+    """(행 번호, dict 또는 오류 메시지)를 차례로 내놓습니다. source는 바이너리 파일 객체입니다."""
+    if fmt == "csv":
+        text = io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
+        try:
+            reader = csv.DictReader(text)
+            for row in reader:
+                yield reader.line_num, row
+        finally:
+            text.detach()
+    elif fmt == "jsonl":
+        for line_no, line in enumerate(source, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                yield line_no, f"JSON 형식 오류: {e}"
+                continue
+            yield line_no, record if isinstance(record, dict) else "JSON 객체가 아닙니다."
+    else:
+        workbook = _openpyxl().load_workbook(source, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [_cell(name) for name in next(rows, ())]
+            for row_no, values in enumerate(rows, 2):
+                if any(value is not None for value in values):
+                    yield row_no, {name: value for name, value in zip(header, values) if name}
+        finally:
+            workbook.close()
+
+
+# --- 검증 ---
+def _timestamp(value, field):
+    """ISO 시각 문자열로 맞춥니다. 해석할 수 없으면 ValueError."""
+    value = _cell(value)
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValueError(f"{field}: 시각 형식이 아닙니다 ({value})") from None
+
+def validate_guide(record, now):
+    """가져온 레코드를 저장할 가이드 dict로 바꿉니다. 필수 항목이 없으면 ValueError."""
+    guide = {field: _cell(record.get(field)) for field in GUIDE_COLUMNS}
+    if not guide["prompt"] or not guide["response"]:
+        raise ValueError("prompt(질문)와 response(답변)는 필수입니다.")
+    guide["created_at"] = _timestamp(guide["created_at"], "created_at") or now
+    guide["original_source"] = guide["original_source"] or "일괄 가져오기"
+    if guide["attachment_sha256"] and not re.fullmatch(r"[0-9a-f]{64}", guide["attachment_sha256"]):
+        raise ValueError(f"attachment_sha256: SHA-256 값이 아닙니다 ({guide['attachment_sha256']})")
+    if guide["attachment_size"] is not None:
+        try:
+            guide["attachment_size"] = int(guide["attachment_size"])
+        except ValueError:
+            raise ValueError(f"attachment_size: 숫자가 아닙니다 ({guide['attachment_size']})") from None
+    for field in ATTACHMENT_META_FIELDS: # 첨부가 없는 가이드에는 빈 필드를 만들지 않습니다.
+        if guide[field] is None:
+            del guide[field]
+    return guide
+
+def validate_history(record, now):
+    """가져온 상담 레코드를 상담 dict로 바꿉니다. 메시지가 잘못되었으면 ValueError."""
+    data = {field: _cell(record.get(field)) for field in HISTORY_HEADER_FIELDS}
+    data["title"] = data["title"] or "가져온 상담"
+    data["counselor_name"] = data["counselor_name"] or "담당자 미지정"
+    data["start_time"] = _timestamp(data["start_time"], "start_time") or now
+    data["end_time"] = _timestamp(data["end_time"], "end_time")
+    messages = record.get("messages") or []
+    if not isinstance(messages, list):
+        raise ValueError("messages는 목록이어야 합니다.")
+    data["messages"] = []
+    for i, message in enumerate(messages, 1):
+        if not isinstance(message, dict) or message.get("role") not in MESSAGE_ROLES or not _cell(message.get("content")):
+            raise ValueError(f"{i}번째 메시지: role(user/assistant)과 content가 필요합니다.")
+        data["messages"].append({k: message[k] for k in MESSAGE_FIELDS if message.get(k) is not None})
+    if _cell(record.get("name")):
+        data["name"] = os.path.basename(_cell(record["name"]))
+    return data
+
+def _consultations(rows):
+    """상담 JSONL은 그대로, CSV/Excel은 연속한 같은 consultation 행을 한 상담으로 묶습니다."""
+    current, current_key, first_row = None, None, None
+    for row_no, row in rows:
+        if isinstance(row, str) or "messages" in row:
+            if current is not None:
+                yield first_row, current
+                current, current_key = None, None
+            yield row_no, row
+            continue
+        key = _cell(row.get("consultation")) or f"{_cell(row.get('title'))}|{_cell(row.get('start_time'))}"
+        if current is None or key != current_key:
+            if current is not None:
+                yield first_row, current
+            current, current_key, first_row = dict(row, messages=[], name=row.get("consultation")), key, row_no
+        if _cell(row.get("role")) or _cell(row.get("content")):
+            current["messages"].append({k: _cell(row.get(k)) for k in MESSAGE_FIELDS})
+    if current is not None:
+        yield first_row, current
+
+
+# --- 가져오기 ---
+def _new_result():
+    return {"imported": 0, "skipped": 0, "error_count": 0, "errors": []}
+
+def _reject(result, row_no, message):
+    result["error_count"] += 1
+    if len(result["errors"]) < MAX_REPORTED_ERRORS:
+        result["errors"].append((row_no, message))
+
+def _batches(records, result, validate, batch_size):
+    """검증을 통과한 레코드를 batch_size개씩 묶습니다. 실패한 행은 result에 기록합니다."""
+    now = datetime.now().isoformat()
+    batch = []
+    for row_no, record in records:
+        try:
+            if isinstance(record, str):
+                raise ValueError(record)
+            batch.append(validate(record, now))
+        except ValueError as e:
+            _reject(result, row_no, str(e))
+            continue
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+@metrics.timed("bulk_io.import_guides")
+def import_guides(source, fmt, db_path, batch_size=BATCH_SIZE, progress=None):
+    """가이드 파일을 가져옵니다. progress(result)는 묶음을 기록할 때마다 불립니다."""
+    result = _new_result()
+    known_ids = set(guide_store.get_guides_by_id(db_path))
+    for batch in _batches(_read_rows(source, fmt), result, validate_guide, batch_size):
+        fresh = []
+        for guide in batch: # 이미 있는 id와, 같은 묶음에서 앞에 나온 id는 건너뜁니다.
+            if guide["id"] and guide["id"] in known_ids:
+                continue
+            fresh.append(guide)
+            if guide["id"]:
+                known_ids.add(guide["id"])
+        result["skipped"] += len(batch) - len(fresh)
+        guide_store.add_guides(db_path, fresh)
+        result["imported"] += len(fresh)
+        if progress:
+            progress(result)
+    return result
+
+def _history_path(history_dir, data, taken):
+    """가져올 상담의 파일 경로. 내보낸 파일의 이름(name)이 있으면 그 이름(.jsonl)을 씁니다.
+
+    같은 상담이 이미 있으면(레거시 .json 이름 포함) None.
+    """
+    name = data.pop("name", None)
+    if name and any(fnmatch(name, pattern) for pattern in history_index.HISTORY_PATTERNS):
+        stem = os.path.join(history_dir, os.path.splitext(name)[0])
+        if stem + history_store.LOG_SUFFIX in taken or stem + history_store.LEGACY_SUFFIX in taken:
+            return None
+        return stem + history_store.LOG_SUFFIX
+    stamp = datetime.fromisoformat(data["start_time"]).strftime("%Y%m%d_%H%M%S")
+    while True:
+        path = os.path.join(history_dir, f"history{stamp}_{uuid.uuid4().hex[:8]}{history_store.LOG_SUFFIX}")
+        if path not in taken:
+            return path
+
+@metrics.timed("bulk_io.import_histories")
+def import_histories(source, fmt, history_dir, batch_size=BATCH_SIZE, progress=None):
+    """상담 파일을 가져옵니다. progress(result)는 묶음을 기록할 때마다 불립니다."""
+    result = _new_result()
+    os.makedirs(history_dir, exist_ok=True)
+    taken = set(os.path.join(history_dir, name) for name in os.listdir(history_dir))
+    taken.update(os.path.join(history_dir, name) for name, _ in history_archive.list_entries(history_dir))
+    for batch in _batches(_consultations(_read_rows(source, fmt)), result, validate_history, batch_size):
+        items = []
+        for data in batch:
+            path = _history_path(history_dir, data, taken)
+            if path is None:
+                result["skipped"] += 1
+                continue
+            taken.add(path)
+            items.append((path, data))
+        history_store.write_histories(items)
+        history_index.record_many(items)
+        result["imported"] += len(items)
+        if progress:
+            progress(result)
+    return result
+
+
+# --- 내보내기 ---
+class _RowWriter:
+    """형식별로 행(dict)을 바이너리 출력 파일에 차례로 씁니다. close()로 마무리합니다."""
+
+    def __init__(self, out, fmt, columns):
+        self.out, self.fmt, self.columns = out, fmt, columns
+        if fmt == "csv":
+            self._text = io.TextIOWrapper(out, encoding="utf-8-sig", newline="")
+            self._csv = csv.DictWriter(self._text, fieldnames=columns, extrasaction="ignore")
+            self._csv.writeheader()
+        elif fmt == "xlsx":
+            self._workbook = _openpyxl().Workbook(write_only=True)
+            self._sheet = self._workbook.create_sheet()
+            self._sheet.append(list(columns))
+
+    def write(self, row):
+        if self.fmt == "csv":
+            self._csv.writerow(row)
+        elif self.fmt == "xlsx":
+            self._sheet.append([row.get(column) for column in self.columns])
+        else:
+            self.out.write((json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8"))
+
+    def close(self):
+        if self.fmt == "csv":
+            self._text.flush()
+            self._text.detach() # 출력 파일은 호출한 쪽이 닫습니다.
+        elif self.fmt == "xlsx":
+            self._workbook.save(self.out)
+
+@metrics.timed("bulk_io.export_guides")
+def export_guides(db_path, out, fmt):
+    """모든 가이드를 out(바이너리 파일 객체)에 씁니다. 쓴 가이드 수를 반환합니다."""
+    writer = _RowWriter(out, fmt, GUIDE_COLUMNS)
+    guides = guide_store.list_guides(db_path)
+    for guide in guides:
+        writer.write({k: v for k, v in guide.items() if k != "rev"})
+    writer.close()
+    return len(guides)
+
+def _iter_histories(history_dir, include_archived):
+    """(이름, 상담 dict)를 하나씩 읽어 내놓습니다. 보관된 상담은 필요할 때 하나씩 풉니다."""
+    for path, _ in history_index.list_entries(history_dir):
+        data = history_store.load_history(path)
+        if data is not None:
+            yield os.path.basename(path), data
+    if include_archived:
+        for name, _ in history_archive.list_entries(history_dir):
+            data = history_archive.load(history_dir, name)
+            if data is not None:
+                yield name, data
+
+@metrics.timed("bulk_io.export_histories")
+def export_histories(history_dir, out, fmt, include_archived=True):
+    """상담을 out(바이너리 파일 객체)에 씁니다. 쓴 상담 수를 반환합니다."""
+    writer = _RowWriter(out, fmt, HISTORY_COLUMNS)
+    count = 0
+    for name, data in _iter_histories(history_dir, include_archived):
+        header = {field: data.get(field) for field in HISTORY_HEADER_FIELDS}
+        if fmt == "jsonl":
+            writer.write(dict(header, name=name, messages=data.get("messages", [])))
+        else:
+            for message in data.get("messages") or [{}]:
+                writer.write(dict(header, consultation=name, **{k: message.get(k) for k in MESSAGE_FIELDS}))
+        count += 1
+    writer.close()
+    return count
+
+
+# --- CLI ---
+def _print_progress(result):
+    print(f"\r기록 {result['imported']:,}건 / 건너뜀 {result['skipped']:,}건 / 오류 {result['error_count']:,}건",
+          end="", flush=True)
+
+def main(argv):
+    if len(argv) < 3 or argv[0] not in ("import", "export") or argv[1] not in ("guides", "histories"):
+        print(__doc__)
+        return 1
+    command, kind, path = argv[:3]
+    target = argv[3] if len(argv) > 3 else ("guide/guide.db" if kind == "guides" else "history")
+    fmt = detect_format(path)
+    if kind == "guides":
+        guide_store.init_store(target)
+    if command == "import":
+        importer = import_guides if kind == "guides" else import_histories
+        with open(path, "rb") as f:
+            result = importer(f, fmt, target, progress=_print_progress)
+        _print_progress(result)
+        print()
+        for row_no, message in result["errors"]:
+            print(f"  {row_no}행: {message}")
+        if result["error_count"] > len(result["errors"]):
+            print(f"  ... 외 {result['error_count'] - len(result['errors'])}건")
+    else:
+        exporter = export_guides if kind == "guides" else export_histories
+        with open(path, "wb") as f:
+            print(f"{exporter(target, f, fmt):,}건을 {path}에 썼습니다.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,194 @@
+"""챗봇 응답 생성 (비동기 스트리밍, 교체 가능한 제공자).
+
+제공자(Responder)는 `astream(question, history, reply)` 비동기 제너레이터로 답변 조각(str)을
+내보내고, 출처는 `reply.source`에 기록합니다. 제공자는 백그라운드 이벤트 루프 스레드에서
+실행되므로 Streamlit 스크립트 스레드는 첫 조각이 도착하는 즉시 화면에 그릴 수 있습니다.
+
+    stream = chatbot.start_response(question)
+    st.write_stream(stream)          # 조각이 도착하는 대로 표시
+    stream.text, stream.source, stream.error
+
+제공자는 환경 변수 CHATBOT_PROVIDER로 고릅니다 (기본값: "fake").
+"""
+import asyncio
+import os
+import queue
+import threading
+import time
+
+# --- 상수 정의 ---
+DEFAULT_PROVIDER = os.environ.get("CHATBOT_PROVIDER", "fake")
+FIRST_TOKEN_TIMEOUT = float(os.environ.get("CHATBOT_FIRST_TOKEN_TIMEOUT", "15"))
+TOTAL_TIMEOUT = float(os.environ.get("CHATBOT_TIMEOUT", "120"))
+
+_DONE = object()
+
+
+# --- 제공자 ---
+class Responder:
+    """챗봇 제공자 인터페이스. 실제 모델 연동은 이 클래스를 상속해 PROVIDERS에 등록합니다."""
+
+    name = "base"
+
+    async def astream(self, question, history, reply):
+        """답변 조각(str)을 순서대로 yield 합니다. 출처는 reply.source에 기록합니다."""
+        raise NotImplementedError
+        yield  # 비동기 제너레이터로 인식되도록
+
+
+class FakeResponder(Responder):
+    """네트워크 없이 동작하는 로컬 예시 제공자. 개발/테스트용입니다."""
+
+    name = "fake"
+
+    def __init__(self, delay=None):
+        self.delay = float(os.environ.get("CHATBOT_FAKE_DELAY", "0.02")) if delay is None else delay
+
+    async def astream(self, question, history, reply):
+        reply.source = "https://docs.streamlit.io"
+        for i, word in enumerate(f"'{question}'에 대한 답변입니다. 이 답변은 예시입니다.".split(" ")):
+            await asyncio.sleep(self.delay)
+            yield word if i == 0 else " " + word
+
+
+class GuideResponder(Responder):
+    """가이드에 이미 답이 있는 질문은 모델을 호출하지 않고 가이드 답변을 그대로 내보냅니다."""
+
+    name = "guide"
+
+    def __init__(self, guide):
+        self.guide = guide
+
+    async def astream(self, question, history, reply):
+        reply.source = f"가이드: {self.guide.get('prompt', '')}"
+        yield self.guide.get("response", "")
+
+
+class CachedResponder(Responder):
+    """응답 캐시(answer_cache)에 저장된 답변을 그대로 내보냅니다."""
+
+    name = "cache"
+
+    def __init__(self, cached):
+        self.cached = cached
+
+    async def astream(self, question, history, reply):
+        reply.source = self.cached.get("source")
+        yield self.cached.get("response", "")
+
+
+PROVIDERS = {
+    FakeResponder.name: FakeResponder,
+}
+
+def get_responder(name=None):
+    name = name or DEFAULT_PROVIDER
+    if name not in PROVIDERS:
+        raise ValueError(f"알 수 없는 챗봇 제공자입니다: {name} (사용 가능: {', '.join(PROVIDERS)})")
+    return PROVIDERS[name]()
+
+
+# --- 백그라운드 이벤트 루프 ---
+_loop = None
+_loop_lock = threading.Lock()
+
+def _get_loop():
+    """모든 세션이 공유하는 이벤트 루프 스레드를 (처음 한 번) 띄웁니다."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="chatbot-loop", daemon=True).start()
+        return _loop
+
+
+# --- 스트림 ---
+class ResponseStream:
+    """제공자의 비동기 스트림을 Streamlit 스레드에서 쓰는 동기 이터레이터로 바꿉니다.
+
+    반복이 끝나면 text/source/error가 채워집니다. 시간 초과, cancel(), 또는 반복 중단
+    (rerun으로 스크립트가 멈춘 경우 등) 시 제공자 작업도 함께 취소됩니다.
+    """
+
+    def __init__(self, responder, question, history=None, context=None,
+                 first_token_timeout=FIRST_TOKEN_TIMEOUT, timeout=TOTAL_TIMEOUT):
+        self.responder = responder
+        self.question = question
+        self.history = history or []
+        self.context = context or [] # 검색된 관련 가이드 (제공자가 프롬프트에 활용)
+        self.first_token_timeout = first_token_timeout
+        self.timeout = timeout
+        self.chunks = []
+        self.source = None
+        self.error = None
+        self.started_at = None
+        self.first_token_at = None
+        self.finished_at = None
+        self._queue = queue.Queue()
+        self._future = None
+
+    async def _pump(self):
+        try:
+            async for chunk in self.responder.astream(self.question, self.history, self):
+                self._queue.put(chunk)
+        except Exception as e:  # 제공자 오류는 스트림 오류로 전달합니다.
+            self._queue.put(e)
+        finally:
+            self._queue.put(_DONE)
+
+    def cancel(self):
+        if self._future is not None and not self._future.done():
+            self._future.cancel()
+
+    def __iter__(self):
+        self.started_at = time.monotonic()
+        self._future = asyncio.run_coroutine_threadsafe(self._pump(), _get_loop())
+        deadline = self.started_at + self.timeout
+        first_deadline = self.started_at + self.first_token_timeout
+        try:
+            while True:
+                now = time.monotonic()
+                wait = (first_deadline if self.first_token_at is None else deadline) - now
+                try:
+                    item = self._queue.get(timeout=max(min(wait, deadline - now), 0))
+                except queue.Empty:
+                    self.error = "응답 시간이 초과되었습니다."
+                    return
+                if item is _DONE:
+                    return
+                if isinstance(item, Exception):
+                    self.error = f"응답 생성 중 오류가 발생했습니다: {item}"
+                    return
+                if self.first_token_at is None:
+                    self.first_token_at = time.monotonic()
+                self.chunks.append(item)
+                yield item
+        finally:
+            self.finished_at = time.monotonic()
+            self.cancel()
+
+    @property
+    def text(self):
+        return "".join(self.chunks)
+
+    @property
+    def time_to_first_token(self):
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+
+def start_response(question, history=None, responder=None, matches=None,
+                   direct_answer_threshold=None):
+    """질문에 대한 응답 스트림을 만듭니다. 반복을 시작할 때 제공자가 실행됩니다.
+
+    matches는 검색된 [(가이드, 점수, 질문 유사도), ...]입니다. 가장 비슷한 가이드의 질문
+    유사도가 임계값 이상이면 모델 대신 GuideResponder가 가이드 답변을 반환합니다.
+    """
+    matches = matches or []
+    if responder is None and matches and direct_answer_threshold is not None:
+        guide, _, prompt_score = matches[0]
+        if prompt_score >= direct_answer_threshold:
+            responder = GuideResponder(guide)
+    context = [guide for guide, _, _ in matches]
+    return ResponseStream(responder or get_responder(), question, history=history, context=context)
@@ -0,0 +1,138 @@
+"""여러 세션/프로세스가 같은 볼륨의 파일을 안전하게 쓰기 위한 저장 계층.
+
+- 교체 쓰기: 같은 폴더의 임시 파일에 쓰고 fsync 한 뒤 os.replace로 바꿔 끼웁니다.
+  쓰는 도중 죽어도 읽는 쪽은 이전 내용이나 새 내용 중 하나만 보게 됩니다.
+- 잠금: 파일마다 `.locks/<파일명>.lock`에 fcntl 권고 잠금을 겁니다. 원본 파일은 교체되어
+  inode가 바뀌므로 잠금은 별도 파일에 겁니다. 같은 파일을 고치는 작업(덧붙이기, 읽고-고쳐-쓰기,
+  압축)은 모두 이 잠금 안에서 수행해야 합니다.
+- 버전 충돌: 읽은 시점의 버전(rev)을 들고 와서 저장할 때 비교하고, 다르면 VersionConflict.
+"""
+import contextlib
+import fcntl
+import json
+import os
+import tempfile
+
+import metrics
+
+LOCK_DIRNAME = ".locks"
+# mkstemp는 0600으로 만듭니다. 다른 사용자(nginx)가 읽어야 하는 파일은 open()과 같은 권한으로 바꿉니다.
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+PUBLIC_FILE_MODE = 0o644 & ~_UMASK
+
+
+class VersionConflict(Exception):
+    """다른 세션이 먼저 같은 레코드를 수정한 경우."""
+
+    def __init__(self, target, expected, actual):
+        super().__init__(f"{target}: 버전 충돌 (예상 {expected}, 현재 {actual})")
+        self.target = target
+        self.expected = expected
+        self.actual = actual
+
+
+# --- 잠금 ---
+def _lock_path(path):
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, LOCK_DIRNAME, name + ".lock")
+
+@contextlib.contextmanager
+def locked(path, shared=False):
+    """path에 대한 프로세스 간 권고 잠금. shared=True면 읽기(공유) 잠금입니다."""
+    lock_path = _lock_path(path)
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+# --- 쓰기 ---
+def _fsync_dir(directory):
+    fd = os.open(directory or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+@contextlib.contextmanager
+def atomic_open(path):
+    """교체 쓰기용 바이너리 파일 객체. 블록이 예외 없이 끝나야 path가 바뀝니다."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+            metrics.bytes_written(f.tell())
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+    _fsync_dir(directory)
+
+def atomic_write_bytes(path, payload):
+    with atomic_open(path) as f:
+        f.write(payload)
+
+def atomic_write_json(path, data, indent=None):
+    atomic_write_bytes(path, json.dumps(data, ensure_ascii=False, indent=indent).encode("utf-8"))
+
+def fsync_files(paths):
+    """이미 쓴 파일들과 그 폴더를 fsync 합니다. 여러 새 파일을 쓴 뒤 한 번에 내구성을 확보할 때 씁니다."""
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    for directory in {os.path.dirname(os.path.abspath(path)) for path in paths}:
+        _fsync_dir(directory)
+
+def spool(fileobj, directory, chunk_size=1024 * 1024):
+    """파일 객체의 내용을 directory의 새 파일(고유 이름)에 블록 단위로 쓰고 fsync 한 뒤 경로를 반환합니다.
+
+    백그라운드 작업에 업로드를 넘길 때 씁니다. 작업은 다른 프로세스에서 실행될 수도 있습니다.
+    """
+    os.makedirs(directory, exist_ok=True)
+    fileobj.seek(0)
+    fd, path = tempfile.mkstemp(dir=directory, suffix=".upload")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = fileobj.read(chunk_size)
+                if not chunk:
+                    break
+                f.write(chunk)
+                metrics.bytes_written(len(chunk))
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+def append_bytes(path, payload, create=False):
+    """잠금을 잡고 파일 끝에 덧붙인 뒤 fsync 합니다. (호출자가 이미 잠금을 잡았다면 append_locked)"""
+    with locked(path):
+        append_locked(path, payload, create=create)
+
+def append_locked(path, payload, create=False):
+    """파일 끝에 덧붙입니다. create=False면 파일이 없을 때 FileNotFoundError.
+
+    그 사이 다른 곳에서 보관/삭제한 상담 파일을 header 없이 다시 만들지 않도록 기본은 만들지 않습니다.
+    """
+    flags = os.O_WRONLY | os.O_APPEND | (os.O_CREAT if create else 0)
+    fd = os.open(path, flags, 0o644)
+    try:
+        os.write(fd, payload)
+        os.fsync(fd)
+        metrics.bytes_written(len(payload))
+    finally:
+        os.close(fd)
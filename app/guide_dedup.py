@@ -0,0 +1,298 @@
+"""가이드 중복(거의 같은 질문/답변) 찾기: MinHash + LSH.
+
+가이드의 질문과 답변을 이어 붙여 정규화(NFKC, 소문자, 공백 제거)한 뒤 문자 3-gram 집합으로 보고,
+NUM_PERM개의 해시 함수로 MinHash 서명을 만듭니다. 두 서명에서 값이 같은 자리의 비율이 두 집합의
+Jaccard 유사도 추정치입니다.
+
+서명을 BANDS개의 띠(band)로 나누어 띠마다 버킷에 넣어 두면, 새 가이드와 띠 하나라도 같은
+가이드만 후보로 꺼내 비교하므로 가이드 수와 거의 무관한 시간에 중복 후보를 찾습니다.
+(BANDS=16, 띠당 4자리: 유사도 0.8인 쌍은 99.9% 이상 후보로 잡힙니다)
+
+색인은 프로세스당 하나를 메모리에 두고 가이드 추가/수정/삭제 시 해당 행만 갱신합니다.
+numpy는 처음 색인을 만들 때 불러옵니다.
+
+기존 가이드 전체에서 중복 묶음을 찾아 정리할 수도 있습니다 (묶음마다 가장 최근 가이드만 남김):
+    python guide_dedup.py [guide.db]            # 찾기만
+    python guide_dedup.py [guide.db] --apply    # 삭제까지
+"""
+import os
+import sys
+import threading
+import unicodedata
+
+import metrics
+
+# --- 상수 정의 ---
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+DUPLICATE_THRESHOLD = float(os.environ.get("GUIDE_DUPLICATE_THRESHOLD", "0.8"))
+SIGNATURE_CHUNK = 5000 # 서명을 한 번에 계산하는 가이드 수 (임시 배열 크기 제한)
+MAX_UNSORTED = 4096 # 정렬하지 않고 훑는 최근 추가 행 수의 상한
+_GRAM_BASE = 1_000_003
+_BAND_BASE = 0x9E3779B97F4A7C15
+_SEED = 20240611
+
+_permutations = None
+
+
+def _normalize(text):
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return "".join(text.split())
+
+def _document(guide):
+    return _normalize(guide.get("prompt")) + "\n" + _normalize(guide.get("response"))
+
+def _get_permutations():
+    global _permutations
+    if _permutations is None:
+        import numpy as np
+        rng = np.random.default_rng(_SEED)
+        _permutations = (
+            rng.integers(0, 1 << 63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1),
+            rng.integers(0, 1 << 63, size=NUM_PERM, dtype=np.uint64),
+        )
+    return _permutations
+
+def signatures(documents):
+    """문서들의 MinHash 서명 (문서 수 × NUM_PERM, uint32).
+
+    모든 문서의 문자를 한 배열로 이어 붙여 3-gram 해시를 한 번에 구하고, 문서별 최솟값은
+    np.minimum.reduceat으로 구하므로 문서마다 파이썬 반복을 돌지 않습니다.
+    해시 함수는 (a*x + b)의 상위 32비트(multiply-shift)입니다. uint64 곱셈의 넘침은 의도된 것입니다.
+    """
+    import numpy as np
+    documents = [doc.ljust(SHINGLE_SIZE, "\0") for doc in documents]
+    if not documents:
+        return np.zeros((0, NUM_PERM), dtype=np.uint32)
+    lengths = np.fromiter((len(doc) for doc in documents), dtype=np.int64, count=len(documents))
+    codes = np.frombuffer("".join(documents).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    grams = np.zeros(len(codes) - SHINGLE_SIZE + 1, dtype=np.uint64)
+    for i in range(SHINGLE_SIZE):
+        grams = grams * np.uint64(_GRAM_BASE) + codes[i:len(codes) - SHINGLE_SIZE + 1 + i]
+    # 문서 경계를 넘는 3-gram은 빼고, 문서별 3-gram이 시작하는 위치(offsets)를 구합니다.
+    counts = lengths - SHINGLE_SIZE + 1
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    doc_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    grams = grams[np.repeat(doc_starts - offsets, counts) + np.arange(counts.sum())]
+
+    a, b = _get_permutations()
+    result = np.empty((len(documents), NUM_PERM), dtype=np.uint32)
+    hashed = np.empty_like(grams)
+    for p in range(NUM_PERM):
+        np.multiply(grams, a[p], out=hashed)
+        hashed += b[p]
+        hashed >>= np.uint64(32)
+        result[:, p] = np.minimum.reduceat(hashed, offsets)
+    return result
+
+def _band_keys(signature_rows):
+    """서명 (n × NUM_PERM) -> 띠별 버킷 키 (n × BANDS, uint64)."""
+    import numpy as np
+    bands = signature_rows.reshape(len(signature_rows), BANDS, ROWS_PER_BAND).astype(np.uint64)
+    keys = np.zeros(bands.shape[:2], dtype=np.uint64)
+    for i in range(ROWS_PER_BAND):
+        keys = keys * np.uint64(_BAND_BASE) + bands[:, :, i]
+    return keys
+
+
+# --- 색인 ---
+class GuideDedupIndex:
+    """띠별 버킷은 dict 대신 정렬된 배열(키, 행 번호)로 둡니다. 10만 건이면 16개 띠 × 10만 개의
+    파이썬 객체 대신 배열 몇 개(수십 MB)이고, 같은 키 찾기는 searchsorted입니다.
+    정렬 뒤에 추가된 행(tail)은 따로 훑으며, MAX_UNSORTED를 넘으면 다시 정렬합니다.
+    """
+
+    def __init__(self):
+        import numpy as np
+        self.ids = []            # 행 번호 -> 가이드 id (삭제된 행 포함)
+        self.rows = {}           # 가이드 id -> 살아 있는 행 번호
+        self.alive = np.zeros(0, dtype=bool)
+        self.signatures = np.zeros((0, NUM_PERM), dtype=np.uint32)
+        self.keys = np.zeros((0, BANDS), dtype=np.uint64)
+        self.sorted_count = 0    # 정렬된 행 수. 이후 행은 tail
+        self.sorted_keys = np.zeros((BANDS, 0), dtype=np.uint64)
+        self.sorted_rows = np.zeros((BANDS, 0), dtype=np.int64)
+        self.version = None
+        self.lock = threading.Lock()
+
+    def _sort(self):
+        import numpy as np
+        by_band = self.keys.T
+        self.sorted_rows = np.argsort(by_band, axis=1, kind="stable")
+        self.sorted_keys = np.take_along_axis(by_band, self.sorted_rows, axis=1)
+        self.sorted_count = len(self.keys)
+
+    def upsert(self, guides):
+        """가이드들의 서명을 만들어 끝에 붙입니다. 같은 id의 기존 행은 삭제 표시합니다."""
+        import numpy as np
+        guides = [g for g in guides if g.get("id")]
+        if not guides:
+            return
+        new_signatures = np.concatenate([
+            signatures([_document(g) for g in guides[start:start + SIGNATURE_CHUNK]])
+            for start in range(0, len(guides), SIGNATURE_CHUNK)
+        ])
+        with self.lock:
+            for guide in guides:
+                row = self.rows.pop(guide["id"], None)
+                if row is not None:
+                    self.alive[row] = False
+            first = len(self.ids)
+            for offset, guide in enumerate(guides):
+                self.ids.append(guide["id"])
+                self.rows[guide["id"]] = first + offset
+            self.alive = np.concatenate([self.alive, np.ones(len(guides), dtype=bool)])
+            self.signatures = np.concatenate([self.signatures, new_signatures])
+            self.keys = np.concatenate([self.keys, _band_keys(new_signatures)])
+            if len(self.keys) - self.sorted_count > MAX_UNSORTED:
+                self._sort()
+
+    def remove(self, guide_ids):
+        # 삭제된 행은 버킷 배열에 남아 있어도 alive로 걸러집니다.
+        with self.lock:
+            for guide_id in guide_ids:
+                row = self.rows.pop(guide_id, None)
+                if row is not None:
+                    self.alive[row] = False
+
+    @metrics.timed("guide_dedup.find")
+    def find(self, guide, threshold=DUPLICATE_THRESHOLD, k=5):
+        """guide와 유사도가 threshold 이상인 다른 가이드 [(가이드 id, 유사도), ...] (내림차순, 최대 k개)."""
+        import numpy as np
+        signature = signatures([_document(guide)])
+        keys = _band_keys(signature)[0]
+        with self.lock:
+            found = []
+            for band in range(BANDS):
+                lo, hi = np.searchsorted(self.sorted_keys[band], keys[band], side="left"), \
+                    np.searchsorted(self.sorted_keys[band], keys[band], side="right")
+                found.append(self.sorted_rows[band, lo:hi])
+            found.append(np.flatnonzero((self.keys[self.sorted_count:] == keys).any(axis=1)) + self.sorted_count)
+            candidates = np.unique(np.concatenate(found))
+            candidates = candidates[self.alive[candidates]]
+            own_row = self.rows.get(guide.get("id"))
+            if own_row is not None:
+                candidates = candidates[candidates != own_row]
+            if not len(candidates):
+                return []
+            similarity = (self.signatures[candidates] == signature).mean(axis=1)
+            order = np.argsort(-similarity, kind="stable")[:k]
+            return [(self.ids[candidates[i]], float(similarity[i])) for i in order if similarity[i] >= threshold]
+
+    @metrics.timed("guide_dedup.groups")
+    def groups(self, threshold=DUPLICATE_THRESHOLD, rank=None):
+        """전체 가이드에서 중복 묶음 [[가이드 id, ...], ...]을 찾습니다. (2개 이상인 묶음만)
+
+        띠마다 같은 키가 이어진 구간에서 첫 행과 나머지 행을 쌍으로 만들어 유사도를 한 번에 비교하고,
+        통과한 쌍을 union-find로 이어 후보 묶음을 만듭니다. 이어진 것만으로는 A~B, B~C일 때 서로 다른
+        A와 C도 한 묶음이 되므로, 후보 묶음마다 rank(가이드 id)가 가장 큰 가이드를 남길 가이드로 정하고
+        그 가이드와 유사도가 threshold 이상인 가이드만 묶습니다. 남은 가이드는 같은 방법으로 다시 묶습니다.
+        묶음의 첫 id가 남길 가이드이고, 나머지는 rank 내림차순입니다.
+        """
+        import numpy as np
+        rank = rank or (lambda guide_id: 0)
+        with self.lock:
+            if self.sorted_count != len(self.keys):
+                self._sort()
+            pairs = []
+            for band in range(BANDS):
+                rows = self.sorted_rows[band]
+                live = self.alive[rows]
+                rows, keys = rows[live], self.sorted_keys[band][live]
+                if len(rows) < 2:
+                    continue
+                run_start = np.concatenate([[True], keys[1:] != keys[:-1]])
+                first = rows[run_start][np.cumsum(run_start) - 1]
+                pairs.append(np.stack([first[~run_start], rows[~run_start]], axis=1))
+            if not pairs:
+                return []
+            pairs = np.unique(np.concatenate(pairs), axis=0)
+            similar = (self.signatures[pairs[:, 0]] == self.signatures[pairs[:, 1]]).mean(axis=1) >= threshold
+            pairs = pairs[similar].tolist()
+
+            parent = {}
+
+            def root(row):
+                while parent.get(row, row) != row:
+                    parent[row] = parent.get(parent[row], parent[row])
+                    row = parent[row]
+                return row
+
+            for a, b in pairs:
+                ra, rb = root(a), root(b)
+                if ra != rb:
+                    parent[max(ra, rb)] = min(ra, rb)
+            components = {}
+            for row in parent:
+                components.setdefault(root(row), set()).update((row, root(row)))
+
+            groups = []
+            for component in components.values():
+                rows = sorted(component, key=lambda row: (rank(self.ids[row]), -row), reverse=True)
+                while len(rows) > 1:
+                    keep, others = rows[0], np.array(rows[1:])
+                    similar = (self.signatures[others] == self.signatures[keep]).mean(axis=1) >= threshold
+                    if similar.any():
+                        groups.append([self.ids[row] for row in [keep] + others[similar].tolist()])
+                    rows = others[~similar].tolist()
+            return groups
+
+
+# --- 프로세스 공용 색인 관리 ---
+_indexes = {}  # db_path -> GuideDedupIndex
+_indexes_lock = threading.Lock()
+
+def get_index(db_path, version, load_guides):
+    """저장소 version에 맞는 색인을 반환합니다. 버전이 다르면 load_guides()로 다시 만듭니다."""
+    with _indexes_lock:
+        index = _indexes.get(db_path)
+        if index is None or index.version != version:
+            index = GuideDedupIndex()
+            index.upsert(load_guides())
+            index.version = version
+            _indexes[db_path] = index
+        return index
+
+def apply_changes(db_path, old_version, new_version, upserts=(), removals=()):
+    """가이드 저장 직후 바뀐 가이드만 색인에 반영합니다. 색인이 old_version 상태가 아니면 그대로 둡니다."""
+    with _indexes_lock:
+        index = _indexes.get(db_path)
+        if index is None or index.version != old_version:
+            return
+        if upserts:
+            index.upsert(list(upserts))
+        if removals:
+            index.remove(removals)
+        index.version = new_version
+
+def rebuild(db_path, version, guides):
+    """저장소 전체(version 시점의 guides)로 색인을 새로 만들어 바꿔 끼웁니다. 만드는 동안에는 기존 색인을 씁니다."""
+    index = GuideDedupIndex()
+    index.upsert(guides)
+    index.version = version
+    with _indexes_lock:
+        _indexes[db_path] = index
+    return index
+
+
+# --- CLI ---
+def main(argv):
+    import guide_store
+    apply = "--apply" in argv
+    args = [arg for arg in argv if arg != "--apply"]
+    db_path = args[0] if args else os.path.join("guide", "guide.db")
+    guide_store.init_store(db_path)
+    groups = guide_store.find_duplicate_groups(db_path)
+    for group in groups:
+        print(f"- {len(group)}건: " + " | ".join(g.get("prompt", "")[:40] for g in group))
+    redundant = [g["id"] for group in groups for g in group[1:]]
+    print(f"중복 묶음 {len(groups)}개 (정리 대상 {len(redundant)}건)")
+    if apply and redundant:
+        print(f"삭제 완료: {guide_store.delete_guides(db_path, redundant)}건")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
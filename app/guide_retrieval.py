@@ -0,0 +1,266 @@
+"""가이드 기반 검색 증강(RAG)용 벡터 색인.
+
+가이드의 질문(prompt)과 답변(response)을 문자 n-gram 해싱 벡터(scikit-learn
+HashingVectorizer, L2 정규화)로 바꿔 두 개의 희소 행렬에 보관하고, 질문 하나에 대해
+행렬-벡터 곱 한 번씩으로 모든 가이드와의 유사도를 구합니다.
+
+해싱 벡터는 어휘 사전을 학습하지 않으므로 가이드가 추가/수정/삭제될 때 해당 행만 새로
+벡터화하면 됩니다. 수정/삭제된 행은 삭제 표시만 하고, 일정 비율이 넘으면 압축합니다.
+색인은 가이드 저장소 옆(`guide_vectors.npz`)에 저장되어 재시작 시 다시 계산하지 않습니다.
+파일 전체를 다시 쓰므로 가이드를 저장할 때마다 쓰지 않고, 메모리 색인만 고친 뒤 SAVE_DELAY초
+뒤(그 사이 변경은 한 번에)와 프로세스 종료 때 저장합니다. 파일이 저장소보다 오래되었으면 행마다
+기록한 가이드 rev와 비교해 바뀐 가이드만 다시 벡터화합니다 (다른 레플리카, 저장 전 비정상 종료).
+
+numpy/scikit-learn은 처음 색인을 만들거나 읽을 때 불러옵니다.
+"""
+import atexit
+import os
+import threading
+
+import fileio
+import metrics
+
+# --- 상수 정의 ---
+VECTOR_FEATURES = 2 ** 18
+NGRAM_RANGE = (2, 3)
+PROMPT_WEIGHT = 0.7 # 최종 점수 = 0.7 * 질문 유사도 + 0.3 * 답변 유사도
+COMPACT_RATIO = 0.25 # 삭제 표시된 행이 이 비율을 넘으면 행렬을 다시 만듭니다.
+DIRECT_ANSWER_THRESHOLD = float(os.environ.get("GUIDE_DIRECT_ANSWER_THRESHOLD", "0.85"))
+SAVE_DELAY = float(os.environ.get("GUIDE_VECTORS_SAVE_DELAY", "30")) # 변경 후 색인 파일을 저장하기까지(초)
+
+_vectorizer = None
+
+
+def vectors_path(db_path):
+    return os.path.splitext(db_path)[0] + "_vectors.npz"
+
+def _get_vectorizer():
+    global _vectorizer
+    if _vectorizer is None:
+        import numpy as np
+        from sklearn.feature_extraction.text import HashingVectorizer
+        _vectorizer = HashingVectorizer(
+            analyzer="char_wb", ngram_range=NGRAM_RANGE, n_features=VECTOR_FEATURES,
+            alternate_sign=False, norm="l2", dtype=np.float32,
+        )
+    return _vectorizer
+
+
+# --- 색인 ---
+class GuideVectorIndex:
+    def __init__(self):
+        import numpy as np
+        from scipy import sparse
+        self.ids = []            # 행 번호 -> 가이드 id (삭제된 행 포함)
+        self.rows = {}           # 가이드 id -> 살아 있는 행 번호
+        self.revs = {}           # 가이드 id -> 색인에 반영된 rev
+        self.alive = np.zeros(0, dtype=bool)
+        self.prompts = sparse.csr_matrix((0, VECTOR_FEATURES), dtype=np.float32)
+        self.responses = sparse.csr_matrix((0, VECTOR_FEATURES), dtype=np.float32)
+        self.version = None      # 색인에 반영된 저장소 버전
+        self.lock = threading.Lock()
+
+    def _mark_dead(self, guide_id):
+        row = self.rows.pop(guide_id, None)
+        self.revs.pop(guide_id, None)
+        if row is not None:
+            self.alive[row] = False
+
+    def upsert(self, guides):
+        """가이드들을 한 번에 벡터화해 행렬 끝에 붙입니다. 기존 행은 삭제 표시합니다."""
+        import numpy as np
+        from scipy import sparse
+        guides = [g for g in guides if g.get("id")]
+        if not guides:
+            return
+        vectorizer = _get_vectorizer()
+        prompt_vectors = vectorizer.transform([g.get("prompt") or "" for g in guides])
+        response_vectors = vectorizer.transform([g.get("response") or "" for g in guides])
+        with self.lock:
+            for guide in guides:
+                self._mark_dead(guide["id"])
+            start = len(self.ids)
+            for offset, guide in enumerate(guides):
+                self.ids.append(guide["id"])
+                self.rows[guide["id"]] = start + offset
+                self.revs[guide["id"]] = guide.get("rev") or 0
+            self.alive = np.concatenate([self.alive, np.ones(len(guides), dtype=bool)])
+            self.prompts = sparse.vstack([self.prompts, prompt_vectors], format="csr")
+            self.responses = sparse.vstack([self.responses, response_vectors], format="csr")
+            self._maybe_compact()
+
+    def remove(self, guide_ids):
+        with self.lock:
+            for guide_id in guide_ids:
+                self._mark_dead(guide_id)
+            self._maybe_compact()
+
+    def catch_up(self, guides):
+        """guides(저장소 전체)와 rev가 다른 가이드만 다시 벡터화하고, 없어진 가이드는 지웁니다."""
+        current = {g["id"] for g in guides if g.get("id")}
+        changed = [g for g in guides if g.get("id") and self.revs.get(g["id"]) != (g.get("rev") or 0)]
+        removed = [guide_id for guide_id in self.rows if guide_id not in current]
+        self.upsert(changed)
+        self.remove(removed)
+        return len(changed) + len(removed)
+
+    def _maybe_compact(self):
+        dead = len(self.ids) - len(self.rows)
+        if not dead or dead < COMPACT_RATIO * len(self.ids):
+            return
+        keep = self.alive.nonzero()[0]
+        self.ids = [self.ids[i] for i in keep]
+        self.rows = {guide_id: row for row, guide_id in enumerate(self.ids)}
+        self.alive = self.alive[keep]
+        self.prompts = self.prompts[keep]
+        self.responses = self.responses[keep]
+
+    @metrics.timed("guide_retrieval.search")
+    def search(self, question, k=3):
+        """[(가이드 id, 점수, 질문 유사도), ...]를 점수 내림차순으로 최대 k개 반환합니다."""
+        import numpy as np
+        query = _get_vectorizer().transform([question or ""]).T
+        with self.lock:
+            if not self.rows:
+                return []
+            prompt_scores = np.asarray((self.prompts @ query).todense()).ravel()
+            response_scores = np.asarray((self.responses @ query).todense()).ravel()
+            scores = PROMPT_WEIGHT * prompt_scores + (1 - PROMPT_WEIGHT) * response_scores
+            scores[~self.alive] = -1.0
+            k = min(k, len(self.rows))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self.ids[i], float(scores[i]), float(prompt_scores[i])) for i in top if scores[i] > 0]
+
+    # --- 저장 / 불러오기 ---
+    def save(self, path):
+        import numpy as np
+        with self.lock, fileio.atomic_open(path) as f:
+            np.savez(
+                f, version=np.int64(-1 if self.version is None else self.version),
+                ids=np.array(self.ids, dtype=str), alive=self.alive,
+                revs=np.array([self.revs.get(guide_id, -1) if self.alive[row] else -1
+                               for row, guide_id in enumerate(self.ids)], dtype=np.int64),
+                p_data=self.prompts.data, p_indices=self.prompts.indices, p_indptr=self.prompts.indptr,
+                r_data=self.responses.data, r_indices=self.responses.indices, r_indptr=self.responses.indptr,
+            )
+
+    @classmethod
+    def load(cls, path):
+        import numpy as np
+        from scipy import sparse
+        index = cls()
+        metrics.bytes_read(os.path.getsize(path))
+        with np.load(path, allow_pickle=False) as f:
+            index.version = int(f["version"])
+            index.ids = [str(i) for i in f["ids"]]
+            index.alive = f["alive"].astype(bool)
+            shape = (len(index.ids), VECTOR_FEATURES)
+            index.prompts = sparse.csr_matrix((f["p_data"], f["p_indices"], f["p_indptr"]), shape=shape)
+            index.responses = sparse.csr_matrix((f["r_data"], f["r_indices"], f["r_indptr"]), shape=shape)
+            revs = f["revs"] if "revs" in f.files else None # 없으면(이전 형식) 따라잡을 때 모두 다시 벡터화
+        index.rows = {guide_id: row for row, guide_id in enumerate(index.ids) if index.alive[row]}
+        if revs is not None:
+            index.revs = {guide_id: int(revs[row]) for guide_id, row in index.rows.items()}
+        return index
+
+
+# --- 프로세스 공용 색인 관리 ---
+_indexes = {}  # db_path -> GuideVectorIndex
+_indexes_lock = threading.Lock()
+_dirty = set()  # 메모리 색인이 파일보다 새로운 db_path
+_save_timers = {}  # db_path -> 예약된 저장 타이머
+
+def get_index(db_path, version, load_guides):
+    """저장소 version에 맞는 색인을 반환합니다.
+
+    메모리 → 디스크(guide_vectors.npz) 순으로 찾습니다. 버전이 다르면 load_guides()와 비교해 바뀐
+    가이드만 반영하고(파일이 없거나 읽을 수 없으면 새로 만들고), 파일 저장은 예약합니다.
+    """
+    with _indexes_lock:
+        index = _indexes.get(db_path)
+        if index is not None and index.version == version:
+            return index
+        if index is None:
+            path = vectors_path(db_path)
+            if os.path.exists(path):
+                try:
+                    index = GuideVectorIndex.load(path)
+                except (OSError, ValueError, KeyError):
+                    index = None
+        if index is None:
+            index = GuideVectorIndex()
+        if index.version != version:
+            metrics.count("guide_retrieval.caught_up", index.catch_up(load_guides()))
+            index.version = version
+            _schedule_save(db_path)
+        _indexes[db_path] = index
+        return index
+
+def apply_changes(db_path, old_version, new_version, upserts=(), removals=()):
+    """가이드 저장 직후 바뀐 가이드만 다시 벡터화해 메모리 색인에 반영합니다. 파일 저장은 예약합니다.
+
+    이 프로세스에 색인이 없거나, 색인이 old_version 상태가 아니면 아무 일도 하지 않습니다.
+    """
+    with _indexes_lock:
+        index = _indexes.get(db_path)
+        if index is None or index.version != old_version:
+            return
+        if upserts:
+            index.upsert(list(upserts))
+        if removals:
+            index.remove(removals)
+        index.version = new_version
+        _schedule_save(db_path)
+
+def rebuild(db_path, version, guides):
+    """저장소 전체(version 시점의 guides)로 색인을 새로 만들어 바꿔 끼우고 바로 저장합니다.
+
+    만드는 동안에는 기존 색인으로 검색합니다.
+    """
+    index = GuideVectorIndex()
+    index.upsert(guides)
+    index.version = version
+    with _indexes_lock:
+        _indexes[db_path] = index
+        _dirty.add(db_path)
+    save(db_path)
+    return index
+
+def _schedule_save(db_path):
+    """SAVE_DELAY초 뒤 저장을 예약합니다. 이미 예약되어 있으면 그 저장이 이번 변경까지 함께 씁니다."""
+    _dirty.add(db_path)
+    if db_path in _save_timers:
+        return
+    timer = threading.Timer(max(SAVE_DELAY, 0.0), save, args=(db_path,))
+    timer.daemon = True
+    _save_timers[db_path] = timer
+    timer.start()
+
+@metrics.timed("guide_retrieval.save")
+def save(db_path):
+    """메모리 색인이 파일보다 새로우면 저장합니다. 실패하면 다시 예약합니다."""
+    with _indexes_lock:
+        _save_timers.pop(db_path, None)
+        index = _indexes.get(db_path)
+        if db_path not in _dirty or index is None:
+            return
+        _dirty.discard(db_path)
+    try:
+        index.save(vectors_path(db_path))
+    except Exception:
+        metrics.count("guide_retrieval.save_errors")
+        with _indexes_lock:
+            _schedule_save(db_path)
+
+def save_all():
+    """저장을 기다리는 색인을 모두 지금 저장합니다. 프로세스가 정상 종료될 때 자동으로 호출됩니다."""
+    with _indexes_lock:
+        pending = list(_dirty)
+        for timer in _save_timers.values():
+            timer.cancel()
+        _save_timers.clear()
+    for db_path in pending:
+        save(db_path)
+
+atexit.register(save_all)
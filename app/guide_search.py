@@ -0,0 +1,159 @@
+"""가이드 지식베이스 검색용 역색인 (BM25).
+
+한글은 띄어쓰기/조사 때문에 단어 단위 일치가 잘 되지 않으므로 문자 2-gram으로,
+그 밖의 문자(영문, 숫자)는 단어 단위로 토큰화합니다.
+색인은 프로세스당 하나를 메모리에 두고, 가이드 추가/수정/삭제 시 해당 문서만 갱신합니다.
+"""
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+import metrics
+
+# --- 상수 정의 ---
+BM25_K1 = 1.2
+BM25_B = 0.75
+# 필드별 가중치: 질문이 일치하는 가이드를 답변/원인만 일치하는 가이드보다 위로 올립니다.
+FIELD_WEIGHTS = {"prompt": 2, "response": 1, "cause": 1}
+
+_WORD_RE = re.compile(r"\w+")
+_HANGUL_RE = re.compile(r"[가-힣ㄱ-ㆎ]")
+
+
+# --- 토큰화 ---
+def tokenize(text):
+    """텍스트를 검색 토큰 목록으로 변환합니다."""
+    tokens = []
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    for word in _WORD_RE.findall(text):
+        if len(word) > 1 and _HANGUL_RE.search(word):
+            tokens += [word[i:i + 2] for i in range(len(word) - 1)]
+        else:
+            tokens.append(word)
+    return tokens
+
+def _document_terms(guide):
+    terms = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        counts = Counter(tokenize(guide.get(field, "")))
+        if weight != 1:
+            for token in counts:
+                counts[token] *= weight
+        terms.update(counts)
+    return terms
+
+
+# --- 색인 ---
+class GuideSearchIndex:
+    def __init__(self, doc_key):
+        self.doc_key = doc_key
+        self.postings = {}   # term -> {doc_id: tf}
+        self.doc_terms = {}  # doc_id -> Counter (삭제/수정 시 역색인에서 빼기 위해 보관)
+        self.doc_length = {} # doc_id -> 가중치 반영 토큰 수
+        self.doc_order = {}  # doc_id -> 정렬 키 (동점일 때 최신순)
+        self.total_length = 0
+        self.signature = None  # 색인에 반영된 저장소 버전
+        self.lock = threading.Lock()
+
+    def _remove(self, doc_id):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self.postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self.postings[term]
+        self.total_length -= self.doc_length.pop(doc_id)
+        self.doc_order.pop(doc_id, None)
+
+    def upsert(self, guide):
+        doc_id = self.doc_key(guide)
+        with self.lock:
+            self._remove(doc_id)
+            terms = _document_terms(guide)
+            for term, tf in terms.items():
+                self.postings.setdefault(term, {})[doc_id] = tf
+            self.doc_terms[doc_id] = terms
+            self.doc_length[doc_id] = sum(terms.values())
+            self.doc_order[doc_id] = guide.get("created_at", "")
+            self.total_length += self.doc_length[doc_id]
+
+    def remove(self, doc_id):
+        with self.lock:
+            self._remove(doc_id)
+
+    @metrics.timed("guide_search.search")
+    def search(self, query, limit=20, offset=0):
+        """(전체 일치 수, [(doc_id, score), ...]) 를 점수 내림차순으로 반환합니다."""
+        query_terms = set(tokenize(query))
+        with self.lock:
+            doc_count = len(self.doc_terms)
+            if not query_terms or not doc_count:
+                return 0, []
+            avg_length = self.total_length / doc_count
+            scores = {}
+            for term in query_terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_length[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+            # 요청한 페이지까지만 부분 정렬합니다.
+            ranked = heapq.nlargest(
+                offset + limit, scores.items(),
+                key=lambda item: (item[1], self.doc_order.get(item[0], "")),
+            )
+        return len(scores), ranked[offset:offset + limit]
+
+
+# --- 프로세스 공용 색인 관리 ---
+_indexes = {}  # source (가이드 저장소 경로) -> GuideSearchIndex
+_indexes_lock = threading.Lock()
+
+def get_index(source, version, load_guides, doc_key):
+    """source의 가이드 색인을 반환합니다.
+
+    색인이 반영한 저장소 버전과 현재 version이 다르면 load_guides()로 전체를 다시 색인합니다.
+    """
+    with _indexes_lock:
+        index = _indexes.get(source)
+        if index is None or index.signature != version:
+            index = _build(version, load_guides(), doc_key)
+            _indexes[source] = index
+        return index
+
+def _build(version, guides, doc_key):
+    index = GuideSearchIndex(doc_key)
+    for guide in guides:
+        index.upsert(guide)
+    index.signature = version
+    return index
+
+def rebuild(source, version, guides, doc_key):
+    """저장소 전체(version 시점의 guides)로 색인을 새로 만들어 바꿔 끼웁니다. 만드는 동안에는 기존 색인을 씁니다."""
+    index = _build(version, guides, doc_key)
+    with _indexes_lock:
+        _indexes[source] = index
+    return index
+
+def apply_changes(source, old_version, new_version, upserts=(), removals=()):
+    """가이드 저장 직후 호출하여, 바뀐 문서만 색인에 반영합니다.
+
+    색인이 old_version 상태가 아니라면(다른 프로세스의 쓰기가 끼어든 경우) 그대로 두어
+    다음 get_index()에서 다시 만들어지도록 합니다.
+    """
+    with _indexes_lock:
+        index = _indexes.get(source)
+        if index is None or index.signature != old_version:
+            return
+        for guide in upserts:
+            index.upsert(guide)
+        for doc_id in removals:
+            index.remove(doc_id)
+        index.signature = new_version
@@ -0,0 +1,384 @@
+"""가이드 지식베이스 저장소 (SQLite, WAL 모드).
+
+여러 상담원이 동시에 저장해도 쓰기가 유실되지 않도록, 가이드 한 건의 추가/수정/삭제를
+각각 한 행에 대한 트랜잭션으로 처리합니다. 상담 화면(app.py)과 가이드 화면(pages/guide.py)은
+모두 이 모듈의 함수만 사용합니다.
+
+기존 guide.json은 init_store()가 처음 한 번 자동으로 옮기며, 직접 실행할 수도 있습니다:
+    python guide_store.py migrate [guide.json] [guide.db]
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+import answer_cache
+import fileio
+import guide_dedup
+import guide_retrieval
+import guide_search
+import metrics
+from sqlite_util import connect as _connect, transaction as _transaction
+
+# --- 상수 정의 ---
+GUIDE_FIELDS = (
+    "id", "prompt", "response", "cause", "attachment_path",
+    "counselor_name", "created_at", "original_source", "rev",
+)
+MIGRATED_SUFFIX = ".migrated"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS guides (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT,
+    prompt TEXT NOT NULL DEFAULT '',
+    response TEXT NOT NULL DEFAULT '',
+    cause TEXT,
+    attachment_path TEXT,
+    counselor_name TEXT,
+    created_at TEXT NOT NULL DEFAULT '',
+    original_source TEXT,
+    rev INTEGER NOT NULL DEFAULT 0,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_guides_created_at ON guides(created_at);
+CREATE INDEX IF NOT EXISTS idx_guides_cause ON guides(cause);
+CREATE INDEX IF NOT EXISTS idx_guides_counselor_name ON guides(counselor_name);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('version', '0');
+"""
+
+_initialized = set()
+_init_lock = threading.Lock()
+
+# 프로세스 전체(모든 세션)가 공유하는 가이드 목록 캐시.
+# db_path -> (저장소 버전, 최신순 가이드 목록, id -> 가이드)
+# 반환된 목록과 dict는 여러 세션이 함께 보므로 호출하는 쪽에서 수정하면 안 됩니다.
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+# --- 헬퍼 함수: 버전 / 파생 색인 ---
+def _notify(db_path, old_version, new_version, upserts=(), removals=()):
+    """쓰기가 끝난 뒤 파생 색인(검색, 벡터, 중복)에 바뀐 가이드만 반영하고 관련 응답 캐시를 비웁니다."""
+    guide_search.apply_changes(db_path, old_version, new_version, upserts=upserts, removals=removals)
+    guide_retrieval.apply_changes(db_path, old_version, new_version, upserts=upserts, removals=removals)
+    guide_dedup.apply_changes(db_path, old_version, new_version, upserts=upserts, removals=removals)
+    answer_cache.invalidate_guides(answer_cache.cache_path(db_path), upserts=upserts, removals=removals)
+
+def _bump_version(conn):
+    """저장소 버전을 1 올리고 (이전 버전, 새 버전)을 반환합니다. 캐시/색인 무효화에 사용됩니다."""
+    old_version = int(conn.execute("SELECT value FROM store_meta WHERE key = 'version'").fetchone()[0])
+    conn.execute("UPDATE store_meta SET value = ? WHERE key = 'version'", (str(old_version + 1),))
+    return old_version, old_version + 1
+
+
+# --- 헬퍼 함수: 행 <-> dict ---
+def _to_row(guide):
+    row = {field: guide.get(field) for field in GUIDE_FIELDS}
+    row["prompt"] = row["prompt"] or ""
+    row["response"] = row["response"] or ""
+    row["created_at"] = row["created_at"] or ""
+    row["rev"] = row["rev"] or 0
+    extra = {k: v for k, v in guide.items() if k not in GUIDE_FIELDS}
+    row["extra"] = json.dumps(extra, ensure_ascii=False) if extra else None
+    return row
+
+def _from_row(row):
+    guide = {field: row[field] for field in GUIDE_FIELDS}
+    if row["extra"]:
+        guide.update(json.loads(row["extra"]))
+    return guide
+
+def new_guide_id():
+    return uuid.uuid4().hex
+
+def guide_key(guide):
+    """가이드를 식별하는 키. 저장 시 부여되는 고유 id이며, 위젯 key에도 사용합니다."""
+    return guide.get("id")
+
+
+# --- 초기화 / 마이그레이션 ---
+def init_store(db_path, legacy_json_path=None):
+    """스키마를 만들고, 저장소가 비어 있으면 기존 guide.json을 한 번 옮겨 옵니다."""
+    with _init_lock:
+        if db_path in _initialized:
+            return
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        conn = _connect(db_path)
+        conn.executescript(_SCHEMA)
+        _upgrade_schema(conn)
+        if legacy_json_path and os.path.exists(legacy_json_path):
+            migrate_from_json(db_path, legacy_json_path)
+        _initialized.add(db_path)
+
+def _upgrade_schema(conn):
+    """id/rev 열이 없던 저장소에 열을 추가하고, id가 없는 기존 가이드에 id를 채워 넣습니다."""
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(guides)")}
+    for column, definition in (("id", "TEXT"), ("rev", "INTEGER NOT NULL DEFAULT 0")):
+        if column not in columns:
+            try:
+                conn.execute(f"ALTER TABLE guides ADD COLUMN {column} {definition}")
+            except sqlite3.OperationalError: # 다른 프로세스가 먼저 추가한 경우
+                pass
+    with _transaction(conn):
+        missing = conn.execute("SELECT seq FROM guides WHERE id IS NULL OR id = ''").fetchall()
+        if missing:
+            conn.executemany("UPDATE guides SET id = ? WHERE seq = ?", [(new_guide_id(), row["seq"]) for row in missing])
+            _bump_version(conn)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_guides_id ON guides(id)")
+
+def migrate_from_json(db_path, json_path):
+    """guide.json의 가이드를 한 트랜잭션으로 옮기고 원본을 .migrated로 이름을 바꿉니다.
+
+    저장소에 이미 가이드가 있으면 중복을 막기 위해 아무것도 하지 않고 0을 반환합니다.
+    """
+    with open(json_path, "r", encoding="utf-8") as f:
+        try:
+            guides = json.load(f)
+        except json.JSONDecodeError:
+            guides = []
+    if not isinstance(guides, list):
+        guides = []
+    conn = _connect(db_path)
+    conn.executescript(_SCHEMA)
+    _upgrade_schema(conn)
+    with _transaction(conn):
+        if conn.execute("SELECT 1 FROM guides LIMIT 1").fetchone():
+            return 0
+        _insert_many(conn, guides)
+        _bump_version(conn)
+    os.replace(json_path, json_path + MIGRATED_SUFFIX)
+    return len(guides)
+
+def _insert_many(conn, guides):
+    """가이드들을 추가합니다. id가 없는 가이드에는 새 id를 부여합니다(전달된 dict에도 기록)."""
+    rows = []
+    for guide in guides:
+        if isinstance(guide, dict):
+            if not guide.get("id"):
+                guide["id"] = new_guide_id()
+            rows.append(_to_row(guide))
+    columns = GUIDE_FIELDS + ("extra",)
+    conn.executemany(
+        f"INSERT INTO guides ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+        [tuple(row[c] for c in columns) for row in rows],
+    )
+
+
+# --- 조회 ---
+def get_version(db_path):
+    row = _connect(db_path).execute("SELECT value FROM store_meta WHERE key = 'version'").fetchone()
+    return int(row[0]) if row else 0
+
+@metrics.timed("guide_store.load_snapshot")
+def _load_snapshot(db_path):
+    """버전과 전체 가이드를 한 읽기 트랜잭션(같은 스냅숏)에서 읽습니다."""
+    conn = _connect(db_path)
+    conn.execute("BEGIN")
+    try:
+        version = int(conn.execute("SELECT value FROM store_meta WHERE key = 'version'").fetchone()[0])
+        rows = conn.execute("SELECT * FROM guides ORDER BY created_at DESC, seq DESC").fetchall()
+    finally:
+        conn.execute("COMMIT")
+    guides = [_from_row(row) for row in rows]
+    return version, guides, {guide_key(g): g for g in guides}
+
+def _cached(db_path):
+    """저장소 버전이 바뀌었을 때만 다시 읽고, 그 외에는 공유 캐시를 반환합니다."""
+    version = get_version(db_path)
+    cached = _cache.get(db_path)
+    if cached is not None and cached[0] == version:
+        return cached
+    with _cache_lock:
+        cached = _cache.get(db_path)
+        if cached is None or cached[0] != version:
+            cached = _load_snapshot(db_path)
+            _cache[db_path] = cached
+        return cached
+
+def list_guides(db_path):
+    """모든 가이드를 최신순(created_at 내림차순)으로 반환합니다. (공유 캐시, 읽기 전용)"""
+    return _cached(db_path)[1]
+
+def get_guides_by_id(db_path):
+    """id -> 가이드 dict. (공유 캐시, 읽기 전용)"""
+    return _cached(db_path)[2]
+
+def get_guide(db_path, guide_id):
+    return get_guides_by_id(db_path).get(guide_id)
+
+def get_search_index(db_path):
+    """저장소의 현재 버전에 맞춘 검색 색인(guide_search.GuideSearchIndex)."""
+    return guide_search.get_index(db_path, get_version(db_path), lambda: list_guides(db_path), guide_key)
+
+@metrics.timed("guide_store.retrieve_similar")
+def retrieve_similar(db_path, question, k=3):
+    """질문과 비슷한 가이드를 [(가이드, 점수, 질문 유사도), ...]로 최대 k개 반환합니다."""
+    version, _, guides_by_id = _cached(db_path)
+    index = guide_retrieval.get_index(db_path, version, lambda: list_guides(db_path))
+    return [(guides_by_id[guide_id], score, prompt_score)
+            for guide_id, score, prompt_score in index.search(question, k=k) if guide_id in guides_by_id]
+
+def _dedup_index(db_path):
+    version = get_version(db_path)
+    return guide_dedup.get_index(db_path, version, lambda: list_guides(db_path))
+
+@metrics.timed("guide_store.find_duplicates")
+def find_duplicates(db_path, guide, k=5):
+    """guide와 거의 같은 기존 가이드를 [(가이드, 유사도), ...]로 반환합니다. (guide 자신은 제외)"""
+    guides_by_id = get_guides_by_id(db_path)
+    return [(guides_by_id[guide_id], similarity)
+            for guide_id, similarity in _dedup_index(db_path).find(guide, k=k) if guide_id in guides_by_id]
+
+def warm_up(db_path):
+    """파생 색인(검색, 벡터, 중복)을 미리 만들거나 읽어 둡니다. 서버 시작 시 첫 요청 전에 부릅니다.
+
+    색인별 소요 시간(초) {"search", "vectors", "dedup"}를 반환합니다.
+    """
+    steps = (
+        ("search", lambda: get_search_index(db_path)),
+        ("vectors", lambda: retrieve_similar(db_path, "warm-up", k=1)), # scikit-learn 로드 포함
+        ("dedup", lambda: _dedup_index(db_path)),
+    )
+    timings = {}
+    for name, step in steps:
+        started = time.perf_counter()
+        step()
+        timings[name] = time.perf_counter() - started
+    return timings
+
+@metrics.timed("guide_store.rebuild_indexes")
+def rebuild_indexes(db_path, progress=None):
+    """파생 색인(검색, 벡터, 중복)을 가이드 테이블에서 새로 만들어 바꿔 끼웁니다.
+
+    색인 파일이나 메모리 색인이 저장소와 어긋났을 때 씁니다. progress(단계 번호, 색인 이름)는
+    색인마다 만들기 전에 불립니다. 색인별 소요 시간(초) {"search", "vectors", "dedup"}를 반환합니다.
+    """
+    version, guides, _ = _load_snapshot(db_path)
+    steps = (
+        ("search", lambda: guide_search.rebuild(db_path, version, guides, guide_key)),
+        ("vectors", lambda: guide_retrieval.rebuild(db_path, version, guides)),
+        ("dedup", lambda: guide_dedup.rebuild(db_path, version, guides)),
+    )
+    timings = {}
+    for step_no, (name, step) in enumerate(steps):
+        if progress:
+            progress(step_no, name)
+        started = time.perf_counter()
+        step()
+        timings[name] = time.perf_counter() - started
+    return timings
+
+def find_duplicate_groups(db_path):
+    """저장소 전체의 중복 묶음 [[가이드, ...], ...].
+
+    묶음의 첫 가이드는 남길 가이드(가장 최근 작성)이고, 나머지는 모두 그 가이드와 중복입니다 (최근 작성순).
+    """
+    guides_by_id = get_guides_by_id(db_path)
+    rank = lambda guide_id: str((guides_by_id.get(guide_id) or {}).get("created_at") or "")
+    groups = []
+    for group in _dedup_index(db_path).groups(rank=rank):
+        guides = [guides_by_id[guide_id] for guide_id in group if guide_id in guides_by_id]
+        if len(guides) > 1 and guides[0]["id"] == group[0]:
+            groups.append(guides)
+    return groups
+
+
+# --- 쓰기 (한 건 단위) ---
+@metrics.timed("guide_store.add_guide")
+def add_guide(db_path, guide):
+    conn = _connect(db_path)
+    with _transaction(conn):
+        _insert_many(conn, [guide])
+        old_version, new_version = _bump_version(conn)
+    _notify(db_path, old_version, new_version, upserts=[guide])
+    return guide
+
+@metrics.timed("guide_store.update_guide")
+def update_guide(db_path, guide_id, fields, expected_rev=None):
+    """guide_id의 가이드에서 fields만 바꿉니다. 바뀐 가이드를 반환하며, 없으면 None.
+
+    expected_rev는 수정 화면을 열 때 읽은 rev입니다. 그 사이 다른 세션이 먼저 저장했다면
+    덮어쓰지 않고 fileio.VersionConflict를 발생시킵니다.
+    """
+    conn = _connect(db_path)
+    with _transaction(conn):
+        row = conn.execute("SELECT * FROM guides WHERE id = ?", (guide_id,)).fetchone()
+        if row is None:
+            return None
+        if expected_rev is not None and expected_rev != row["rev"]:
+            raise fileio.VersionConflict(guide_id, expected_rev, row["rev"])
+        guide = _from_row(row)
+        guide.update(fields)
+        guide["rev"] = row["rev"] + 1
+        new_row = _to_row(guide)
+        columns = [c for c in GUIDE_FIELDS + ("extra",) if c not in ("id", "created_at")]
+        conn.execute(
+            f"UPDATE guides SET {', '.join(f'{c} = ?' for c in columns)} WHERE seq = ?",
+            [new_row[c] for c in columns] + [row["seq"]],
+        )
+        old_version, new_version = _bump_version(conn)
+    _notify(db_path, old_version, new_version, upserts=[guide])
+    return guide
+
+@metrics.timed("guide_store.delete_guide")
+def delete_guide(db_path, guide_id):
+    conn = _connect(db_path)
+    with _transaction(conn):
+        deleted = conn.execute("DELETE FROM guides WHERE id = ?", (guide_id,)).rowcount
+        old_version, new_version = _bump_version(conn)
+    _notify(db_path, old_version, new_version, removals=[guide_id])
+    return deleted > 0
+
+
+# --- 쓰기 (일괄) ---
+@metrics.timed("guide_store.add_guides")
+def add_guides(db_path, guides):
+    """여러 가이드를 한 트랜잭션으로 추가합니다. 버전은 한 번만 올리고 색인도 한 번에 반영합니다."""
+    guides = [g for g in guides if isinstance(g, dict)]
+    if not guides:
+        return []
+    conn = _connect(db_path)
+    with _transaction(conn):
+        _insert_many(conn, guides)
+        old_version, new_version = _bump_version(conn)
+    _notify(db_path, old_version, new_version, upserts=guides)
+    return guides
+
+@metrics.timed("guide_store.delete_guides")
+def delete_guides(db_path, guide_ids):
+    """여러 가이드를 한 트랜잭션으로 지우고 지운 수를 반환합니다."""
+    guide_ids = list(dict.fromkeys(guide_ids))
+    if not guide_ids:
+        return 0
+    conn = _connect(db_path)
+    deleted = 0
+    with _transaction(conn):
+        for start in range(0, len(guide_ids), answer_cache.SQL_CHUNK_SIZE):
+            chunk = guide_ids[start:start + answer_cache.SQL_CHUNK_SIZE]
+            deleted += conn.execute(f"DELETE FROM guides WHERE id IN ({', '.join('?' * len(chunk))})", chunk).rowcount
+        old_version, new_version = _bump_version(conn)
+    _notify(db_path, old_version, new_version, removals=guide_ids)
+    return deleted
+
+
+# --- CLI ---
+def main(argv):
+    if not argv or argv[0] != "migrate":
+        print(__doc__)
+        return 1
+    json_path = argv[1] if len(argv) > 1 else os.path.join("guide", "guide.json")
+    db_path = argv[2] if len(argv) > 2 else os.path.join("guide", "guide.db")
+    print(f"{migrate_from_json(db_path, json_path)}건을 {db_path}로 옮겼습니다.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
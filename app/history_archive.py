@@ -0,0 +1,203 @@
+"""오래된 상담의 보관(아카이브) 저장소.
+
+마지막 활동(시작/종료 시각, 파일 수정 시각 중 가장 늦은 때)이 일정 기간(기본 HISTORY_ARCHIVE_DAYS일)
+지난 상담을 history 폴더에서 꺼내 `history/archive/`의 월별 묶음으로 옮깁니다.
+
+- 묶음 `YYYY-MM.jsonl.gz`: 상담 시작 월별 파일입니다. 상담 하나가 한 줄(JSON)이며 각각 별도의 gzip
+  멤버로 덧붙이므로, 파일 전체는 평범한 gzip JSONL(`zcat`으로 읽힘)이면서도 상담 하나만 바로 풀 수 있습니다.
+- 색인 `YYYY-MM.index.json`: 묶음 안 상담별 위치(offset, length)와 목록/통계용 메타데이터입니다.
+
+보관된 상담은 읽기 전용으로 load()해서 볼 수 있습니다. history 폴더에는 최근 상담만 남으므로
+인덱스 재스캔, 백업이 빨라집니다. 주기적으로(cron 등) 실행하세요:
+    python history_archive.py archive [history 폴더] [일수]
+    python history_archive.py list [history 폴더]
+"""
+import gzip
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+
+import fileio
+import history_index
+import history_store
+import metrics
+
+# --- 상수 정의 ---
+ARCHIVE_DIRNAME = "archive"
+BUNDLE_SUFFIX = ".jsonl.gz"
+INDEX_SUFFIX = ".index.json"
+INDEX_VERSION = 1
+UNDATED_SHARD = "undated" # 시작 시각이 없는 상담의 묶음 이름
+DEFAULT_MAX_AGE_DAYS = int(os.environ.get("HISTORY_ARCHIVE_DAYS", "180"))
+COMPRESS_LEVEL = 6
+
+_lock = threading.Lock()
+_indexes = {}  # 색인 경로 -> ((mtime_ns, size), 항목 dict). 다른 프로세스가 바꾸면 다시 읽습니다.
+
+
+# --- 헬퍼 함수: 경로 / 색인 ---
+def archive_dir(history_dir):
+    return os.path.join(history_dir, ARCHIVE_DIRNAME)
+
+def _shard(entry):
+    """상담 시작 월('YYYY-MM'). 시작 시각을 알 수 없으면 UNDATED_SHARD."""
+    start = str(entry.get("start_time") or "")
+    return start[:7] if len(start) >= 7 and start[4] == "-" else UNDATED_SHARD
+
+def _bundle_path(directory, shard):
+    return os.path.join(directory, shard + BUNDLE_SUFFIX)
+
+def _index_path(directory, shard):
+    return os.path.join(directory, shard + INDEX_SUFFIX)
+
+def _load_index(index_path):
+    """묶음 색인 {상담 이름: 항목}. 파일이 바뀌지 않았으면 메모리에 있는 것을 씁니다."""
+    try:
+        st_result = os.stat(index_path)
+    except FileNotFoundError:
+        return {}
+    key = (st_result.st_mtime_ns, st_result.st_size)
+    with _lock:
+        cached = _indexes.get(index_path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+    with open(index_path, "rb") as f:
+        raw = f.read()
+    metrics.bytes_read(len(raw))
+    manifest = json.loads(raw)
+    entries = manifest.get("entries", {}) if manifest.get("version") == INDEX_VERSION else {}
+    with _lock:
+        _indexes[index_path] = (key, entries)
+    return entries
+
+def _shards(directory):
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted((name[:-len(INDEX_SUFFIX)] for name in names if name.endswith(INDEX_SUFFIX)), reverse=True)
+
+
+# --- 보관 ---
+def _last_active(entry):
+    """마지막 활동 시각: 시작/종료 시각과 파일 수정 시각 중 가장 늦은 때."""
+    times = [datetime.fromtimestamp(entry.get("mtime_ns", 0) / 1e9)]
+    for field in ("start_time", "end_time"):
+        try:
+            times.append(datetime.fromisoformat(str(entry.get(field))))
+        except ValueError:
+            pass
+    return max(times)
+
+def select_candidates(history_dir, max_age_days=DEFAULT_MAX_AGE_DAYS, now=None):
+    """마지막 활동이 max_age_days일보다 오래된 상담 [(경로, 인덱스 항목), ...]."""
+    cutoff = (now or datetime.now()) - timedelta(days=max_age_days)
+    return [(path, entry) for path, entry in history_index.list_entries(history_dir) if _last_active(entry) < cutoff]
+
+@metrics.timed("history_archive.archive")
+def archive(history_dir, paths):
+    """상담들을 묶음에 옮기고 옮긴 수를 반환합니다.
+
+    묶음에 덧붙이고 색인을 교체한 뒤에 원본을 지우므로, 중간에 멈추면 원본이 남을 뿐입니다.
+    (다시 실행하면 같은 상담의 색인 항목을 새 위치로 바꾸고 원본을 지웁니다)
+    """
+    directory = archive_dir(history_dir)
+    os.makedirs(directory, exist_ok=True)
+    by_shard = {}
+    for path in paths:
+        entry = history_index.get_entry(path)
+        if entry is not None:
+            by_shard.setdefault(_shard(entry), []).append(path)
+
+    archived = 0
+    for shard, shard_paths in sorted(by_shard.items()):
+        bundle_path, index_path = _bundle_path(directory, shard), _index_path(directory, shard)
+        with fileio.locked(bundle_path):
+            entries = dict(_load_index(index_path))
+            moved = []
+            for path in shard_paths:
+                with fileio.locked(path):
+                    data = history_store.load_history(path)
+                    if data is None:
+                        continue
+                    name = os.path.basename(path)
+                    line = json.dumps(dict(data, name=name), ensure_ascii=False).encode("utf-8") + b"\n"
+                    member = gzip.compress(line, compresslevel=COMPRESS_LEVEL, mtime=0)
+                    offset = os.path.getsize(bundle_path) if os.path.exists(bundle_path) else 0
+                    fileio.append_locked(bundle_path, member, create=True)
+                entries[name] = {
+                    "offset": offset, "length": len(member),
+                    "title": data.get("title", name), "counselor_name": data.get("counselor_name"),
+                    "start_time": data.get("start_time"), "end_time": data.get("end_time"),
+                    "message_count": len(data.get("messages", [])), "archived_at": datetime.now().isoformat(),
+                }
+                moved.append(path)
+            if not moved:
+                continue
+            fileio.atomic_write_json(_index_path(directory, shard), {"version": INDEX_VERSION, "entries": entries})
+            for path in moved:
+                with fileio.locked(path):
+                    os.remove(path)
+            archived += len(moved)
+    if archived:
+        metrics.count("history_archive.archived", archived)
+        history_index.refresh(history_dir)
+    return archived
+
+
+# --- 조회 ---
+def version(history_dir):
+    """색인 파일들의 (이름, mtime, size). 보관 목록 캐시의 무효화 기준입니다."""
+    directory = archive_dir(history_dir)
+    stamps = []
+    for shard in _shards(directory):
+        st_result = os.stat(_index_path(directory, shard))
+        stamps.append((shard, st_result.st_mtime_ns, st_result.st_size))
+    return tuple(stamps)
+
+def list_entries(history_dir):
+    """보관된 상담 [(이름, 메타데이터), ...]를 최신순으로 반환합니다."""
+    directory = archive_dir(history_dir)
+    results = []
+    for shard in _shards(directory):
+        entries = _load_index(_index_path(directory, shard))
+        results.extend(sorted(entries.items(), key=lambda item: str(item[1].get("start_time") or ""), reverse=True))
+    return results
+
+@metrics.timed("history_archive.load")
+def load(history_dir, name):
+    """보관된 상담 하나를 dict(header 필드 + messages)로 읽습니다. 없으면 None."""
+    directory = archive_dir(history_dir)
+    for shard in _shards(directory):
+        entry = _load_index(_index_path(directory, shard)).get(name)
+        if entry is None:
+            continue
+        with open(_bundle_path(directory, shard), "rb") as f:
+            f.seek(entry["offset"])
+            member = f.read(entry["length"])
+        metrics.bytes_read(len(member))
+        return json.loads(gzip.decompress(member))
+    return None
+
+
+# --- CLI ---
+def main(argv):
+    if not argv or argv[0] not in ("archive", "list"):
+        print(__doc__)
+        return 1
+    history_dir = argv[1] if len(argv) > 1 else "history"
+    if argv[0] == "archive":
+        max_age_days = int(argv[2]) if len(argv) > 2 else DEFAULT_MAX_AGE_DAYS
+        candidates = select_candidates(history_dir, max_age_days)
+        print(f"{max_age_days}일 넘게 활동이 없는 상담 {len(candidates)}건")
+        print(f"보관 완료: {archive(history_dir, [path for path, _ in candidates])}건")
+    else:
+        for name, entry in list_entries(history_dir):
+            print(f"{name}\t{entry.get('start_time')}\t{entry.get('counselor_name')}\t{entry.get('title')}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
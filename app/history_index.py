@@ -0,0 +1,291 @@
+import atexit
+import json
+import os
+import threading
+from fnmatch import fnmatch
+import fileio
+import history_store
+import metrics
+
+# --- 상수 정의 ---
+INDEX_FILENAME = ".index.json"
+CHANGE_STAMP_FILENAME = ".changed"
+INDEX_VERSION = 2
+HISTORY_PATTERNS = ("history*.json", "history*.jsonl")
+META_FIELDS = ("title", "counselor_name", "start_time", "end_time", "rev")
+# 매니페스트는 시작할 때 다시 파싱하지 않기 위한 캐시라서, 바뀔 때마다 쓰지 않고 이만큼 모았다가 씁니다.
+# 저장 전에 프로세스가 죽어도 다음 시작 때 (mtime, size)가 다른 파일만 다시 읽습니다.
+MANIFEST_SAVE_DELAY = float(os.environ.get("HISTORY_INDEX_SAVE_DELAY", "5.0"))
+
+# history_dir -> {"dir_mtime_ns": int, "entries": {path: entry}, "dirty": bool, "generation": int,
+#                 "save_timer": threading.Timer | None}
+_indexes = {}
+_lock = threading.Lock()
+
+
+# --- 헬퍼 함수: 매니페스트 입출력 ---
+def _index_path(history_dir):
+    return os.path.join(history_dir, INDEX_FILENAME)
+
+def _load_manifest(history_dir):
+    """디스크의 매니페스트를 읽습니다. 없거나 손상된 경우 빈 인덱스로 시작합니다."""
+    try:
+        with open(_index_path(history_dir), 'rb') as f:
+            raw = f.read()
+        metrics.bytes_read(len(raw))
+        manifest = json.loads(raw)
+    except (OSError, json.JSONDecodeError, UnicodeDecodeError):
+        return {}
+    if not isinstance(manifest, dict) or manifest.get("version") != INDEX_VERSION:
+        return {}
+    entries = manifest.get("entries")
+    if not isinstance(entries, dict):
+        return {}
+    return {os.path.join(history_dir, name): entry for name, entry in entries.items()}
+
+def _save_manifest(history_dir, entries):
+    """매니페스트를 임시 파일에 쓴 뒤 교체하여 중간 상태가 남지 않도록 합니다."""
+    manifest = {
+        "version": INDEX_VERSION,
+        "entries": {os.path.basename(path): entry for path, entry in entries.items()},
+    }
+    fileio.atomic_write_json(_index_path(history_dir), manifest)
+
+
+# --- 헬퍼 함수: 항목 생성 ---
+def _stat_key(st_result):
+    return st_result.st_mtime_ns, st_result.st_size
+
+def _build_entry(st_result, header, message_count):
+    mtime_ns, size = _stat_key(st_result)
+    entry = {"mtime_ns": mtime_ns, "size": size, "valid": bool(header)}
+    if isinstance(header, dict):
+        for field in META_FIELDS:
+            if field in header:
+                entry[field] = header[field]
+        entry["message_count"] = message_count
+    return entry
+
+def _is_history_file(name):
+    return any(fnmatch(name, pattern) for pattern in HISTORY_PATTERNS)
+
+def _signal_change(history_dir):
+    """다른 프로세스(레플리카)가 refresh()에서 알아채도록 디렉터리 mtime을 바꿉니다.
+
+    파일 끝에 덧붙이는 쓰기는 디렉터리 mtime을 바꾸지 않으므로, 빈 표시 파일을 교체합니다.
+    알림 용도일 뿐이라 fsync 하지 않습니다. 이 프로세스의 변경은 이미 인덱스에 반영했으므로,
+    표시 직전까지 인덱스가 최신이었다면 표시 후의 mtime을 기억해 다음 refresh()가 다시 훑지 않게 합니다.
+    """
+    stamp_path = os.path.join(history_dir, CHANGE_STAMP_FILENAME)
+    tmp_path = f"{stamp_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with _lock:
+        index = _get_index(history_dir)
+        before_ns = os.stat(history_dir).st_mtime_ns
+        with open(tmp_path, "wb"):
+            pass
+        os.replace(tmp_path, stamp_path)
+        if index["dir_mtime_ns"] == before_ns:
+            index["dir_mtime_ns"] = os.stat(history_dir).st_mtime_ns
+
+
+# --- 인덱스 갱신 ---
+def _get_index(history_dir):
+    index = _indexes.get(history_dir)
+    if index is None:
+        index = {
+            "dir_mtime_ns": None, "entries": _load_manifest(history_dir), "dirty": False, "generation": 0,
+            "save_timer": None,
+        }
+        _indexes[history_dir] = index
+    return index
+
+def _mark_changed(history_dir, index):
+    """항목이 바뀌었음을 기록하고 매니페스트 저장을 예약합니다 (_lock 안에서 호출).
+
+    generation은 조회 결과 캐시(service)의 무효화 기준입니다.
+    """
+    index["dirty"] = True
+    index["generation"] += 1
+    _schedule_save(history_dir, index)
+
+def _schedule_save(history_dir, index):
+    if index["save_timer"] is None:
+        timer = threading.Timer(MANIFEST_SAVE_DELAY, save_manifest, args=(history_dir,))
+        timer.daemon = True
+        index["save_timer"] = timer
+        timer.start()
+
+@metrics.timed("history_index.save_manifest")
+def save_manifest(history_dir):
+    """모아 둔 변경이 있으면 매니페스트를 지금 씁니다. 실패하면 다시 예약합니다."""
+    with _lock:
+        index = _indexes.get(history_dir)
+        if index is None:
+            return
+        if index["save_timer"] is not None:
+            index["save_timer"].cancel()
+            index["save_timer"] = None
+        if not index["dirty"]:
+            return
+        index["dirty"] = False
+        before_ns = os.stat(history_dir).st_mtime_ns
+        try:
+            _save_manifest(history_dir, index["entries"])
+            if index["dir_mtime_ns"] == before_ns: # 매니페스트 교체로 바뀐 mtime도 이 프로세스의 변경입니다.
+                index["dir_mtime_ns"] = os.stat(history_dir).st_mtime_ns
+        except OSError:
+            index["dirty"] = True
+            _schedule_save(history_dir, index)
+
+def save_all():
+    """모든 매니페스트의 남은 변경을 씁니다. 프로세스가 정상 종료될 때 자동으로 호출됩니다."""
+    for history_dir in list(_indexes):
+        try:
+            save_manifest(history_dir)
+        except Exception:
+            pass
+
+atexit.register(save_all)
+
+def _rescan(history_dir, index):
+    """디렉터리를 stat만으로 훑고, (mtime, size)가 바뀐 파일만 다시 파싱합니다."""
+    entries = index["entries"]
+    seen = set()
+    with os.scandir(history_dir) as it:
+        for dir_entry in it:
+            if not dir_entry.is_file() or not _is_history_file(dir_entry.name):
+                continue
+            path = os.path.join(history_dir, dir_entry.name)
+            seen.add(path)
+            st_result = dir_entry.stat()
+            entry = entries.get(path)
+            if entry and (entry.get("mtime_ns"), entry.get("size")) == _stat_key(st_result):
+                continue
+            entries[path] = _build_entry(st_result, *history_store.scan_metadata(path))
+            metrics.count("history_index.rescanned_files")
+            _mark_changed(history_dir, index)
+    for path in list(entries):
+        if path not in seen:
+            del entries[path]
+            _mark_changed(history_dir, index)
+
+@metrics.timed("history_index.refresh")
+def refresh(history_dir):
+    """인덱스를 최신 상태로 맞춥니다.
+
+    디렉터리 mtime이 마지막 스캔 이후 그대로라면 파일별 stat도 생략합니다.
+    이 프로세스의 쓰기는 record()로 인덱스에 즉시 반영되고, 다른 프로세스의 쓰기는
+    _signal_change()가 바꾼 디렉터리 mtime을 보고 (mtime, size)가 바뀐 파일만 다시 읽습니다.
+    """
+    with _lock:
+        index = _get_index(history_dir)
+        dir_mtime_ns = os.stat(history_dir).st_mtime_ns
+        if index["dir_mtime_ns"] != dir_mtime_ns:
+            _rescan(history_dir, index)
+            index["dir_mtime_ns"] = dir_mtime_ns
+        return index["entries"]
+
+def record(filepath, data):
+    """방금 저장한 파일의 메타데이터를 다시 파싱하지 않고 인덱스에 반영합니다."""
+    history_dir = os.path.dirname(filepath)
+    header = data if isinstance(data, dict) else None
+    message_count = len(data.get("messages") or []) if header else 0
+    with _lock:
+        index = _get_index(history_dir)
+        index["entries"][filepath] = _build_entry(os.stat(filepath), header, message_count)
+        _mark_changed(history_dir, index)
+    _signal_change(history_dir)
+
+def record_many(items):
+    """일괄 가져오기로 만든 [(경로, 상담 dict), ...]를 한 번에 반영합니다. (변경 알림도 한 번)"""
+    history_dirs = set()
+    with _lock:
+        for filepath, data in items:
+            history_dir = os.path.dirname(filepath)
+            index = _get_index(history_dir)
+            index["entries"][filepath] = _build_entry(os.stat(filepath), data, len(data.get("messages") or []))
+            _mark_changed(history_dir, index)
+            history_dirs.add(history_dir)
+    for history_dir in history_dirs:
+        _signal_change(history_dir)
+
+def record_update(filepath, header=None, added_messages=0):
+    """append 방식의 쓰기(header 갱신, 메시지 추가)를 기존 항목에 누적 반영합니다."""
+    history_dir = os.path.dirname(filepath)
+    with _lock:
+        index = _get_index(history_dir)
+        entry = index["entries"].get(filepath)
+        st_result = os.stat(filepath)
+        if entry is None or not entry.get("valid"):
+            entry = _build_entry(st_result, *history_store.scan_metadata(filepath))
+        else:
+            entry = dict(entry, mtime_ns=st_result.st_mtime_ns, size=st_result.st_size)
+            for field, value in (header or {}).items():
+                if field in META_FIELDS:
+                    entry[field] = value
+            entry["message_count"] = entry.get("message_count", 0) + added_messages
+        index["entries"][filepath] = entry
+        _mark_changed(history_dir, index)
+    _signal_change(history_dir)
+
+def generation(history_dir):
+    """인덱스를 최신으로 맞춘 뒤 변경 세대 번호를 반환합니다. (이 프로세스 안에서만 의미가 있습니다)"""
+    refresh(history_dir)
+    with _lock:
+        return _indexes[history_dir]["generation"]
+
+def list_entries(history_dir):
+    """사이드바 표시용 (경로, 메타데이터) 목록을 최신순으로 반환합니다."""
+    entries = refresh(history_dir)
+    with _lock:
+        return [(path, entries[path]) for path in sorted(entries, reverse=True) if entries[path].get("valid")]
+
+@metrics.timed("history_index.get_entry")
+def get_entry(filepath):
+    """상담 하나의 메타데이터(제목, 담당자, 메시지 수 등). 없거나 읽을 수 없으면 None.
+
+    다른 프로세스가 파일 끝에 덧붙인 경우(디렉터리 mtime은 그대로)도 잡도록 이 파일만 stat 합니다.
+    """
+    history_dir = os.path.dirname(filepath)
+    entries = refresh(history_dir)
+    try:
+        st_result = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    with _lock:
+        entry = entries.get(filepath)
+        if entry is None or (entry.get("mtime_ns"), entry.get("size")) != _stat_key(st_result):
+            entry = _build_entry(st_result, *history_store.scan_metadata(filepath))
+            entries[filepath] = entry
+            _mark_changed(history_dir, _indexes[history_dir])
+    return entry if entry.get("valid") else None
+
+
+# --- 조회: 필터링 ---
+def _overlaps(entry, date_from, date_to):
+    """상담 기간(start_time ~ end_time)이 날짜 범위와 겹치는지 ISO 문자열 비교로 판단합니다."""
+    start = (entry.get("start_time") or "")[:10]
+    end = (entry.get("end_time") or entry.get("start_time") or "")[:10]
+    if date_from and (not end or end < date_from):
+        return False
+    if date_to and (not start or start > date_to):
+        return False
+    return True
+
+def query_entries(history_dir, counselor=None, date_from=None, date_to=None, title=None):
+    """인덱스만으로 상담 목록을 필터링합니다. 날짜는 'YYYY-MM-DD' 문자열입니다."""
+    title = title.strip().lower() if title else None
+    results = []
+    for path, entry in list_entries(history_dir):
+        if counselor and entry.get("counselor_name", "미지정") != counselor:
+            continue
+        if (date_from or date_to) and not _overlaps(entry, date_from, date_to):
+            continue
+        if title and title not in str(entry.get("title", os.path.basename(path))).lower():
+            continue
+        results.append((path, entry))
+    return results
+
+def list_counselors(history_dir):
+    """필터 선택지로 쓸 상담원 이름 목록."""
+    return sorted({entry.get("counselor_name", "미지정") for _, entry in list_entries(history_dir)})
@@ -0,0 +1,322 @@
+"""상담 히스토리 저장소 (append-only JSONL).
+
+상담 하나는 `history<timestamp>.jsonl` 파일 하나이며, 한 줄이 레코드 하나입니다.
+- {"type":"header", ...}  : 제목/요약/담당자 등. 뒤에 추가된 header가 앞의 값을 덮어씁니다.
+- {"type":"message", ...} : 대화 메시지 하나.
+메시지 저장은 파일 끝에 한 줄을 덧붙이는 것으로 끝나며, 누적된 header 레코드의 정리는
+compact()가 별도로 수행합니다. 기존 `history*.json` 파일은 읽기를 그대로 지원하고,
+import_legacy()로 JSONL 형식으로 옮길 수 있습니다.
+
+사용법:
+    python history_store.py import  [history_dir]
+    python history_store.py compact [history_dir]
+"""
+import contextlib
+import errno
+import json
+import os
+import sys
+
+import fileio
+import metrics
+
+# --- 상수 정의 ---
+LOG_SUFFIX = ".jsonl"
+LEGACY_SUFFIX = ".json"
+IMPORTED_SUFFIX = ".imported"
+HEADER_FIELDS = ("title", "summary", "counselor_name", "start_time", "end_time", "rev")
+READ_BLOCK_SIZE = 64 * 1024
+
+_HEADER_PREFIX = b'{"type":"header"'
+_MESSAGE_PREFIX = b'{"type":"message"'
+
+
+# --- 헬퍼 함수: 레코드 직렬화 ---
+def is_log(filepath):
+    return filepath.endswith(LOG_SUFFIX)
+
+def _encode(record_type, fields):
+    record = {"type": record_type}
+    record.update(fields)
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+def _decode(line):
+    """레코드 한 줄을 해석합니다. 쓰기 도중 잘린 마지막 줄 등은 None으로 무시합니다."""
+    try:
+        record = json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    return record if isinstance(record, dict) else None
+
+def _split_record(record):
+    record = dict(record)
+    record.pop("type", None)
+    return record
+
+
+# --- 헬퍼 함수: 레거시 JSON ---
+def _load_legacy(filepath):
+    try:
+        with open(filepath, "rb") as f:
+            raw = f.read()
+    except OSError:
+        return None
+    metrics.bytes_read(len(raw))
+    try:
+        return json.loads(raw)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+
+def _save_legacy(filepath, data):
+    fileio.atomic_write_json(filepath, data, indent=2)
+
+
+# --- 쓰기 ---
+# 같은 파일에 대한 쓰기는 모두 fileio.locked() 안에서 수행합니다 (다른 세션/프로세스 포함).
+def create_history(filepath, header):
+    """header 레코드 하나로 새 상담 파일을 만듭니다. 같은 이름이 있으면 FileExistsError."""
+    fields = {k: header.get(k) for k in HEADER_FIELDS if k in header}
+    payload = _encode("header", fields)
+    with open(filepath, "xb") as f:
+        f.write(payload)
+        metrics.bytes_written(len(payload))
+        f.flush()
+        os.fsync(f.fileno())
+
+def create_legacy(filepath, data):
+    """레거시 JSON 형식(저장할 때마다 파일 전체를 다시 쓰는 방식)으로 상담 파일을 씁니다.
+
+    같은 이름이 있으면 FileExistsError.
+    """
+    with fileio.locked(filepath):
+        if os.path.exists(filepath):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), filepath)
+        _save_legacy(filepath, data)
+
+@metrics.timed("history_store.append_messages")
+def append_messages(filepath, messages):
+    """메시지를 덧붙입니다. 레거시 JSON 파일은 기존처럼 전체를 다시 씁니다.
+
+    그 사이 파일이 보관/삭제되었으면 새로 만들지 않고 FileNotFoundError.
+    """
+    if not messages:
+        return
+    with fileio.locked(filepath):
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), filepath)
+        if not is_log(filepath):
+            data = _load_legacy(filepath) or {}
+            data.setdefault("messages", []).extend(messages)
+            _save_legacy(filepath, data)
+            return
+        fileio.append_locked(filepath, b"".join(_encode("message", m) for m in messages))
+
+@metrics.timed("history_store.update_header")
+def update_header(filepath, expected_rev=None, **fields):
+    """header 필드(예: title)를 갱신하고 새 rev를 반환합니다.
+
+    expected_rev가 주어졌는데 그 사이 다른 세션이 header를 고쳤다면 fileio.VersionConflict.
+    """
+    with fileio.locked(filepath):
+        header, _ = scan_metadata(filepath)
+        current_rev = (header or {}).get("rev", 0)
+        if expected_rev is not None and expected_rev != current_rev:
+            raise fileio.VersionConflict(filepath, expected_rev, current_rev)
+        fields = dict(fields, rev=current_rev + 1)
+        if not is_log(filepath):
+            data = _load_legacy(filepath) or {}
+            data.update(fields)
+            _save_legacy(filepath, data)
+        else:
+            fileio.append_locked(filepath, _encode("header", fields))
+    return fields["rev"]
+
+
+# --- 쓰기 (일괄) ---
+def write_histories(items):
+    """[(경로, 상담 dict), ...]를 새 상담 파일로 씁니다. (일괄 가져오기용)
+
+    파일마다 교체 쓰기/fsync를 하지 않고 모두 쓴 뒤 한 번에 fsync 합니다. 중간에 실패하면
+    이번에 만든 파일을 지우고 예외를 다시 올립니다. 같은 이름이 있으면 FileExistsError.
+    """
+    written = []
+    try:
+        for filepath, data in items:
+            header = {k: data[k] for k in HEADER_FIELDS if k in data}
+            payload = _encode("header", header) + b"".join(_encode("message", m) for m in data.get("messages") or [])
+            with open(filepath, "xb") as f:
+                written.append(filepath)
+                f.write(payload)
+            metrics.bytes_written(len(payload))
+        fileio.fsync_files(written)
+    except BaseException:
+        for filepath in written:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(filepath)
+        raise
+
+
+# --- 읽기 ---
+def _iter_records(filepath):
+    with open(filepath, "rb") as f:
+        for line in f:
+            metrics.bytes_read(len(line))
+            if line.strip():
+                record = _decode(line)
+                if record is not None:
+                    yield record
+
+@metrics.timed("history_store.load_history")
+def load_history(filepath):
+    """상담 전체를 레거시 JSON과 같은 dict 형태로 읽습니다. 실패하면 None."""
+    if not is_log(filepath):
+        return _load_legacy(filepath)
+    data = {"messages": []}
+    try:
+        for record in _iter_records(filepath):
+            if record.get("type") == "message":
+                data["messages"].append(_split_record(record))
+            elif record.get("type") == "header":
+                data.update(_split_record(record))
+    except OSError:
+        return None
+    return data
+
+@metrics.timed("history_store.scan_metadata")
+def scan_metadata(filepath):
+    """(header dict, 메시지 수)를 반환합니다. 메시지 줄은 JSON으로 해석하지 않습니다."""
+    if not is_log(filepath):
+        data = _load_legacy(filepath)
+        if not isinstance(data, dict):
+            return None, 0
+        header = {k: data[k] for k in HEADER_FIELDS if k in data}
+        return header, len(data.get("messages") or [])
+    header, message_count = {}, 0
+    try:
+        with open(filepath, "rb") as f:
+            for line in f:
+                metrics.bytes_read(len(line))
+                if line.startswith(_MESSAGE_PREFIX):
+                    message_count += 1
+                elif line.startswith(_HEADER_PREFIX):
+                    record = _decode(line)
+                    if record is not None:
+                        header.update(_split_record(record))
+    except OSError:
+        return None, 0
+    return header, message_count
+
+def _iter_lines_reversed(f):
+    f.seek(0, os.SEEK_END)
+    position = f.tell()
+    remainder = b""
+    while position > 0:
+        read_size = min(READ_BLOCK_SIZE, position)
+        position -= read_size
+        f.seek(position)
+        metrics.bytes_read(read_size)
+        lines = (f.read(read_size) + remainder).split(b"\n")
+        remainder = lines.pop(0)
+        for line in reversed(lines):
+            if line.strip():
+                yield line
+    if remainder.strip():
+        yield remainder
+
+@metrics.timed("history_store.read_last_messages")
+def read_last_messages(filepath, count, skip=0):
+    """마지막 `skip`개를 건너뛴 뒤, 그 앞의 메시지 최대 `count`개를 시간순으로 반환합니다.
+
+    JSONL 파일은 끝에서부터 블록 단위로 읽으므로 필요한 만큼만 디스크에서 읽습니다.
+    """
+    if not is_log(filepath):
+        messages = (_load_legacy(filepath) or {}).get("messages") or []
+        end = max(len(messages) - skip, 0)
+        return messages[max(end - count, 0):end]
+    found = []
+    try:
+        with open(filepath, "rb") as f:
+            for line in _iter_lines_reversed(f):
+                if not line.startswith(_MESSAGE_PREFIX):
+                    continue
+                if skip > 0:
+                    skip -= 1
+                    continue
+                record = _decode(line)
+                if record is None:
+                    continue
+                found.append(_split_record(record))
+                if len(found) >= count:
+                    break
+    except OSError:
+        return []
+    found.reverse()
+    return found
+
+
+# --- 유지보수: 압축 / 가져오기 ---
+def _write_log(filepath, data):
+    header = {k: data[k] for k in HEADER_FIELDS if k in data}
+    with fileio.atomic_open(filepath) as f:
+        f.write(_encode("header", header))
+        for message in data.get("messages") or []:
+            f.write(_encode("message", message))
+
+def compact(filepath):
+    """누적된 header 레코드를 하나로 합쳐 파일을 다시 씁니다. 줄어든 바이트 수를 반환합니다.
+
+    잠금 안에서 읽고 교체하므로 그 사이에 덧붙여진 메시지가 사라지지 않습니다.
+    """
+    with fileio.locked(filepath):
+        before = os.path.getsize(filepath)
+        data = load_history(filepath)
+        if data is None:
+            return 0
+        _write_log(filepath, data)
+        return before - os.path.getsize(filepath)
+
+def import_legacy(filepath):
+    """`history*.json`을 같은 이름의 `.jsonl`로 옮기고 새 경로를 반환합니다.
+
+    원본은 `.json.imported`로 이름을 바꿔 남겨 둡니다. 이미 옮겨졌다면 그 경로를 반환합니다.
+    """
+    log_path = filepath[:-len(LEGACY_SUFFIX)] + LOG_SUFFIX
+    with fileio.locked(filepath):
+        if not os.path.exists(filepath) and os.path.exists(log_path):
+            return log_path # 다른 세션이 먼저 옮긴 경우
+        data = _load_legacy(filepath)
+        if not isinstance(data, dict):
+            raise ValueError(f"{filepath}: 올바른 상담 JSON이 아닙니다.")
+        with fileio.locked(log_path):
+            _write_log(log_path, data)
+        os.replace(filepath, filepath + IMPORTED_SUFFIX)
+    return log_path
+
+
+# --- CLI ---
+def main(argv):
+    if not argv or argv[0] not in ("import", "compact"):
+        print(__doc__)
+        return 1
+    command = argv[0]
+    history_dir = argv[1] if len(argv) > 1 else "history"
+    names = sorted(os.listdir(history_dir))
+    if command == "import":
+        for name in names:
+            if name.startswith("history") and name.endswith(LEGACY_SUFFIX):
+                path = os.path.join(history_dir, name)
+                try:
+                    print(f"{path} -> {import_legacy(path)}")
+                except ValueError as e:
+                    print(f"건너뜀: {e}")
+    else:
+        saved = 0
+        for name in names:
+            if name.startswith("history") and name.endswith(LOG_SUFFIX):
+                saved += compact(os.path.join(history_dir, name))
+        print(f"압축 완료: {saved} bytes 절약")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
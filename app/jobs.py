@@ -0,0 +1,309 @@
+"""백그라운드 작업 큐 (SQLite에 저장, 프로세스마다 작업 스레드 풀).
+
+화면 스크립트(app.py, pages/guide.py)는 오래 걸리는 일을 바로 실행하지 않고 enqueue()로 맡깁니다.
+그런 일로는 가이드 저장과 첨부 처리, 일괄 가져오기, 중복 정리, 보관, 색인 재구성이 있습니다.
+작업 스레드가 처리하는 동안 화면은 get()으로 진행률(progress, message)과 결과를 주기적으로 확인합니다.
+
+- 큐는 SQLite(jobs.db, WAL)라서 서버를 재시작해도 남습니다. 작업은 BEGIN IMMEDIATE 트랜잭션으로
+  한 건씩 가져가므로(claim) 여러 스레드나 프로세스가 같은 작업을 두 번 실행하지 않습니다.
+- 화면에서 맡긴 작업은 맡긴 프로세스(레플리카)가 처리합니다. 그래야 가이드 색인 같은 메모리 색인을
+  그 자리에서 바로 갱신할 수 있습니다. 그 프로세스가 ORPHAN_SECONDS 안에 가져가지 않으면(종료 등)
+  다른 프로세스가 처리합니다. 프로세스를 지정하지 않은 작업(CLI에서 넣은 것)은 아무나 처리합니다.
+- 실행 중에 프로세스가 죽으면 heartbeat가 멈춥니다. STALE_SECONDS가 지나면 그 작업을 다시
+  대기열에 넣습니다 (최대 MAX_ATTEMPTS번).
+- 작업 종류별 처리 함수는 @handler("종류")로 등록합니다 (service 모듈). 처리 함수는
+  (payload, progress)를 받습니다. progress(비율 0~1, 메시지)를 부르면 진행 상황을 기록합니다.
+  처리 함수가 반환한 값(JSON으로 바꿀 수 있는 값)은 결과로 저장됩니다.
+- 다시 실행될 수 있으므로 처리 함수는 되풀이해도 안전해야 합니다. 되돌릴 수 없는 단계(파일 이동 등)
+  앞에서 checkpoint(payload)로 그때까지의 결과를 payload에 저장하면, 다시 실행될 때 이어서 합니다.
+
+CLI (처리 함수를 등록하는 service를 불러옵니다):
+    python jobs.py list
+    python jobs.py enqueue <종류> [JSON 인자]   # 예: dedup_guides, archive_histories, rebuild_indexes
+    python jobs.py work                          # 이 프로세스에서 작업 처리 (별도 작업 프로세스)
+"""
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+
+import metrics
+from sqlite_util import connect, transaction
+
+# --- 상수 정의 ---
+WORKERS = int(os.environ.get("JOB_WORKERS", "2")) # 프로세스당 작업 스레드 수
+POLL_SECONDS = 1.0 # 대기열이 비었을 때 다시 확인하는 간격
+STALE_SECONDS = 300.0 # heartbeat가 이만큼 멈춘 실행 중 작업은 다시 대기열로
+HEARTBEAT_SECONDS = 30.0 # 실행 중 작업의 heartbeat 갱신 간격 (진행률 보고와 별도)
+ORPHAN_SECONDS = 60.0 # 맡긴 프로세스가 이만큼 가져가지 않은 작업은 다른 프로세스도 처리
+MAX_ATTEMPTS = 3
+PROGRESS_INTERVAL = 0.25 # 진행률 기록 최소 간격(초). 끝(1.0)은 항상 기록합니다.
+RETENTION_SECONDS = 7 * 24 * 3600 # 끝난 작업 기록 보관 기간
+ACTIVE_STATUSES = ("queued", "running")
+NODE = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}" # 이 프로세스의 이름
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    node TEXT,
+    owner TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    error_type TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at);
+"""
+
+_handlers = {}  # 작업 종류 -> 처리 함수
+_initialized = set()
+_workers = {}  # db_path -> [작업 스레드]
+_start_lock = threading.Lock()
+_wakeup = threading.Event() # enqueue() 직후 대기 중인 작업 스레드를 깨웁니다.
+_running = threading.local() # 이 작업 스레드가 실행 중인 (db_path, 작업 id)
+
+
+def handler(kind):
+    """작업 종류 kind의 처리 함수를 등록하는 데코레이터."""
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+def _connect(db_path):
+    conn = connect(db_path)
+    if db_path not in _initialized:
+        conn.executescript(_SCHEMA)
+        _initialized.add(db_path)
+    return conn
+
+def _from_row(row):
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    return job
+
+
+# --- 맡기기 / 조회 ---
+def enqueue(db_path, kind, payload=None, owner=None, local=True, unique=False):
+    """작업을 대기열에 넣고 작업 id를 반환합니다.
+
+    local이면 이 프로세스가 처리합니다. unique이면 같은 종류의 작업이 이미 대기/실행 중일 때
+    새로 넣지 않고 그 작업의 id를 반환합니다 (중복 정리, 색인 재구성 같은 유지 보수 작업용).
+    """
+    conn = _connect(db_path)
+    with transaction(conn):
+        if unique:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE kind = ? AND status IN (?, ?) ORDER BY created_at LIMIT 1",
+                (kind, *ACTIVE_STATUSES),
+            ).fetchone()
+            if row is not None:
+                return row["id"]
+        job_id = uuid.uuid4().hex
+        conn.execute(
+            "INSERT INTO jobs (id, kind, payload, status, node, owner, created_at) VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+            (job_id, kind, json.dumps(payload or {}, ensure_ascii=False), NODE if local else None, owner, time.time()),
+        )
+    metrics.count("jobs.enqueued")
+    _wakeup.set()
+    return job_id
+
+def get(db_path, job_id):
+    """작업 하나 (dict: id, kind, status, progress, message, result, error, ...). 없으면 None."""
+    row = _connect(db_path).execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _from_row(row) if row is not None else None
+
+def get_many(db_path, job_ids):
+    """job_ids 순서대로 작업 목록 (없는 id는 빠집니다)."""
+    job_ids = list(job_ids)
+    if not job_ids:
+        return []
+    rows = _connect(db_path).execute(
+        f"SELECT * FROM jobs WHERE id IN ({', '.join('?' * len(job_ids))})", job_ids,
+    ).fetchall()
+    jobs_by_id = {row["id"]: _from_row(row) for row in rows}
+    return [jobs_by_id[job_id] for job_id in job_ids if job_id in jobs_by_id]
+
+def list_jobs(db_path, limit=50):
+    """최근 작업 목록 (최신순)."""
+    rows = _connect(db_path).execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+    return [_from_row(row) for row in rows]
+
+
+# --- 처리 ---
+def _claim(db_path):
+    """처리할 작업 하나를 가져가 running으로 바꿉니다. 없으면 None.
+
+    먼저 읽기만으로 할 일이 있는지 보고, 있을 때만 쓰기 트랜잭션을 엽니다 (빈 대기열 확인은 잠금 없음).
+    """
+    conn = _connect(db_path)
+    now = time.time()
+    pending = conn.execute(
+        "SELECT 1 FROM jobs WHERE (status = 'queued' AND (node IS NULL OR node = ? OR created_at < ?))"
+        " OR (status = 'running' AND heartbeat < ?) LIMIT 1",
+        (NODE, now - ORPHAN_SECONDS, now - STALE_SECONDS),
+    ).fetchone()
+    if pending is None:
+        return None
+    with transaction(conn):
+        # 실행 중에 멈춘 작업: 다시 대기열로 (시도 횟수를 넘었으면 실패 처리)
+        conn.execute(
+            "UPDATE jobs SET node = NULL, status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,"
+            " error = CASE WHEN attempts >= ? THEN '작업 프로세스가 응답하지 않습니다.' ELSE error END,"
+            " finished_at = CASE WHEN attempts >= ? THEN ? ELSE finished_at END"
+            " WHERE status = 'running' AND heartbeat < ?",
+            (MAX_ATTEMPTS, MAX_ATTEMPTS, MAX_ATTEMPTS, now, now - STALE_SECONDS),
+        )
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE status = 'queued' AND (node IS NULL OR node = ? OR created_at < ?)"
+            " ORDER BY node = ? DESC, created_at LIMIT 1",
+            (NODE, now - ORPHAN_SECONDS, NODE),
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', node = ?, attempts = attempts + 1, started_at = ?, heartbeat = ?"
+            " WHERE id = ?",
+            (NODE, now, now, row["id"]),
+        )
+    return _from_row(row)
+
+def _progress_reporter(db_path, job_id):
+    last = [0.0]
+
+    def progress(fraction, message=None):
+        now = time.time()
+        if fraction < 1 and now - last[0] < PROGRESS_INTERVAL:
+            return
+        last[0] = now
+        conn = _connect(db_path)
+        conn.execute(
+            "UPDATE jobs SET progress = ?, message = COALESCE(?, message), heartbeat = ? WHERE id = ?",
+            (min(max(float(fraction), 0.0), 1.0), message, now, job_id),
+        )
+    return progress
+
+def checkpoint(payload):
+    """이 스레드에서 실행 중인 작업의 payload를 바꿔 저장합니다. 다시 실행되면 이 payload로 시작합니다."""
+    db_path, job_id = _running.job
+    _connect(db_path).execute(
+        "UPDATE jobs SET payload = ?, heartbeat = ? WHERE id = ?",
+        (json.dumps(payload, ensure_ascii=False), time.time(), job_id),
+    )
+
+def _finish(db_path, job_id, status, result=None, error=None, error_type=None):
+    conn = _connect(db_path)
+    conn.execute(
+        "UPDATE jobs SET status = ?, progress = CASE WHEN ? = 'done' THEN 1 ELSE progress END,"
+        " result = ?, error = ?, error_type = ?, finished_at = ? WHERE id = ?",
+        (status, status, json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+         error, error_type, time.time(), job_id),
+    )
+
+def _heartbeat(db_path, job_id, stop):
+    """처리 함수가 진행률을 보고하지 않는 동안에도 작업이 살아 있음을 기록합니다."""
+    while not stop.wait(HEARTBEAT_SECONDS):
+        try:
+            _connect(db_path).execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time(), job_id))
+        except Exception: # DB 잠금 시간 초과 등: 다음 간격에 다시
+            pass
+
+def run_job(db_path, job):
+    """작업 하나를 실행하고 결과/오류를 기록합니다."""
+    func = _handlers.get(job["kind"])
+    if func is None:
+        _finish(db_path, job["id"], "failed", error=f"알 수 없는 작업 종류: {job['kind']}", error_type="LookupError")
+        return
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(db_path, job["id"], stop), name="job-heartbeat", daemon=True).start()
+    _running.job = (db_path, job["id"])
+    try:
+        with metrics.phase(f"jobs.{job['kind']}"):
+            result = func(job["payload"], _progress_reporter(db_path, job["id"]))
+    except Exception as e:
+        metrics.count("jobs.failed")
+        _finish(db_path, job["id"], "failed", error=str(e) or type(e).__name__, error_type=type(e).__name__)
+    else:
+        metrics.count("jobs.done")
+        _finish(db_path, job["id"], "done", result=result)
+    finally:
+        _running.job = None
+        stop.set()
+
+def cleanup(db_path, retention_seconds=RETENTION_SECONDS):
+    """보관 기간이 지난 끝난 작업 기록을 지우고 지운 수를 반환합니다."""
+    conn = _connect(db_path)
+    with transaction(conn):
+        return conn.execute(
+            "DELETE FROM jobs WHERE status NOT IN (?, ?) AND finished_at < ?",
+            (*ACTIVE_STATUSES, time.time() - retention_seconds),
+        ).rowcount
+
+def _worker_loop(db_path):
+    while True:
+        try:
+            job = _claim(db_path)
+        except Exception: # DB 잠금 시간 초과 등: 잠시 뒤 다시 시도
+            job = None
+        if job is None:
+            _wakeup.wait(POLL_SECONDS)
+            _wakeup.clear()
+            continue
+        run_job(db_path, job)
+
+def start(db_path, workers=WORKERS):
+    """이 프로세스의 작업 스레드를 시작합니다. 여러 번 호출해도 한 번만 시작합니다."""
+    with _start_lock:
+        if db_path in _workers or workers <= 0:
+            return
+        _connect(db_path)
+        cleanup(db_path)
+        _workers[db_path] = [
+            threading.Thread(target=_worker_loop, args=(db_path,), name=f"job-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in _workers[db_path]:
+            thread.start()
+
+
+# --- CLI ---
+def main(argv):
+    if not argv or argv[0] not in ("list", "enqueue", "work"):
+        print(__doc__)
+        return 1
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    import service # 처리 함수 등록
+    db_path = service.JOBS_DB_PATH
+    if argv[0] == "list":
+        for job in list_jobs(db_path):
+            created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(job["created_at"]))
+            print(f"{job['id']}\t{created}\t{job['kind']}\t{job['status']}\t{job['progress']:.0%}\t{job['error'] or job['message'] or ''}")
+    elif argv[0] == "enqueue":
+        payload = json.loads(argv[2]) if len(argv) > 2 else {}
+        print(enqueue(db_path, argv[1], payload, owner="cli", local=False))
+    else:
+        service.init() # 작업 스레드 시작
+        print(f"작업 처리 중 ({NODE}, 스레드 {WORKERS}개). 끝내려면 Ctrl+C", flush=True)
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,296 @@
+"""실행 구간별 계측 (타이머, 카운터, 읽고 쓴 바이트, 선택적 프로파일).
+
+Streamlit 화면은 위젯 이벤트마다 스크립트 전체를 다시 실행(rerun)하므로, 계측도 rerun 단위로 모읍니다.
+- 화면: begin_rerun()으로 시작하고, section()으로 화면 영역(사이드바, 대화 등)의 경계를 표시하고,
+  스크립트 끝에서 end_rerun()을 호출합니다. st.rerun()/st.stop()으로 중간에 끝난 실행은
+  같은 세션의 다음 begin_rerun()이 마지막 계측 시점까지로 마무리합니다.
+- 저장소/서비스: phase()(또는 @timed)로 구간 시간을, count()/bytes_read()/bytes_written()으로
+  횟수와 입출력량을 기록합니다. 진행 중인 rerun이 없으면(CLI, 백그라운드 스레드) 프로세스
+  누적값에만 더합니다.
+
+결과는 프로세스 메모리(최근 rerun, 구간별 표본)에 보관되어 관리 화면(pages/admin.py)에서
+p50/p95로 볼 수 있고, 환경 변수에 따라 다음으로도 내보냅니다.
+- METRICS_LOG=<경로>  : rerun 하나당 한 줄씩 JSONL로 덧붙입니다.
+- METRICS_PORT=<포트> : Prometheus 형식의 `/metrics` HTTP 엔드포인트를 엽니다 (레플리카마다).
+- APP_PROFILE=1       : 모든 rerun을 cProfile로 기록합니다. (화면 주소에 `?profile=1`을 붙여 한 세션만 켤 수도 있습니다)
+
+이 모듈은 표준 라이브러리만 사용하며 streamlit을 불러오지 않습니다.
+"""
+import contextlib
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- 상수 정의 ---
+METRICS_LOG = os.environ.get("METRICS_LOG")
+METRICS_PORT = os.environ.get("METRICS_PORT")
+PROFILE_ALWAYS = os.environ.get("APP_PROFILE", "") not in ("", "0")
+PROFILE_DIR = os.environ.get("APP_PROFILE_DIR", "profiles")
+RECENT_RERUNS = 500 # 메모리에 보관하는 최근 rerun 기록 수
+SAMPLES_PER_PHASE = 2000 # 구간별로 보관하는 최근 표본 수 (p50/p95 계산용)
+PROFILE_TOP = 30 # 프로파일 요약에 보여줄 함수 수
+RERUN_PHASE = "rerun" # rerun 전체 시간을 기록하는 구간 이름
+MAX_TRACKED_SESSIONS = 1000 # 끝나지 않은 rerun/프로파일을 보관하는 세션 수 (닫힌 세션 정리용)
+
+_local = threading.local()
+_lock = threading.Lock()
+_open_runs = {}  # 세션 id -> 아직 end_rerun()되지 않은 rerun
+_last_profiles = {}  # 세션 id -> 직전 rerun의 프로파일 요약 텍스트
+_recent = deque(maxlen=RECENT_RERUNS)
+_samples = defaultdict(lambda: deque(maxlen=SAMPLES_PER_PHASE))  # 구간 이름 -> 최근 소요 시간(초)
+_totals = defaultdict(float)  # 누적 카운터 (프로세스 시작 이후)
+_exporter = None
+
+
+# --- rerun 단위 기록 ---
+def begin_rerun(page, session_id=None, profile=False):
+    """화면 스크립트 맨 앞에서 호출합니다. 같은 세션의 이전 rerun이 열려 있으면 먼저 마무리합니다."""
+    now = time.perf_counter()
+    run = {
+        "page": page, "session": session_id, "started_at": time.time(),
+        "start": now, "last": now, "phases": {}, "calls": {}, "counters": {},
+        "bytes_read": 0, "bytes_written": 0, "section": None, "profiler": None,
+    }
+    with _lock:
+        previous = _open_runs.pop(session_id, None)
+        _open_runs[session_id] = run
+        while len(_open_runs) > MAX_TRACKED_SESSIONS:
+            del _open_runs[next(iter(_open_runs))]
+    if previous is not None:
+        _finish(previous, completed=False)
+    if profile or PROFILE_ALWAYS:
+        run["profiler"] = cProfile.Profile()
+        run["profiler"].enable()
+    _local.run = run
+    return run
+
+def section(name):
+    """화면 영역의 시작을 표시합니다. 앞 영역은 여기서 끝난 것으로 기록합니다."""
+    run = getattr(_local, "run", None)
+    if run is None:
+        return
+    now = time.perf_counter()
+    _close_section(run, now)
+    run["section"] = (name, now)
+    run["last"] = now
+
+def end_rerun():
+    """화면 스크립트 끝에서 호출합니다."""
+    run = getattr(_local, "run", None)
+    if run is None:
+        return
+    with _lock:
+        if _open_runs.get(run["session"]) is run:
+            del _open_runs[run["session"]]
+    _finish(run, completed=True)
+
+def _close_section(run, now):
+    if run["section"] is not None:
+        name, started = run["section"]
+        _add_phase(run, name, now - started)
+        run["section"] = None
+        run["last"] = now
+
+def _add_phase(run, name, seconds):
+    run["phases"][name] = run["phases"].get(name, 0.0) + seconds
+    run["calls"][name] = run["calls"].get(name, 0) + 1
+
+def _finish(run, completed):
+    if completed:
+        now = time.perf_counter()
+        _close_section(run, now)
+        run["last"] = now
+    else:
+        _close_section(run, run["last"]) # 중간에 끝난 실행: 마지막 계측 시점까지만 셉니다.
+    if _local.__dict__.get("run") is run:
+        _local.run = None
+    profile_text = _stop_profiler(run)
+    record = {
+        "page": run["page"], "session": run["session"], "started_at": run["started_at"],
+        "duration_s": round(run["last"] - run["start"], 6), "completed": completed,
+        "phases": {k: round(v, 6) for k, v in run["phases"].items()}, "calls": run["calls"],
+        "counters": run["counters"], "bytes_read": run["bytes_read"], "bytes_written": run["bytes_written"],
+    }
+    with _lock:
+        _recent.append(record)
+        _samples[RERUN_PHASE].append(record["duration_s"])
+        for name, seconds in run["phases"].items():
+            _samples[name].append(seconds)
+        _totals["reruns_total"] += 1
+        if profile_text is not None:
+            _last_profiles.pop(run["session"], None)
+            _last_profiles[run["session"]] = profile_text
+            while len(_last_profiles) > MAX_TRACKED_SESSIONS:
+                del _last_profiles[next(iter(_last_profiles))]
+    if METRICS_LOG:
+        _append_log(record)
+
+def _append_log(record):
+    line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+    try:
+        os.makedirs(os.path.dirname(METRICS_LOG) or ".", exist_ok=True)
+        fd = os.open(METRICS_LOG, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line) # 한 번의 O_APPEND 쓰기이므로 여러 프로세스가 같은 파일에 써도 줄이 섞이지 않습니다.
+        finally:
+            os.close(fd)
+    except OSError:
+        pass # 계측 실패가 화면을 멈추게 하지 않습니다.
+
+
+# --- 구간 / 카운터 ---
+@contextlib.contextmanager
+def phase(name):
+    """with 블록의 소요 시간을 name 구간으로 기록합니다. 중첩하면 바깥 구간에 안쪽 시간도 포함됩니다."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        run = getattr(_local, "run", None)
+        if run is not None:
+            _add_phase(run, name, elapsed)
+            run["last"] = time.perf_counter()
+        else:
+            with _lock:
+                _samples[name].append(elapsed)
+
+def timed(name):
+    """함수 호출 전체를 name 구간으로 기록하는 데코레이터."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def count(name, n=1):
+    run = getattr(_local, "run", None)
+    if run is not None:
+        run["counters"][name] = run["counters"].get(name, 0) + n
+    with _lock:
+        _totals[name] += n
+
+def bytes_read(n):
+    run = getattr(_local, "run", None)
+    if run is not None:
+        run["bytes_read"] += n
+    with _lock:
+        _totals["bytes_read_total"] += n
+
+def bytes_written(n):
+    run = getattr(_local, "run", None)
+    if run is not None:
+        run["bytes_written"] += n
+    with _lock:
+        _totals["bytes_written_total"] += n
+
+
+# --- 프로파일 ---
+def _stop_profiler(run):
+    profiler = run.get("profiler")
+    if profiler is None:
+        return None
+    run["profiler"] = None
+    try:
+        profiler.disable()
+    except ValueError: # 다른 스레드에서 마무리하는 경우
+        pass
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(run["started_at"]))
+    profiler.dump_stats(os.path.join(PROFILE_DIR, f"{run['page']}-{stamp}-{os.getpid()}.prof"))
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+    return out.getvalue()
+
+def last_profile(session_id=None):
+    """이 세션의 직전 rerun 프로파일 요약(텍스트). 없으면 None."""
+    with _lock:
+        return _last_profiles.get(session_id)
+
+
+# --- 요약 ---
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+def phase_summary():
+    """구간별 {"phase", "count", "p50_ms", "p95_ms", "max_ms"} 목록 (p95 내림차순)."""
+    with _lock:
+        samples = {name: sorted(values) for name, values in _samples.items() if values}
+    rows = []
+    for name, values in samples.items():
+        rows.append({
+            "phase": name, "count": len(values),
+            "p50_ms": round(_percentile(values, 0.50) * 1000, 2),
+            "p95_ms": round(_percentile(values, 0.95) * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2),
+        })
+    rows.sort(key=lambda row: row["p95_ms"], reverse=True)
+    return rows
+
+def recent_reruns(limit=50):
+    with _lock:
+        return list(_recent)[-limit:][::-1]
+
+def totals():
+    with _lock:
+        return dict(_totals)
+
+
+# --- Prometheus 엔드포인트 ---
+def _prometheus_text():
+    lines = [
+        "# HELP app_phase_seconds 실행 구간별 소요 시간 (최근 표본 기준 분위수)",
+        "# TYPE app_phase_seconds summary",
+    ]
+    with _lock:
+        samples = {name: sorted(values) for name, values in _samples.items() if values}
+        counters = dict(_totals)
+    for name, values in sorted(samples.items()):
+        for quantile in (0.5, 0.95):
+            lines.append(f'app_phase_seconds{{phase="{name}",quantile="{quantile}"}} {_percentile(values, quantile):.6f}')
+        lines.append(f'app_phase_seconds_sum{{phase="{name}"}} {sum(values):.6f}')
+        lines.append(f'app_phase_seconds_count{{phase="{name}"}} {len(values)}')
+    lines.append("# TYPE app_counter_total counter")
+    for name, value in sorted(counters.items()):
+        lines.append(f'app_counter_total{{name="{name}"}} {value:g}')
+    return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = _prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_exporter(port=None):
+    """METRICS_PORT(또는 port)에 `/metrics`를 엽니다. 프로세스당 한 번만 열리며, 포트가 없으면 아무 일도 하지 않습니다."""
+    global _exporter
+    port = port or METRICS_PORT
+    with _lock:
+        if _exporter is not None or not port:
+            return _exporter
+        try:
+            _exporter = ThreadingHTTPServer(("0.0.0.0", int(port)), _MetricsHandler)
+        except OSError: # 같은 호스트의 다른 프로세스가 이미 열었으면 건너뜁니다.
+            return None
+    threading.Thread(target=_exporter.serve_forever, name="metrics-exporter", daemon=True).start()
+    return _exporter
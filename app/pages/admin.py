@@ -0,0 +1,64 @@
+import streamlit as st
+import metrics
+
+# --- 페이지 기본 설정 ---
+st.set_page_config(layout="wide", page_title="성능 지표")
+
+# --- 사이드바 네비게이션 숨기기 ---
+hide_pages_nav_css = """
+    <style> [data-testid="stSidebarNav"] {display: none;} </style>
+"""
+st.markdown(hide_pages_nav_css, unsafe_allow_html=True)
+
+# --- 상수 정의 ---
+RECENT_LIMIT = 50 # 표에 보여줄 최근 rerun 수
+
+
+# --------------------------------------------------------------------------
+# UI
+# --------------------------------------------------------------------------
+title_col, button_col = st.columns([0.8, 0.2])
+with title_col:
+    st.title("📈 성능 지표")
+with button_col:
+    st.write("")
+    st.page_link("app.py", label="🏠 상담 시스템으로 돌아가기", use_container_width=True)
+
+st.caption(
+    "이 서버 프로세스(레플리카)가 시작된 뒤의 계측값입니다. 여러 레플리카를 합쳐 보려면 "
+    "METRICS_LOG(JSONL) 또는 METRICS_PORT(Prometheus `/metrics`)를 사용하세요. "
+    "상담/가이드 화면 주소에 `?profile=1`을 붙이면 해당 세션의 실행을 cProfile로 기록합니다."
+)
+if st.button("🔄 새로고침"):
+    st.rerun()
+
+totals = metrics.totals()
+stat_cols = st.columns(4)
+stat_cols[0].metric("rerun 수", f"{totals.get('reruns_total', 0):,.0f}")
+stat_cols[1].metric("읽은 바이트", f"{totals.get('bytes_read_total', 0) / 1024 / 1024:,.1f} MB")
+stat_cols[2].metric("쓴 바이트", f"{totals.get('bytes_written_total', 0) / 1024 / 1024:,.1f} MB")
+hits, misses = totals.get("answer_cache.hits", 0), totals.get("answer_cache.misses", 0)
+stat_cols[3].metric("응답 캐시 적중률", f"{hits / (hits + misses):.0%}" if hits + misses else "-")
+
+st.subheader("구간별 소요 시간 (p50 / p95)")
+phase_rows = metrics.phase_summary()
+if phase_rows:
+    st.dataframe(phase_rows, use_container_width=True, hide_index=True)
+else:
+    st.info("아직 기록된 실행이 없습니다. 상담 화면이나 가이드 화면을 사용한 뒤 새로고침하세요.")
+
+st.subheader("최근 실행")
+recent = metrics.recent_reruns(RECENT_LIMIT)
+if recent:
+    st.dataframe([
+        {
+            "화면": run["page"], "시간(ms)": round(run["duration_s"] * 1000, 1),
+            "완료": "예" if run["completed"] else "중간 종료",
+            "읽기(KB)": round(run["bytes_read"] / 1024, 1), "쓰기(KB)": round(run["bytes_written"] / 1024, 1),
+            "가장 느린 구간": max(run["phases"], key=run["phases"].get) if run["phases"] else "-",
+        }
+        for run in recent
+    ], use_container_width=True, hide_index=True)
+
+with st.expander("카운터 (프로세스 누적)"):
+    st.json({name: value for name, value in sorted(totals.items())})
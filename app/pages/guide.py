@@ -1,11 +1,23 @@
 import streamlit as st
-import json
 import os
 from datetime import datetime
+import uuid
+import attachments
+import guide_store
+import metrics
+import service
+import ui
 
 # --- 페이지 기본 설정 ---
 st.set_page_config(layout="wide", page_title="가이드 뷰어")
 
+# --- 계측 시작 (구간별 시간/입출력량, 관리 화면: pages/admin.py) ---
+# 주소에 ?profile=1을 붙이면 이 세션의 실행을 cProfile로 기록하고 화면 아래에 요약을 보여줍니다.
+if 'metrics_session' not in st.session_state:
+    st.session_state.metrics_session = uuid.uuid4().hex
+profiling = st.query_params.get("profile") == "1"
+metrics.begin_rerun("guide", st.session_state.metrics_session, profile=profiling)
+
 # --- 사이드바 네비게이션 숨기기 ---
 hide_pages_nav_css = """
     <style>
@@ -17,41 +29,31 @@ hide_pages_nav_css = """
 st.markdown(hide_pages_nav_css, unsafe_allow_html=True)
 
 # --- 상수 정의 ---
-GUIDE_DIR = "guide"
-GUIDE_FILE_PATH = os.path.join(GUIDE_DIR, "guide.json")
-ATTACHMENT_DIR = os.path.join(GUIDE_DIR, "attachments")
-os.makedirs(ATTACHMENT_DIR, exist_ok=True)
+GUIDE_PAGE_SIZE = 20 # 한 페이지에 표시할 가이드 수
+service.init()
 
 
 # --- 상태 관리 초기화 ---
 if 'editing_guide_id' not in st.session_state:
     st.session_state.editing_guide_id = None
+if 'editing_guide_rev' not in st.session_state:
+    st.session_state.editing_guide_rev = None # 수정 화면을 열 때 읽은 가이드 rev
 if 'adding_new_guide' not in st.session_state:
     st.session_state.adding_new_guide = False
-
-# --- 헬퍼 함수 ---
-def get_all_guides():
-    """guide.json 파일에서 모든 가이드 목록을 불러옵니다."""
-    if not os.path.exists(GUIDE_FILE_PATH):
-        return []
-    with open(GUIDE_FILE_PATH, "r", encoding="utf-8") as f:
-        try:
-            guides = json.load(f)
-            if isinstance(guides, list):
-                return sorted(guides, key=lambda x: x.get('created_at', ''), reverse=True)
-            return []
-        except (json.JSONDecodeError, FileNotFoundError):
-            return []
-
-def save_all_guides(guides):
-    """모든 가이드 목록을 guide.json 파일에 저장합니다."""
-    with open(GUIDE_FILE_PATH, "w", encoding="utf-8") as f:
-        json.dump(guides, f, ensure_ascii=False, indent=2)
+if 'pending_guide' not in st.session_state:
+    st.session_state.pending_guide = None # (저장하려던 가이드, 비슷한 기존 가이드 목록)
+if 'guide_page' not in st.session_state:
+    st.session_state.guide_page = 0
+if 'guide_search_term' not in st.session_state:
+    st.session_state.guide_search_term = ""
+ui.init_state() # 백그라운드 작업 알림 상태
 
 # --------------------------------------------------------------------------
 # UI
 # --------------------------------------------------------------------------
 
+metrics.section("render.guide_form")
+
 # --- 타이틀 및 홈 버튼 ---
 title_col, button_col = st.columns([0.8, 0.2])
 with title_col:
@@ -62,12 +64,19 @@ with button_col:
 
 st.divider()
 
+ui.show_jobs()
+
 # --- [핵심 수정] 새 가이드 추가 버튼 ---
 if st.button("지식베이스에 추가하기", use_container_width=True):
     st.session_state.adding_new_guide = True
     st.session_state.editing_guide_id = None # 다른 수정창 닫기
     st.rerun()
 
+def finish_adding():
+    st.session_state.pending_guide = None
+    st.session_state.adding_new_guide = False
+    st.rerun()
+
 # --- [핵심 수정] 새 가이드 추가 폼 ---
 if st.session_state.adding_new_guide:
     st.subheader("✍️ 새 가이드 직접 추가")
@@ -81,53 +90,120 @@ if st.session_state.adding_new_guide:
         form_cols = st.columns(2)
         if form_cols[0].form_submit_button("💾 새 가이드 저장", use_container_width=True, type="primary"):
             if new_prompt and new_response:
-                all_guides = get_all_guides()
-                file_path = None
-                if new_uploaded_file is not None:
-                    file_path = os.path.join(ATTACHMENT_DIR, new_uploaded_file.name)
-                    with open(file_path, "wb") as f:
-                        f.write(new_uploaded_file.getbuffer())
-
-                new_guide_content = {
-                    "prompt": new_prompt, "response": new_response, "cause": new_cause,
-                    "attachment_path": file_path, "counselor_name": "수동 추가",
-                    "created_at": datetime.now().isoformat(), "original_source": "수동 입력"
-                }
-                all_guides.insert(0, new_guide_content) # 최신순이므로 맨 앞에 추가
-                save_all_guides(all_guides)
-                st.session_state.adding_new_guide = False
-                st.success("새 가이드가 성공적으로 추가되었습니다.")
-                st.rerun()
+                guide = service.new_guide(
+                    new_prompt, new_response, new_cause, counselor_name="수동 추가",
+                    original_source="수동 입력",
+                )
+                duplicates = service.find_duplicate_guides(guide)
+                if duplicates: # 저장하기 전에 합칠지 묻기
+                    st.session_state.pending_guide = (guide, duplicates)
+                else:
+                    job_id = service.submit_guide(guide, new_uploaded_file, owner=st.session_state.metrics_session)
+                    ui.watch_job(job_id, "가이드 저장")
+                    finish_adding()
             else:
                 st.warning("질문과 답변은 필수 입력 항목입니다.")
 
         if form_cols[1].form_submit_button("❌ 취소", use_container_width=True):
-            st.session_state.adding_new_guide = False
-            st.rerun()
+            finish_adding()
+    if st.session_state.pending_guide:
+        ui.resolve_duplicate_guide(finish_adding, new_uploaded_file)
     st.divider()
 
 
-all_guides = get_all_guides()
+# --- 중복 가이드 정리 (CLI: python guide_dedup.py) ---
+with st.expander("🧹 중복 가이드 정리"):
+    if st.button("🔍 중복 가이드 찾기", key="find_duplicate_groups"):
+        st.session_state.duplicate_groups = service.duplicate_guide_groups()
+    groups = st.session_state.get("duplicate_groups")
+    if groups is not None:
+        if not groups:
+            st.info("중복 가이드가 없습니다.")
+        else:
+            st.write(f"중복 묶음 {len(groups):,}개 — 묶음마다 가장 최근 가이드만 남기고 {sum(len(g) - 1 for g in groups):,}건을 지웁니다.")
+            st.dataframe(
+                [{"묶음": i + 1, "남김": j == 0, "질문": g["prompt"], "작성": g.get("created_at", "")}
+                 for i, group in enumerate(groups[:200]) for j, g in enumerate(group)],
+                use_container_width=True, hide_index=True,
+            )
+            if st.button("🗑️ 중복 정리", key="dedup_guides", type="primary"):
+                ui.watch_job(service.submit_maintenance("dedup_guides", owner=st.session_state.metrics_session), "중복 정리")
+                st.session_state.duplicate_groups = None
+                st.rerun()
+
+# --- 일괄 가져오기 / 내보내기 (CLI: python bulk_io.py) ---
+with st.expander("📦 일괄 가져오기 / 내보내기"):
+    bulk_kind = st.radio(
+        "대상", options=["guides", "histories"], format_func={"guides": "가이드", "histories": "상담"}.get,
+        horizontal=True, key="bulk_kind",
+    )
+    bulk_cols = st.columns(2)
+    with bulk_cols[0]:
+        st.markdown("**가져오기**")
+        bulk_file = st.file_uploader("CSV, JSONL, Excel(.xlsx)", type=["csv", "jsonl", "ndjson", "xlsx"], key="bulk_file")
+        if bulk_file is not None and st.button("⬆️ 가져오기", key="bulk_import", use_container_width=True):
+            # 파일은 디스크에 받아 두고 작업 스레드가 가져옵니다. 진행률은 위의 ui.show_jobs()가 그립니다.
+            try:
+                job_id = service.submit_import(bulk_kind, bulk_file, owner=st.session_state.metrics_session)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                ui.watch_job(job_id, f"{bulk_file.name} 가져오기")
+                st.rerun()
+    with bulk_cols[1]:
+        st.markdown("**내보내기**")
+        export_format = st.selectbox("형식", options=["csv", "jsonl", "xlsx"], key="bulk_export_format")
+        export_job = st.session_state.get("bulk_export_job") # 맡긴 내보내기 작업 id
+        if export_job is not None:
+            job = next(iter(service.get_jobs([export_job])), None)
+            if job is None or job["status"] not in ("queued", "running"):
+                export_job = st.session_state.bulk_export_job = None
+                if job is not None and job["status"] == "done":
+                    if st.session_state.get("bulk_export"):
+                        service.discard_export(st.session_state.bulk_export[2])
+                    result = job["result"]
+                    st.session_state.bulk_export = (result["kind"], result["format"], result["path"]) # 파일 경로만 보관
+        if st.button("⬇️ 내보내기 파일 만들기", key="bulk_export_button", use_container_width=True,
+                     disabled=export_job is not None):
+            # 파일은 작업 스레드가 만듭니다. 진행률은 위의 ui.show_jobs()가 그립니다.
+            export_job = service.submit_export(bulk_kind, export_format, owner=st.session_state.metrics_session)
+            st.session_state.bulk_export_job = export_job
+            ui.watch_job(export_job, "내보내기 파일 만들기")
+            st.rerun()
+        export = st.session_state.get("bulk_export")
+        if export and export[:2] == (bulk_kind, export_format) and os.path.exists(export[2]):
+            with open(export[2], "rb") as export_file:
+                st.download_button(
+                    "💾 다운로드", data=export_file, use_container_width=True,
+                    file_name=f"{bulk_kind}_{datetime.now():%Y%m%d_%H%M%S}.{export_format}",
+                )
 
-if not all_guides and not st.session_state.adding_new_guide:
+if not service.has_guides() and not st.session_state.adding_new_guide:
     st.info("아직 생성된 가이드가 없습니다. 상담 시스템에서 가이드를 추가하거나, 위 버튼을 눌러 직접 추가해주세요.")
     st.stop()
 
 # 검색 기능 및 목록 표시
+metrics.section("render.guide_list")
 if not st.session_state.adding_new_guide: # 새 가이드 추가 중에는 목록 숨기기
     search_term = st.text_input("가이드 검색", placeholder="질문, 답변, 원인 내용으로 검색...")
+    if search_term != st.session_state.guide_search_term:
+        st.session_state.guide_search_term = search_term
+        st.session_state.guide_page = 0
+
+    # 검색어가 있으면 검색 순위, 없으면 최신순으로 현재 페이지만 가져옵니다.
+    # 삭제 등으로 현재 페이지가 비면 service가 마지막 페이지를 돌려줍니다.
+    guide_page = service.list_guides_page(search_term, page=st.session_state.guide_page, page_size=GUIDE_PAGE_SIZE)
+    st.session_state.guide_page = guide_page["page"]
+    page_guides, total_count = guide_page["guides"], guide_page["total"]
 
-    for index, guide_data in enumerate(all_guides):
+    for guide_data in page_guides:
+        guide_id = guide_store.guide_key(guide_data)
         prompt = guide_data.get("prompt", "")
         response = guide_data.get("response", "")
         cause = guide_data.get("cause", "")
-        
-        search_content = f"{prompt} {response} {cause}".lower()
-        if search_term.lower() not in search_content:
-            continue
-        
+
         # --- 수정 모드 ---
-        if st.session_state.editing_guide_id == guide_data.get('created_at'):
+        if st.session_state.editing_guide_id == guide_id:
             st.subheader(f"✍️ 가이드 수정: {prompt[:30]}...")
             with st.container(border=True):
                 st.markdown("**원본 내용**")
@@ -136,7 +212,7 @@ if not st.session_state.adding_new_guide: # 새 가이드 추가 중에는 목
                 st.caption(f"원본 출처: {guide_data.get('original_source', '정보 없음')}")
             st.divider()
 
-            with st.form(key=f"edit_form_{guide_data.get('created_at')}"):
+            with st.form(key=f"edit_form_{guide_id}"):
                 edited_response = st.text_area("답변 수정", value=response, height=200)
                 
                 cause_options = ["단순 문의", "기능 사용법 문의", "오류/버그 리포트", "계정/인증 문제", "정책/규정 문의", "개선 제안", "기타"]
@@ -149,26 +225,23 @@ if not st.session_state.adding_new_guide: # 새 가이드 추가 중에는 목
                 st.subheader("첨부 파일")
                 current_attachment = guide_data.get("attachment_path")
                 if current_attachment and os.path.exists(current_attachment):
-                    st.caption(f"현재 파일: {os.path.basename(current_attachment)}")
+                    st.caption(f"현재 파일: {attachments.display_name(guide_data)}")
                 else:
                     st.caption("현재 첨부된 파일 없음")
                 
-                edited_uploaded_file = st.file_uploader("새 파일 첨부 (기존 파일 대체)", key=f"uploader_{guide_data.get('created_at')}")
+                edited_uploaded_file = st.file_uploader("새 파일 첨부 (기존 파일 대체)", key=f"uploader_{guide_id}")
                 st.divider()
 
                 form_cols = st.columns(2)
                 if form_cols[0].form_submit_button("💾 변경사항 저장", use_container_width=True, type="primary"):
-                    all_guides[index]['response'] = edited_response
-                    all_guides[index]['cause'] = edited_cause
-                    if edited_uploaded_file:
-                        file_path = os.path.join(ATTACHMENT_DIR, edited_uploaded_file.name)
-                        with open(file_path, "wb") as f:
-                            f.write(edited_uploaded_file.getbuffer())
-                        all_guides[index]['attachment_path'] = file_path
-                    
-                    save_all_guides(all_guides)
+                    changes = {"response": edited_response, "cause": edited_cause}
+                    # 다른 사용자가 먼저 수정했다면 작업이 VersionConflict로 실패하고, 알림을 보고 다시 열어 수정합니다.
+                    job_id = service.submit_guide_update(
+                        guide_id, changes, expected_rev=st.session_state.editing_guide_rev,
+                        uploaded_file=edited_uploaded_file or None, owner=st.session_state.metrics_session,
+                    )
+                    ui.watch_job(job_id, "가이드 수정")
                     st.session_state.editing_guide_id = None
-                    st.success("가이드가 성공적으로 수정되었습니다.")
                     st.rerun()
 
                 if form_cols[1].form_submit_button("❌ 취소", use_container_width=True):
@@ -191,20 +264,43 @@ if not st.session_state.adding_new_guide: # 새 가이드 추가 중에는 목
                     if created_at_str: st.write(datetime.fromisoformat(created_at_str).strftime("%Y-%m-%d %H:%M"))
                     else: st.write("날짜 정보 없음")
 
+                # 파일 내용은 페이지에 싣지 않고 nginx가 직접 내려주는 링크만 그립니다.
                 attachment_path = guide_data.get("attachment_path")
-                if attachment_path and os.path.exists(attachment_path):
-                    with open(attachment_path, "rb") as file:
-                        st.download_button(label=f"📁 파일 다운로드 ({os.path.basename(attachment_path)})", data=file, file_name=os.path.basename(attachment_path), use_container_width=True)
+                if attachment_path:
+                    attachment_label = f"📁 파일 다운로드 ({attachments.display_name(guide_data)})"
+                    attachment_url = service.attachment_url(guide_data)
+                    if attachment_url:
+                        st.link_button(attachment_label, attachment_url, use_container_width=True)
+                    elif os.path.exists(attachment_path):
+                        if st.button(f"{attachment_label} 준비", key=f"prepare_{guide_id}", use_container_width=True):
+                            st.download_button(label=attachment_label, data=attachments.read_bytes(guide_data), file_name=attachments.display_name(guide_data), key=f"download_{guide_id}", use_container_width=True)
                 
                 st.markdown("---")
                 btn_cols = st.columns([0.1, 0.1, 0.8])
-                if btn_cols[0].button("✏️ 수정", key=f"edit_{guide_data.get('created_at')}"):
-                    st.session_state.editing_guide_id = guide_data.get('created_at')
+                if btn_cols[0].button("✏️ 수정", key=f"edit_{guide_id}"):
+                    st.session_state.editing_guide_id = guide_id
+                    st.session_state.editing_guide_rev = guide_data.get("rev", 0)
                     st.session_state.adding_new_guide = False # 새 가이드 추가 모드 끄기
                     st.rerun()
 
-                if btn_cols[1].button("🗑️ 삭제", key=f"delete_{guide_data.get('created_at')}"):
-                    guides_to_keep = [g for g in all_guides if g.get('created_at') != guide_data.get('created_at')]
-                    save_all_guides(guides_to_keep)
+                if btn_cols[1].button("🗑️ 삭제", key=f"delete_{guide_id}"):
+                    service.delete_guide(guide_id)
                     st.success("가이드가 삭제되었습니다.")
                     st.rerun()
+
+    # --- 페이지 이동 ---
+    page_count = guide_page["page_count"]
+    page_cols = st.columns([0.1, 0.8, 0.1])
+    if page_cols[0].button("◀ 이전", disabled=st.session_state.guide_page == 0, use_container_width=True):
+        st.session_state.guide_page -= 1
+        st.rerun()
+    page_cols[1].caption(f"{st.session_state.guide_page + 1} / {page_count} 페이지 (총 {total_count}건)")
+    if page_cols[2].button("다음 ▶", disabled=st.session_state.guide_page >= page_count - 1, use_container_width=True):
+        st.session_state.guide_page += 1
+        st.rerun()
+
+# --- 계측 끝 ---
+if profiling and metrics.last_profile(st.session_state.metrics_session):
+    with st.expander("🔬 직전 실행 프로파일 (cProfile)"):
+        st.code(metrics.last_profile(st.session_state.metrics_session))
+metrics.end_rerun()
@@ -0,0 +1,74 @@
+import streamlit as st
+import math
+import uuid
+import metrics
+import service
+
+# --- 페이지 기본 설정 ---
+st.set_page_config(layout="wide", page_title="상담 통계")
+
+# --- 계측 시작 (구간별 시간/입출력량, 관리 화면: pages/admin.py) ---
+if 'metrics_session' not in st.session_state:
+    st.session_state.metrics_session = uuid.uuid4().hex
+metrics.begin_rerun("report", st.session_state.metrics_session, profile=st.query_params.get("profile") == "1")
+
+# --- 사이드바 네비게이션 숨기기 ---
+hide_pages_nav_css = """
+    <style> [data-testid="stSidebarNav"] {display: none;} </style>
+"""
+st.markdown(hide_pages_nav_css, unsafe_allow_html=True)
+
+service.init()
+
+
+# --------------------------------------------------------------------------
+# UI
+# --------------------------------------------------------------------------
+title_col, button_col = st.columns([0.8, 0.2])
+with title_col:
+    st.title("📊 상담 통계")
+with button_col:
+    st.write("")
+    st.page_link("app.py", label="🏠 상담 시스템으로 돌아가기", use_container_width=True)
+
+period = st.date_input("기간 (상담 시작일 / 가이드 작성일)", value=(), key="report_period")
+date_from = period[0].isoformat() if len(period) > 0 else None
+date_to = period[-1].isoformat() if len(period) > 0 else None
+
+metrics.section("render.report")
+report = service.report(date_from=date_from, date_to=date_to)
+totals = report["totals"]
+
+stat_cols = st.columns(5)
+stat_cols[0].metric("상담 수", f"{totals['consultations']:,}")
+stat_cols[1].metric("상담원 수", f"{totals['counselors']:,}")
+stat_cols[2].metric("메시지 수", f"{totals['messages']:,}")
+mean_duration = totals["mean_duration_min"]
+stat_cols[3].metric("평균 상담 시간", "-" if math.isnan(mean_duration) else f"{mean_duration:,.1f}분")
+stat_cols[4].metric("가이드 수", f"{totals['guides']:,}")
+
+st.subheader("상담원별 통계")
+if report["counselors"].empty:
+    st.info("기간에 해당하는 상담이 없습니다.")
+else:
+    st.dataframe(report["counselors"], use_container_width=True, hide_index=True)
+    st.caption("평균 상담 시간은 종료 시각(end_time)이 기록된 상담만으로 계산합니다.")
+    chart_cols = st.columns(2)
+    with chart_cols[0]:
+        st.markdown("**상담원별 상담 수**")
+        st.bar_chart(report["counselors"].set_index("상담원")["상담 수"])
+    with chart_cols[1]:
+        st.markdown("**상담당 메시지 수 분포**")
+        st.bar_chart(report["messages"].set_index("메시지 수")["상담 수"])
+    st.markdown("**일별 상담 수**")
+    st.line_chart(report["daily"])
+
+st.subheader("가이드 원인 분포")
+if report["causes"].empty:
+    st.info("기간에 해당하는 가이드가 없습니다.")
+else:
+    cause_cols = st.columns([1, 1])
+    cause_cols[0].dataframe(report["causes"], use_container_width=True, hide_index=True)
+    cause_cols[1].bar_chart(report["causes"].set_index("원인")["가이드 수"])
+
+metrics.end_rerun()
@@ -0,0 +1,54 @@
+"""운영용 시작 스크립트: 색인/캐시를 미리 읽어 둔 뒤 같은 프로세스에서 Streamlit 서버를 엽니다.
+
+`streamlit run app.py`는 서버를 먼저 열고, 첫 세션이 들어왔을 때 상담 인덱스와 가이드 색인을
+만듭니다. 그래서 헬스 체크는 바로 통과하지만 첫 화면이 늦습니다. 이 스크립트는 서버를 열기 전에
+service.warm_up()을 실행합니다. 헬스 체크(/_stcore/health)는 준비가 끝난 뒤에야 응답하고,
+화면 스크립트는 이미 읽어 둔 모듈과 색인을 그대로 씁니다.
+
+시작 시간(프로세스 시작 ~ 준비 완료)을 단계별로 출력하고, STARTUP_BUDGET_SECONDS(기본 30초)를
+넘으면 경고합니다. 서버를 여는 데 걸리는 시간까지 포함한 측정은 bench/startup.py로 합니다.
+    python serve.py [streamlit 설정 플래그 ...]     # 예: --server.port=8502
+"""
+import time
+
+_STARTED = time.perf_counter()
+
+import os
+import sys
+
+# --- 상수 정의 ---
+STARTUP_BUDGET_SECONDS = float(os.environ.get("STARTUP_BUDGET_SECONDS", "30"))
+# 운영용 서버 설정. 뒤에 붙인 플래그가 우선합니다.
+SERVER_FLAGS = [
+    "--server.port=8501",
+    "--server.address=0.0.0.0",
+    "--server.headless=true",
+    "--server.fileWatcherType=none", # 소스 감시/재적재 안 함 (미리 읽어 둔 모듈 유지, inotify 비용 없음)
+    "--server.runOnSave=false",
+    "--browser.gatherUsageStats=false", # 시작 시 외부 통신 없음
+    "--global.developmentMode=false",
+    "--client.toolbarMode=viewer",
+]
+
+
+def main(argv):
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+
+    started = time.perf_counter()
+    import service
+    timings = {"import": time.perf_counter() - started}
+    timings.update(service.warm_up())
+    elapsed = time.perf_counter() - _STARTED
+    phases = " · ".join(f"{name} {seconds:.2f}" for name, seconds in timings.items())
+    print(f"[serve] 준비 완료 {elapsed:.2f}초 ({phases}) / 예산 {STARTUP_BUDGET_SECONDS:g}초", file=sys.stderr, flush=True)
+    if elapsed > STARTUP_BUDGET_SECONDS:
+        print(f"[serve] 경고: 시작 시간이 예산을 {elapsed - STARTUP_BUDGET_SECONDS:.2f}초 넘었습니다.", file=sys.stderr, flush=True)
+
+    from streamlit.web import cli as stcli
+    sys.argv = ["streamlit", "run", "app.py", *SERVER_FLAGS, *argv]
+    return stcli.main()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
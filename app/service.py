@@ -0,0 +1,625 @@
+"""상담/가이드 백엔드 서비스 계층.
+
+Streamlit 화면(app.py, pages/guide.py)은 이 모듈의 함수만 호출하는 얇은 클라이언트입니다.
+저장소 경로, 상담 파일 형식 변환, 응답 캐시 사용 같은 업무 로직은 모두 여기에 있고,
+st.session_state에는 현재 상담 경로나 열려 있는 편집 창 같은 화면 상태(식별자)만 남깁니다.
+
+조회 함수는 한 화면 영역에 필요한 데이터를 한 번에 반환하는 일괄 엔드포인트입니다. 결과는
+저장소의 변경 세대(상담 인덱스 generation, 가이드 저장소 version, 파일 mtime/size)를 키로
+프로세스 전체(모든 세션)가 공유하는 캐시에 보관하므로, 위젯 이벤트마다 스크립트가 처음부터
+다시 실행되어도 저장소가 그대로라면 필터링/검색/파일 읽기를 다시 하지 않습니다.
+반환된 목록과 dict는 여러 세션이 함께 보므로 호출하는 쪽에서 수정하면 안 됩니다.
+
+열려 있는 상담은 working_set의 메모리 작업 사본을 거칩니다. 새 메시지는 바로 쓰지 않고 모았다가
+한 번에 기록하며(write-back), 조회 결과에는 아직 기록하지 않은 메시지도 포함됩니다.
+"""
+import contextlib
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+import answer_cache
+import attachments
+import bulk_io
+import chatbot
+import fileio
+import guide_retrieval
+import guide_store
+import history_archive
+import history_index
+import history_store
+import jobs
+import metrics
+import working_set
+
+# --- 상수 정의 ---
+HISTORY_DIR = "history"
+GUIDE_DIR = "guide"
+ATTACHMENT_DIR = os.path.join(GUIDE_DIR, "attachments")
+GUIDE_FILE_PATH = os.path.join(GUIDE_DIR, "guide.json") # 마이그레이션 전 레거시 파일
+GUIDE_DB_PATH = os.path.join(GUIDE_DIR, "guide.db") # 가이드 저장소 (SQLite)
+ANSWER_CACHE_PATH = answer_cache.cache_path(GUIDE_DB_PATH)
+JOBS_DB_PATH = os.path.join(GUIDE_DIR, "jobs.db") # 백그라운드 작업 대기열 (jobs)
+JOB_SPOOL_DIR = os.path.join(GUIDE_DIR, "incoming") # 작업이 처리하기 전의 가져오기 파일
+EXPORT_DIR = os.path.join(GUIDE_DIR, "exports") # 다운로드를 기다리는 내보내기 파일
+EXPORT_RETENTION_SECONDS = 24 * 3600 # 이보다 오래된 내보내기 파일은 다음 내보내기 때 지웁니다.
+# "jsonl": 메시지를 한 줄씩 덧붙이는 저장 방식 / "json": 기존처럼 파일 전체를 다시 쓰는 방식
+HISTORY_STORAGE_MODE = os.environ.get("HISTORY_STORAGE_MODE", "jsonl")
+RESULT_CACHE_SIZE = 256 # 엔드포인트별로 보관하는 조회 결과 수
+
+
+class _ResultCache:
+    """(변경 세대, 인자) -> 결과. 세대가 바뀐 결과는 다시 쓰이지 않고 오래된 것부터 밀려납니다."""
+
+    def __init__(self, name, max_entries=RESULT_CACHE_SIZE):
+        self.name = name
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                metrics.count(f"service.{self.name}.cache_hits")
+                return self._items[key]
+        metrics.count(f"service.{self.name}.cache_misses")
+        value = compute()
+        with self._lock:
+            self._items[key] = value
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+        return value
+
+_history_lists = _ResultCache("history_lists")
+_message_windows = _ResultCache("message_windows")
+_guide_pages = _ResultCache("guide_pages")
+_reports = _ResultCache("reports")
+_archived_lists = _ResultCache("archived_lists")
+_guide_drafts = _ResultCache("guide_drafts")
+
+
+def init():
+    """저장 폴더와 가이드 저장소를 준비합니다. 여러 번 호출해도 됩니다."""
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    os.makedirs(GUIDE_DIR, exist_ok=True)
+    os.makedirs(ATTACHMENT_DIR, exist_ok=True)
+    guide_store.init_store(GUIDE_DB_PATH, legacy_json_path=GUIDE_FILE_PATH)
+    jobs.start(JOBS_DB_PATH) # 이 프로세스의 작업 스레드 (JOB_WORKERS개)
+    metrics.start_exporter() # METRICS_PORT가 설정된 경우에만 열립니다.
+
+def warm_up():
+    """첫 화면이 쓰는 인덱스와 색인을 미리 읽어 둡니다 (serve.py가 서버를 열기 전에 호출).
+
+    단계별 소요 시간(초) {"init", "history_index", "search", "vectors", "dedup"}를 반환합니다.
+    """
+    timings = {}
+    started = time.perf_counter()
+    init()
+    timings["init"] = time.perf_counter() - started
+    started = time.perf_counter()
+    history_index.list_entries(HISTORY_DIR)
+    timings["history_index"] = time.perf_counter() - started
+    timings.update(guide_store.warm_up(GUIDE_DB_PATH))
+    return timings
+
+
+@metrics.timed("service.rebuild_indexes")
+def rebuild_indexes(progress=None):
+    """가이드 색인(검색, 벡터, 중복)을 저장소에서 새로 만듭니다. 색인별 소요 시간(초)을 반환합니다."""
+    return guide_store.rebuild_indexes(GUIDE_DB_PATH, progress=progress)
+
+
+# --- 상담: 조회 ---
+@metrics.timed("service.latest_history")
+def latest_history():
+    """가장 최근 상담 파일 경로. 없으면 None."""
+    entries = history_index.list_entries(HISTORY_DIR)
+    return entries[0][0] if entries else None
+
+@metrics.timed("service.list_histories")
+def list_histories(title=None, counselor=None, date_from=None, date_to=None, page=0, page_size=20):
+    """사이드바 목록 한 페이지와 필터 선택지를 한 번에 반환합니다.
+
+    {"entries": [(경로, 메타데이터), ...], "total", "page", "page_count", "counselors"}
+    page가 범위를 벗어나면 마지막 페이지로 맞춥니다.
+    """
+    generation = history_index.generation(HISTORY_DIR)
+    title = (title or "").strip()
+    filtered = _history_lists.get_or_compute(
+        ("filter", generation, title, counselor, date_from, date_to),
+        lambda: history_index.query_entries(
+            HISTORY_DIR, counselor=counselor, date_from=date_from, date_to=date_to, title=title,
+        ),
+    )
+    counselors = _history_lists.get_or_compute(
+        ("counselors", generation), lambda: history_index.list_counselors(HISTORY_DIR),
+    )
+    page_count = max(1, -(-len(filtered) // page_size))
+    page = min(max(page, 0), page_count - 1)
+    start = page * page_size
+    return {
+        "entries": filtered[start:start + page_size], "total": len(filtered),
+        "page": page, "page_count": page_count, "counselors": counselors,
+    }
+
+@metrics.timed("service.get_history")
+def get_history(filepath):
+    """상담 하나의 메타데이터(제목, 담당자, 메시지 수, rev 등). 없거나 읽을 수 없으면 None."""
+    with working_set.locked(filepath) as active:
+        return _active_meta(active)
+
+def _active_meta(active):
+    meta = active.meta(lambda: history_index.get_entry(active.filepath))
+    if meta is None or not active.pending:
+        return meta
+    return dict(meta, message_count=meta.get("message_count", 0) + len(active.pending))
+
+@metrics.timed("service.get_message_window")
+def get_message_window(filepath, window):
+    """대화 화면과 사이드바(제목 수정)를 그리는 데 필요한 것을 한 번에 반환합니다. 상담이 없으면 None.
+
+    {"meta", "messages", "first_index", "total", "has_context", "pending"}
+    messages는 최근 window개이며, has_context면 맨 앞 하나는 첫 답변의 질문을 찾기 위해
+    더 읽은 메시지입니다. first_index는 messages[0]의 전체 대화 내 위치이고, pending은
+    아직 파일에 기록하지 않은 메시지 수입니다.
+    """
+    with working_set.locked(filepath) as active:
+        meta = _active_meta(active)
+        if meta is None:
+            return None
+        pending = list(active.pending)
+        stored = []
+        if len(pending) <= window:
+            stored = _message_windows.get_or_compute(
+                (filepath, meta.get("mtime_ns"), meta.get("size"), window),
+                lambda: history_store.read_last_messages(filepath, window + 1),
+            )
+    messages = (stored + pending)[-(window + 1):]
+    total = meta.get("message_count", 0)
+    return {
+        "meta": meta, "messages": messages, "first_index": max(total - len(messages), 0),
+        "total": total, "has_context": len(messages) > window, "pending": len(pending),
+    }
+
+@metrics.timed("service.build_guide_draft")
+def build_guide_draft(filepath, message_index):
+    """message_index번째 답변과 바로 앞 질문으로 새 가이드 초안을 만듭니다. 짝이 맞지 않으면 None.
+
+    메시지는 덧붙이기만 하므로 같은 위치의 초안은 바뀌지 않습니다. 편집 창이 열려 있는 동안
+    다시 그릴 때마다 working_set을 비우지 않도록, 처음 만들 때만 기록하고 읽습니다.
+    """
+    def compute():
+        working_set.flush(filepath) # 초안의 짝이 아직 기록 전일 수 있습니다.
+        meta = history_index.get_entry(filepath)
+        if meta is None or message_index < 1:
+            return None
+        skip = meta.get("message_count", 0) - message_index - 1
+        pair = history_store.read_last_messages(filepath, 2, skip=max(skip, 0))
+        if len(pair) != 2 or pair[0]["role"] != "user" or pair[1]["role"] != "assistant":
+            return None
+        return {"prompt": pair[0]["content"], "response": pair[1]["content"], "source": pair[1].get("source", "출처 없음")}
+
+    return _guide_drafts.get_or_compute((filepath, message_index), compute)
+
+
+# --- 상담: 쓰기 ---
+# 레거시 .json 상담은 jsonl 모드에서 처음 쓸 때 .jsonl로 옮겨지므로, 쓰기 함수는 실제로 기록한
+# 상담 경로를 반환합니다. 화면은 이 값으로 현재 상담 경로를 바꿔야 합니다.
+@metrics.timed("service.create_history")
+def create_history(counselor_name="담당자 미지정"):
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    new_data = {
+        "title": f"새 상담 ({timestamp})", "summary": "이곳에 상담 요약을 작성하세요.",
+        "counselor_name": counselor_name, "start_time": datetime.now().isoformat(),
+        "end_time": None, "messages": []
+    }
+    # 이름은 초 단위라 같은 초에 시작한 상담(다른 상담원, 다른 레플리카)과 겹칠 수 있습니다. 겹치면 접미사를 붙입니다.
+    stem = f"history{timestamp}"
+    while True:
+        try:
+            if HISTORY_STORAGE_MODE == "jsonl":
+                new_filepath = os.path.join(HISTORY_DIR, stem + history_store.LOG_SUFFIX)
+                history_store.create_history(new_filepath, new_data)
+            else:
+                new_filepath = os.path.join(HISTORY_DIR, stem + history_store.LEGACY_SUFFIX)
+                history_store.create_legacy(new_filepath, new_data)
+        except FileExistsError:
+            stem = f"history{timestamp}_{uuid.uuid4().hex[:8]}"
+        else:
+            break
+    history_index.record(new_filepath, new_data)
+    return new_filepath
+
+def _ensure_log_format(filepath):
+    """jsonl 모드에서 레거시 .json 상담에 처음 쓸 때 .jsonl로 옮기고 새 경로를 반환합니다."""
+    if HISTORY_STORAGE_MODE != "jsonl" or history_store.is_log(filepath):
+        return filepath
+    new_filepath = history_store.import_legacy(filepath)
+    history_index.record(new_filepath, history_store.load_history(new_filepath))
+    return new_filepath
+
+@metrics.timed("service.append_messages")
+def append_messages(filepath, messages):
+    """메시지를 상담의 작업 사본에 추가하고 상담 경로를 반환합니다. 파일에는 모아서 기록됩니다."""
+    filepath = _ensure_log_format(filepath)
+    working_set.add(filepath, messages, _write_messages)
+    return filepath
+
+def _write_messages(filepath, messages):
+    """working_set이 모아 둔 메시지를 파일에 한 번에 덧붙입니다."""
+    history_store.append_messages(filepath, messages)
+    history_index.record_update(filepath, added_messages=len(messages))
+
+def flush_history(filepath):
+    """상담에 아직 기록하지 않은 메시지를 지금 기록하고, 기록한 메시지 수를 반환합니다.
+
+    그 사이 다른 곳에서 상담을 보관/삭제했으면 FileNotFoundError (메시지는 작업 사본에 남습니다).
+    """
+    return working_set.flush(filepath) if filepath else 0
+
+@metrics.timed("service.update_title")
+def update_title(filepath, title, expected_rev=None):
+    """제목을 바꾸고 상담 경로를 반환합니다. expected_rev가 현재 rev와 다르면 fileio.VersionConflict."""
+    filepath = _ensure_log_format(filepath)
+    rev = history_store.update_header(filepath, expected_rev=expected_rev, title=title)
+    history_index.record_update(filepath, header={"title": title, "rev": rev})
+    working_set.invalidate(filepath)
+    return filepath
+
+
+# --- 상담: 보관 (history_archive) ---
+@metrics.timed("service.archive_histories")
+def archive_histories(max_age_days=history_archive.DEFAULT_MAX_AGE_DAYS):
+    """마지막 활동이 max_age_days일보다 오래된 상담을 보관 묶음으로 옮기고 옮긴 수를 반환합니다."""
+    working_set.flush_all()
+    candidates = history_archive.select_candidates(HISTORY_DIR, max_age_days)
+    return history_archive.archive(HISTORY_DIR, [path for path, _ in candidates])
+
+@metrics.timed("service.list_archived")
+def list_archived(title=None, page=0, page_size=20):
+    """보관된 상담 한 페이지. {"entries": [(이름, 메타데이터), ...], "total", "page", "page_count"}"""
+    title = (title or "").strip().lower()
+
+    def compute():
+        entries = history_archive.list_entries(HISTORY_DIR)
+        if title:
+            entries = [(name, meta) for name, meta in entries if title in str(meta.get("title", name)).lower()]
+        return entries
+
+    filtered = _archived_lists.get_or_compute((history_archive.version(HISTORY_DIR), title), compute)
+    page_count = max(1, -(-len(filtered) // page_size))
+    page = min(max(page, 0), page_count - 1)
+    start = page * page_size
+    return {"entries": filtered[start:start + page_size], "total": len(filtered), "page": page, "page_count": page_count}
+
+@metrics.timed("service.get_archived")
+def get_archived(name):
+    """보관된 상담 하나(header 필드 + messages, 읽기 전용). 없으면 None."""
+    return _archived_lists.get_or_compute(
+        ("load", history_archive.version(HISTORY_DIR), name), lambda: history_archive.load(HISTORY_DIR, name),
+    )
+
+
+# --- 챗봇 ---
+@metrics.timed("service.start_answer")
+def start_answer(prompt, history=()):
+    """(응답 스트림, 캐시 적중 여부). 캐시에 없으면 비슷한 가이드를 찾아 답변을 시작합니다."""
+    cached = answer_cache.get(ANSWER_CACHE_PATH, prompt)
+    if cached:
+        return chatbot.start_response(prompt, responder=chatbot.CachedResponder(cached)), True
+    matches = guide_store.retrieve_similar(GUIDE_DB_PATH, prompt, k=3)
+    stream = chatbot.start_response(
+        prompt, history=history, matches=matches,
+        direct_answer_threshold=guide_retrieval.DIRECT_ANSWER_THRESHOLD,
+    )
+    return stream, False
+
+@metrics.timed("service.finish_answer")
+def finish_answer(filepath, prompt, stream, cached=False):
+    """스트림이 끝난 뒤 응답 캐시에 저장하고 질문/답변을 상담에 기록합니다. 상담 경로를 반환합니다."""
+    if not stream.error and not cached:
+        answer_cache.put(
+            ANSWER_CACHE_PATH, prompt, stream.text, source=stream.source,
+            guide_ids=[guide.get("id") for guide in stream.context],
+        )
+    return append_messages(filepath, [
+        {"role": "user", "content": prompt},
+        {"role": "assistant", "content": stream.text or f"({stream.error})", "source": stream.source,
+         "timestamp": datetime.now().isoformat()},
+    ])
+
+def cache_stats():
+    return answer_cache.stats(ANSWER_CACHE_PATH)
+
+
+# --- 가이드 ---
+def has_guides():
+    return bool(guide_store.list_guides(GUIDE_DB_PATH))
+
+@metrics.timed("service.list_guides_page")
+def list_guides_page(search_term="", page=0, page_size=20):
+    """가이드 화면 한 페이지. 검색어가 있으면 검색 순위, 없으면 최신순입니다.
+
+    {"guides", "total", "page", "page_count"} — 삭제 등으로 page가 비면 마지막 페이지로 맞춥니다.
+    """
+    term = (search_term or "").strip()
+    version = guide_store.get_version(GUIDE_DB_PATH)
+
+    def compute(page):
+        start = page * page_size
+        if term:
+            guides_by_id = guide_store.get_guides_by_id(GUIDE_DB_PATH)
+            total, hits = guide_store.get_search_index(GUIDE_DB_PATH).search(term, limit=page_size, offset=start)
+            guides = [guides_by_id[guide_id] for guide_id, _ in hits if guide_id in guides_by_id]
+        else:
+            all_guides = guide_store.list_guides(GUIDE_DB_PATH)
+            total, guides = len(all_guides), all_guides[start:start + page_size]
+        page_count = max(1, -(-total // page_size))
+        if page >= page_count:
+            return compute(page_count - 1)
+        return {"guides": guides, "total": total, "page": page, "page_count": page_count}
+
+    page = max(page, 0)
+    return _guide_pages.get_or_compute((version, term, page, page_size), lambda: compute(page))
+
+def new_guide(prompt, response, cause, counselor_name, original_source):
+    """저장할 가이드 dict를 만듭니다. 첨부 파일은 submit_guide()가 작업에서 저장합니다."""
+    return {
+        "prompt": prompt, "response": response, "cause": cause, "attachment_path": None,
+        "counselor_name": counselor_name, "created_at": datetime.now().isoformat(),
+        "original_source": original_source,
+    }
+
+@metrics.timed("service.save_guides")
+def save_guides(guides):
+    """가이드들을 한 트랜잭션으로 추가합니다."""
+    return guide_store.add_guides(GUIDE_DB_PATH, guides)
+
+@metrics.timed("service.update_guide")
+def update_guide(guide_id, changes, expected_rev=None):
+    """가이드를 수정합니다. 그 사이 다른 세션이 먼저 저장했다면 fileio.VersionConflict."""
+    return guide_store.update_guide(GUIDE_DB_PATH, guide_id, changes, expected_rev=expected_rev)
+
+@metrics.timed("service.delete_guide")
+def delete_guide(guide_id):
+    return guide_store.delete_guide(GUIDE_DB_PATH, guide_id)
+
+@metrics.timed("service.find_duplicate_guides")
+def find_duplicate_guides(guide):
+    """저장하기 전에 guide와 거의 같은 기존 가이드 [(가이드, 유사도), ...]를 찾습니다."""
+    return guide_store.find_duplicates(GUIDE_DB_PATH, guide)
+
+@metrics.timed("service.merge_guide")
+def merge_guide(existing, guide):
+    """새 가이드를 따로 저장하지 않고 기존 가이드에 합칩니다 (답변/원인/첨부를 새 내용으로).
+
+    중복 확인 뒤 다른 세션이 기존 가이드를 먼저 고쳤다면 fileio.VersionConflict.
+    """
+    changes = {"response": guide["response"], "cause": guide.get("cause") or existing.get("cause")}
+    if guide.get("attachment_path"):
+        changes.update({key: value for key, value in guide.items() if key.startswith("attachment")})
+    return guide_store.update_guide(GUIDE_DB_PATH, existing["id"], changes, expected_rev=existing.get("rev"))
+
+def duplicate_guide_groups():
+    """저장소 전체의 중복 가이드 묶음 [[가이드, ...], ...]. 첫 가이드가 남길 가이드이고 나머지는 그와 중복입니다."""
+    return guide_store.find_duplicate_groups(GUIDE_DB_PATH)
+
+@metrics.timed("service.dedup_guides")
+def dedup_guides():
+    """중복 묶음마다 가장 최근 가이드만 남기고 지웁니다. 지운 수를 반환합니다."""
+    redundant = [g["id"] for group in duplicate_guide_groups() for g in group[1:]]
+    return guide_store.delete_guides(GUIDE_DB_PATH, redundant)
+
+def attachment_url(guide):
+    """nginx가 서비스하는 첨부 다운로드 URL. 쓸 수 없으면 None."""
+    return attachments.download_url(guide, ATTACHMENT_DIR)
+
+
+# --- 일괄 가져오기 / 내보내기 (bulk_io) ---
+@metrics.timed("service.import_records")
+def import_records(kind, source, filename, progress=None):
+    """kind("guides"|"histories") 파일을 묶음 단위로 가져옵니다. 형식은 filename의 확장자로 정합니다.
+
+    {"imported", "skipped", "error_count", "errors": [(행 번호, 이유), ...]} — 형식을 모르면 ValueError.
+    """
+    fmt = bulk_io.detect_format(filename)
+    if kind == "guides":
+        return bulk_io.import_guides(source, fmt, GUIDE_DB_PATH, progress=progress)
+    return bulk_io.import_histories(source, fmt, HISTORY_DIR, progress=progress)
+
+@metrics.timed("service.export_records")
+def export_records(kind, fmt):
+    """내보내기 파일을 EXPORT_DIR에 씁니다. 상담은 보관된 상담도 포함합니다.
+
+    {"kind", "format", "path", "count"}를 반환합니다. 레코드를 한 행씩 파일에 바로 쓰므로 내용 전체가
+    메모리에 올라오지 않습니다. 화면은 submit_export()로 맡기고 경로만 들고 있다가 다운로드할 때
+    파일을 읽고, 다 쓴 파일은 discard_export()로 지웁니다.
+    """
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    expired = time.time() - EXPORT_RETENTION_SECONDS
+    for entry in os.scandir(EXPORT_DIR):
+        if entry.stat().st_mtime < expired:
+            discard_export(entry.path)
+    fd, path = tempfile.mkstemp(dir=EXPORT_DIR, prefix=f"{kind}_", suffix=f".{fmt}")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            if kind == "guides":
+                count = bulk_io.export_guides(GUIDE_DB_PATH, out, fmt)
+            else:
+                working_set.flush_all()
+                count = bulk_io.export_histories(HISTORY_DIR, out, fmt)
+    except BaseException:
+        os.remove(path)
+        raise
+    return {"kind": kind, "format": fmt, "path": path, "count": count}
+
+def discard_export(path):
+    """export_records()로 만든 파일을 지웁니다 (이미 없으면 그대로)."""
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+
+
+# --- 백그라운드 작업 (jobs) ---
+# 화면은 submit_*()로 작업을 맡기고 get_jobs()로 진행 상황과 결과를 확인합니다.
+# 업로드 파일은 맡기기 전에 디스크에 받아 두고(spool), 작업에는 경로만 넘깁니다.
+def submit_guide(guide, uploaded_file=None, merge_into=None, owner=None):
+    """가이드 저장(첨부 포함)을 맡기고 작업 id를 반환합니다. merge_into(기존 가이드)가 있으면 거기에 합칩니다.
+
+    id는 여기서 정합니다. 작업이 다시 실행되어도 같은 가이드를 두 번 저장하지 않습니다.
+    """
+    payload = {"guide": dict(guide, id=guide.get("id") or guide_store.new_guide_id())}
+    if uploaded_file is not None:
+        payload["upload"] = attachments.spool_upload(uploaded_file, ATTACHMENT_DIR)
+    if merge_into is not None:
+        payload["merge_into"] = {"id": merge_into["id"], "rev": merge_into.get("rev")}
+    return jobs.enqueue(JOBS_DB_PATH, "save_guide", payload, owner=owner)
+
+def submit_guide_update(guide_id, changes, expected_rev=None, uploaded_file=None, owner=None):
+    """가이드 수정(첨부 교체 포함)을 맡기고 작업 id를 반환합니다."""
+    payload = {"guide_id": guide_id, "changes": changes, "expected_rev": expected_rev}
+    if uploaded_file is not None:
+        payload["upload"] = attachments.spool_upload(uploaded_file, ATTACHMENT_DIR)
+    return jobs.enqueue(JOBS_DB_PATH, "update_guide", payload, owner=owner)
+
+def submit_import(kind, uploaded_file, owner=None):
+    """일괄 가져오기를 맡기고 작업 id를 반환합니다. 형식을 모르면 맡기기 전에 ValueError."""
+    bulk_io.detect_format(uploaded_file.name)
+    path = fileio.spool(uploaded_file, JOB_SPOOL_DIR)
+    payload = {"kind": kind, "path": path, "filename": uploaded_file.name}
+    return jobs.enqueue(JOBS_DB_PATH, "import_records", payload, owner=owner)
+
+def submit_export(kind, fmt, owner=None):
+    """내보내기 파일 만들기를 맡기고 작업 id를 반환합니다. 결과는 export_records()와 같습니다."""
+    return jobs.enqueue(JOBS_DB_PATH, "export_records", {"kind": kind, "format": fmt}, owner=owner)
+
+def submit_maintenance(kind, owner=None, **payload):
+    """유지 보수 작업("dedup_guides", "archive_histories", "rebuild_indexes")을 맡깁니다.
+
+    같은 작업이 이미 대기/실행 중이면 새로 넣지 않고 그 작업 id를 반환합니다.
+    """
+    return jobs.enqueue(JOBS_DB_PATH, kind, payload, owner=owner, unique=True)
+
+def get_jobs(job_ids):
+    """작업 상태 목록 (id, kind, status, progress, message, result, error, error_type, ...)."""
+    return jobs.get_many(JOBS_DB_PATH, job_ids)
+
+def _save_spooled(payload):
+    """받아 둔 업로드를 첨부 저장소로 옮기고 첨부 필드를 반환합니다.
+
+    옮기기 전에 첨부 필드를 payload에 저장해 두므로(jobs.checkpoint), 다시 실행되면 그 값을 씁니다.
+    """
+    upload = payload.get("upload")
+    if not upload:
+        return {}
+    if "attachment" not in payload:
+        payload["attachment"] = attachments.spooled_fields(upload, ATTACHMENT_DIR)
+        jobs.checkpoint(payload)
+    return attachments.save_spooled(upload, payload["attachment"])
+
+def _already_applied(guide, fields):
+    """다시 실행된 작업에서, 앞선 실행이 이미 fields를 저장했는지 확인합니다."""
+    return guide is not None and all(guide.get(key) == value for key, value in fields.items())
+
+@jobs.handler("save_guide")
+def _save_guide_job(payload, progress):
+    progress(0.1, "첨부 파일 저장 중" if payload.get("upload") else "가이드 저장 중")
+    guide = dict(payload["guide"], **_save_spooled(payload))
+    target = payload.get("merge_into")
+    if target is None:
+        if guide_store.get_guide(GUIDE_DB_PATH, guide["id"]) is None:
+            save_guides([guide])
+        return {"guide_id": guide["id"]}
+    existing = guide_store.get_guide(GUIDE_DB_PATH, target["id"])
+    if existing is None:
+        raise LookupError("합칠 가이드가 삭제되었습니다.")
+    if existing.get("rev") != target["rev"] and _already_applied(existing, {"response": guide["response"]}):
+        return {"guide_id": target["id"], "merged": True}
+    merge_guide(dict(existing, rev=target["rev"]), guide)
+    return {"guide_id": target["id"], "merged": True}
+
+@jobs.handler("update_guide")
+def _update_guide_job(payload, progress):
+    progress(0.1, "첨부 파일 저장 중" if payload.get("upload") else "가이드 저장 중")
+    changes = dict(payload["changes"], **_save_spooled(payload))
+    current = guide_store.get_guide(GUIDE_DB_PATH, payload["guide_id"])
+    if current is None:
+        raise LookupError("가이드가 삭제되었습니다.")
+    if current.get("rev") != payload["expected_rev"] and _already_applied(current, changes):
+        return {"guide_id": current["id"]}
+    guide = update_guide(payload["guide_id"], changes, expected_rev=payload["expected_rev"])
+    if guide is None:
+        raise LookupError("가이드가 삭제되었습니다.")
+    return {"guide_id": guide["id"]}
+
+@jobs.handler("import_records")
+def _import_records_job(payload, progress):
+    try:
+        size = max(os.path.getsize(payload["path"]), 1)
+        with open(payload["path"], "rb") as f:
+            def report(result):
+                progress(
+                    f.tell() / size,
+                    f"기록 {result['imported']:,}건 · 건너뜀 {result['skipped']:,}건 · 오류 {result['error_count']:,}건",
+                )
+            return import_records(payload["kind"], f, payload["filename"], progress=report)
+    finally:
+        os.remove(payload["path"])
+
+@jobs.handler("export_records")
+def _export_records_job(payload, progress):
+    progress(0.1, f"{'가이드' if payload['kind'] == 'guides' else '상담'} 내보내는 중")
+    return export_records(payload["kind"], payload["format"])
+
+@jobs.handler("dedup_guides")
+def _dedup_guides_job(payload, progress):
+    progress(0.1, "중복 가이드 찾는 중")
+    return {"deleted": dedup_guides()}
+
+@jobs.handler("archive_histories")
+def _archive_histories_job(payload, progress):
+    progress(0.1, "보관할 상담 찾는 중")
+    return {"archived": archive_histories(payload.get("max_age_days", history_archive.DEFAULT_MAX_AGE_DAYS))}
+
+@jobs.handler("rebuild_indexes")
+def _rebuild_indexes_job(payload, progress):
+    def report(step_no, name):
+        progress(step_no / 3, f"{name} 색인 만드는 중")
+    return rebuild_indexes(progress=report)
+
+# --- 통계 ---
+@metrics.timed("service.report")
+def report(date_from=None, date_to=None):
+    """통계 화면에 필요한 집계를 한 번에 반환합니다. 날짜는 'YYYY-MM-DD' 문자열입니다.
+
+    {"totals", "counselors", "daily", "messages", "causes"} — totals는 숫자 dict, 나머지는 DataFrame/Series.
+    보관된 상담도 포함합니다.
+    """
+    key = (
+        history_index.generation(HISTORY_DIR), history_archive.version(HISTORY_DIR),
+        guide_store.get_version(GUIDE_DB_PATH), date_from, date_to,
+    )
+
+    def compute():
+        import analytics # pandas는 통계 화면에서만 쓰므로 처음 집계할 때 불러옵니다.
+        histories = analytics.filter_histories(analytics.consultation_snapshot(HISTORY_DIR), date_from, date_to)
+        causes = analytics.cause_distribution(analytics.guide_snapshot(GUIDE_DB_PATH), date_from, date_to)
+        return {
+            "totals": {
+                "consultations": len(histories),
+                "counselors": histories["counselor"].nunique(),
+                "messages": int(histories["message_count"].sum()),
+                "mean_duration_min": histories["duration_min"].mean(),
+                "guides": int(causes["가이드 수"].sum()),
+            },
+            "counselors": analytics.counselor_summary(histories),
+            "daily": analytics.daily_counts(histories),
+            "messages": analytics.message_histogram(histories),
+            "causes": causes,
+        }
+
+    return _reports.get_or_compute(key, compute)
@@ -0,0 +1,36 @@
+"""SQLite 연결 헬퍼 (가이드 저장소, 응답 캐시 등 공용)."""
+import sqlite3
+import threading
+
+_local = threading.local()
+
+
+def connect(db_path):
+    """스레드(=Streamlit 세션 스크립트 스레드)마다 WAL 모드 연결 하나를 재사용합니다."""
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        connections[db_path] = conn
+    return conn
+
+
+class transaction:
+    """BEGIN IMMEDIATE ~ COMMIT. 쓰기 트랜잭션끼리는 DB 잠금으로 직렬화됩니다."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
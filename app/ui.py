@@ -0,0 +1,107 @@
+"""Streamlit 화면(app.py, pages/guide.py)이 함께 쓰는 화면 조각 (작업 진행률, 중복 가이드 확인).
+
+service처럼 업무 로직을 두지 않고, 두 화면에서 같은 모양으로 그리는 부분만 모아 둡니다.
+상태는 각 화면과 마찬가지로 st.session_state에 두며, 화면 시작 부분에서 init_state()를 부릅니다.
+"""
+import streamlit as st
+
+import service
+
+# --- 상수 정의 ---
+JOB_POLL_SECONDS = 1 # 맡긴 작업의 진행 상황을 다시 확인하는 간격
+
+
+def init_state():
+    if 'jobs' not in st.session_state:
+        st.session_state.jobs = [] # 이 세션이 맡긴 백그라운드 작업 [(작업 id, 표시 이름), ...]
+    if 'job_notices' not in st.session_state:
+        st.session_state.job_notices = [] # 끝난 작업 [(표시 이름, 작업), ...]. 다음 실행에 한 번 보여줍니다.
+
+
+# --- 백그라운드 작업 (service.submit_*) ---
+def watch_job(job_id, label):
+    st.session_state.jobs.append((job_id, label))
+
+def job_error_message(job):
+    if job["error_type"] == "VersionConflict":
+        return "그 사이 다른 곳에서 가이드가 수정되었습니다. 최신 내용을 확인한 뒤 다시 저장해주세요."
+    return job["error"]
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def _poll_jobs():
+    """맡긴 작업의 진행 상황. 이 부분만 주기적으로 다시 그리고, 작업이 끝나면 화면 전체를 다시 그립니다."""
+    labels = dict(st.session_state.jobs)
+    running = {}
+    for job in service.get_jobs(labels):
+        if job["status"] in ("queued", "running"):
+            running[job["id"]] = labels[job["id"]]
+            st.progress(job["progress"], text=f"⏳ {labels[job['id']]}: {job['message'] or '대기 중'}")
+        else:
+            st.session_state.job_notices.append((labels[job["id"]], job))
+    if len(running) < len(labels):
+        st.session_state.jobs = list(running.items())
+        st.rerun(scope="app")
+
+def show_job_result(job):
+    """작업 종류별 결과 요약."""
+    result = job["result"] or {}
+    if job["kind"] == "import_records":
+        st.success(f"{result['imported']:,}건을 가져왔습니다. (이미 있어 건너뜀 {result['skipped']:,}건)")
+        if result["error_count"]:
+            st.warning(f"잘못된 행 {result['error_count']:,}건은 건너뛰었습니다.")
+            st.dataframe(
+                [{"행": row_no, "이유": message} for row_no, message in result["errors"]],
+                use_container_width=True, hide_index=True,
+            )
+    elif job["kind"] == "export_records":
+        st.success(f"내보내기 파일을 만들었습니다 ({result['count']:,}건). '일괄 가져오기 / 내보내기'에서 받으세요.")
+    elif job["kind"] == "dedup_guides":
+        st.success(f"중복 가이드 {result['deleted']:,}건을 지웠습니다.")
+    elif job["kind"] == "update_guide":
+        st.success("가이드가 성공적으로 수정되었습니다.")
+    elif result.get("merged"):
+        st.success("기존 가이드에 합쳤습니다.")
+    else:
+        st.success("새 가이드가 성공적으로 추가되었습니다.")
+
+def show_jobs():
+    """끝난 작업의 결과를 한 번 보여주고, 진행 중인 작업이 있으면 진행률을 주기적으로 그립니다."""
+    for label, job in st.session_state.job_notices:
+        if job["status"] == "done":
+            show_job_result(job)
+        else:
+            st.error(f"❌ {label} 실패: {job_error_message(job)}")
+    st.session_state.job_notices = []
+    if st.session_state.jobs: # 맡긴 작업이 없으면 주기적으로 다시 그리지 않습니다.
+        _poll_jobs()
+
+
+# --- 중복 가이드 확인 (service.find_duplicate_guides) ---
+def resolve_duplicate_guide(on_done, uploaded_file=None):
+    """저장하려던 가이드와 거의 같은 가이드가 있을 때 합칠지, 그래도 새로 저장할지 고르게 합니다.
+
+    st.session_state.pending_guide = (저장하려던 가이드, 비슷한 기존 가이드 목록)을 씁니다.
+    합치기/저장을 맡긴 뒤에는 on_done()(편집 창 닫기)을 부릅니다.
+    """
+    guide, duplicates = st.session_state.pending_guide
+    st.warning(f"비슷한 가이드가 이미 {len(duplicates)}건 있습니다. 기존 가이드에 합치거나 새 가이드로 저장하세요.")
+    choice = st.radio(
+        "합칠 가이드", options=range(len(duplicates)), key="duplicate_choice",
+        format_func=lambda i: f"[{duplicates[i][1]:.0%}] {duplicates[i][0]['prompt'][:60]}",
+    )
+    existing = duplicates[choice][0]
+    with st.expander("기존 가이드 답변 보기"):
+        st.write(existing["response"])
+    dup_cols = st.columns(3)
+    if dup_cols[0].button("🔀 기존 가이드에 합치기", key="merge_duplicate", use_container_width=True, type="primary"):
+        job_id = service.submit_guide(
+            guide, uploaded_file, merge_into=existing, owner=st.session_state.metrics_session,
+        )
+        watch_job(job_id, "기존 가이드에 합치기")
+        on_done()
+    if dup_cols[1].button("➕ 새 가이드로 저장", key="save_duplicate", use_container_width=True):
+        watch_job(service.submit_guide(guide, uploaded_file, owner=st.session_state.metrics_session), "가이드 저장")
+        on_done()
+    if dup_cols[2].button("↩️ 다시 수정", key="cancel_duplicate", use_container_width=True):
+        st.session_state.pending_guide = None
+        st.rerun()
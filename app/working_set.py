@@ -0,0 +1,171 @@
+"""열려 있는 상담의 메모리 작업 사본 (write-back 캐시).
+
+상담 화면은 rerun마다 현재 상담의 메타데이터와 최근 메시지를 다시 그립니다. 이 모듈은 상담 파일별로
+- 마지막으로 확인한 메타데이터와 확인 시각 (REVALIDATE_INTERVAL 안에서는 stat도 다시 하지 않습니다)
+- 아직 파일에 쓰지 않은 메시지(pending)
+를 프로세스 메모리에 두고, 같은 상담을 보는 세션과 화면 영역(사이드바, 대화)이 함께 씁니다.
+
+새 메시지는 pending에 쌓였다가 다음 중 먼저 오는 때에 한 번의 append로 파일에 기록됩니다.
+- 마지막 추가 뒤 FLUSH_DELAY초 동안 추가가 없을 때 (디바운스, 백그라운드 타이머)
+- pending이 FLUSH_BATCH개 이상이거나 가장 오래된 것이 MAX_PENDING_AGE초를 넘었을 때
+- flush()를 직접 호출할 때 (저장 버튼, 다른 상담으로 이동, 가이드 초안 만들기, 프로세스 종료)
+
+pending 메시지는 이 프로세스에만 있으므로, 다른 레플리카에는 파일에 기록된 뒤에 보입니다.
+기록하기 전에 다른 레플리카가 상담을 보관/삭제했다면 파일을 다시 만들지 않고 pending에 남겨 둡니다.
+프로세스가 비정상 종료되면 마지막 FLUSH_DELAY초 정도의 메시지를 잃을 수 있습니다.
+"""
+import atexit
+import contextlib
+import os
+import threading
+import time
+
+import metrics
+
+# --- 상수 정의 ---
+FLUSH_DELAY = float(os.environ.get("HISTORY_FLUSH_DELAY", "2.0")) # 0이면 추가할 때마다 바로 씁니다
+FLUSH_BATCH = 20 # pending이 이만큼 쌓이면 바로 씁니다
+MAX_PENDING_AGE = 10.0 # 계속 추가되어도 이 시간(초) 안에는 씁니다
+REVALIDATE_INTERVAL = 1.0 # 메타데이터를 다시 확인(stat)하지 않고 쓰는 시간(초)
+MAX_ENTRIES = 256 # 보관하는 상담 수 (pending이 없는 오래된 것부터 정리)
+
+_lock = threading.Lock()
+_entries = {}  # 상담 경로 -> ActiveHistory (최근 사용 순)
+
+
+class ActiveHistory:
+    """상담 하나의 작업 사본. 읽고 쓸 때는 `with working_set.locked(경로) as active:`로 잠급니다.
+
+    flush()가 파일에 쓰는 동안에도 잠겨 있으므로, 잠근 채로 읽은 파일 내용과 pending은
+    서로 겹치거나 빠지지 않습니다.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.lock = threading.RLock()
+        self.pending = []
+        self.writer = None # writer(경로, 메시지 목록): pending을 파일에 기록하는 함수
+        self.first_pending_at = None
+        self.timer = None
+        self._meta = None
+        self._checked_at = None
+
+    def meta(self, load):
+        """마지막으로 확인한 메타데이터. REVALIDATE_INTERVAL이 지났거나 무효화됐으면 load()로 다시 읽습니다."""
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= REVALIDATE_INTERVAL:
+            self._meta = load()
+            self._checked_at = now
+            metrics.count("working_set.revalidations")
+        return self._meta
+
+    def invalidate(self):
+        """이 프로세스에서 파일을 고쳤을 때 호출합니다. 다음 meta()가 다시 읽습니다."""
+        self._checked_at = None
+
+    def add(self, messages, writer):
+        """메시지를 pending에 더하고 flush 시점을 정합니다."""
+        self.writer = writer
+        if not self.pending:
+            self.first_pending_at = time.monotonic()
+        self.pending.extend(messages)
+        metrics.count("working_set.buffered_messages", len(messages))
+        if (
+            FLUSH_DELAY <= 0 or len(self.pending) >= FLUSH_BATCH
+            or time.monotonic() - self.first_pending_at >= MAX_PENDING_AGE
+        ):
+            self._flush_quietly() # 실패해도 메시지는 pending에 남아 다시 시도됩니다.
+        else:
+            self._schedule(FLUSH_DELAY)
+
+    @metrics.timed("working_set.flush")
+    def flush(self):
+        """pending을 한 번에 기록합니다. 실패하면 pending을 그대로 두고 잠시 뒤 다시 시도합니다."""
+        with self.lock:
+            self._cancel_timer()
+            if not self.pending:
+                return 0
+            batch = list(self.pending)
+            try:
+                self.writer(self.filepath, batch)
+            except FileNotFoundError:
+                # 다른 레플리카가 상담을 보관/삭제했습니다. 다시 시도해도 소용없으므로 예약하지 않고
+                # 메시지는 pending에 남겨 둡니다 (화면이 알립니다).
+                metrics.count("working_set.flush_missing")
+                raise
+            except Exception:
+                metrics.count("working_set.flush_errors")
+                self._schedule(max(FLUSH_DELAY, 1.0))
+                raise
+            self.pending.clear()
+            self.first_pending_at = None
+            self.invalidate()
+            metrics.count("working_set.flushes")
+            metrics.count("working_set.flushed_messages", len(batch))
+            return len(batch)
+
+    def _schedule(self, delay):
+        self._cancel_timer()
+        self.timer = threading.Timer(delay, self._flush_quietly)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _cancel_timer(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def _flush_quietly(self):
+        # 타이머 스레드와 add()에서는 예외를 화면에 올리지 않습니다. 실패하면 flush()가 다시 예약합니다.
+        try:
+            self.flush()
+        except Exception:
+            pass
+
+
+def _get(filepath):
+    with _lock:
+        active = _entries.pop(filepath, None) or ActiveHistory(filepath)
+        _entries[filepath] = active
+        if len(_entries) > MAX_ENTRIES:
+            for old_path in [path for path, old in _entries.items() if not old.pending][:len(_entries) - MAX_ENTRIES]:
+                del _entries[old_path]
+        return active
+
+@contextlib.contextmanager
+def locked(filepath):
+    """상담의 작업 사본을 잠근 채로 돌려줍니다."""
+    active = _get(filepath)
+    with active.lock:
+        yield active
+
+def add(filepath, messages, writer):
+    with locked(filepath) as active:
+        active.add(messages, writer)
+
+def invalidate(filepath):
+    with locked(filepath) as active:
+        active.invalidate()
+
+def pending_count(filepath):
+    with _lock:
+        active = _entries.get(filepath)
+    return len(active.pending) if active is not None else 0
+
+def flush(filepath):
+    """상담 하나의 pending을 지금 기록하고 기록한 메시지 수를 반환합니다."""
+    with _lock:
+        active = _entries.get(filepath)
+    return active.flush() if active is not None else 0
+
+def flush_all():
+    """모든 상담의 pending을 기록합니다. 프로세스가 정상 종료될 때 자동으로 호출됩니다."""
+    with _lock:
+        actives = list(_entries.values())
+    for active in actives:
+        try:
+            active.flush()
+        except Exception:
+            pass # 나머지 상담은 계속 기록합니다.
+
+atexit.register(flush_all)
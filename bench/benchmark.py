@@ -0,0 +1,306 @@
+"""상담/가이드 화면 벤치마크.
+
+현재 저장 형식(`history*.json` 상담 파일, `guide.json` 가이드 목록)으로 한국어 합성 데이터를
+만들고, `streamlit.testing.v1.AppTest`로 app.py / pages/guide.py를 화면 없이 실행하면서
+핵심 동작의 소요 시간을 잽니다.
+
+- cold_start      : 첫 실행 (guide.json 마이그레이션, 상담 인덱스 생성 포함)
+- sidebar_list    : 변경 없는 다시 그리기 (사이드바 목록)
+- load_history    : 사이드바에서 다른 상담 열기
+- append_message  : 질문 전송 (답변 스트리밍 + 저장)
+- save_guide      : 대화에서 가이드 저장 요청 (작업을 맡기고 화면이 돌아올 때까지)
+- save_guide_done : 가이드 저장 요청부터 백그라운드 작업이 끝날 때까지
+- search_guides   : 가이드 화면 검색
+- delete_guide    : 가이드 삭제
+- report          : 통계 화면 (첫 실행은 스냅숏 생성, 이후 기간을 바꿔 가며 집계)
+
+사용법 (저장소 최상위에서):
+    python bench/benchmark.py --sizes 1000,10000 --output bench-results.json
+    python bench/benchmark.py --sizes 1000 --compare bench-results.json
+
+크기 N은 상담 파일 N개와 가이드 N개입니다. 생성한 원본 데이터는 --data-dir에 보관해 다시
+쓰고, 실행할 때마다 임시 폴더로 복사해 사용합니다. 10⁵ 이상은 생성/복사에 시간이 걸립니다.
+앱 모듈의 프로세스 캐시가 섞이지 않도록 크기마다 별도 프로세스에서 측정합니다.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# --- 상수 정의 ---
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(REPO_ROOT, "app")
+DEFAULT_DATA_DIR = os.path.join(REPO_ROOT, "bench", ".data")
+DEFAULT_SIZES = "1000,10000"
+MESSAGES_PER_HISTORY = 6
+RUN_TIMEOUT = 600 # AppTest 한 번 실행의 제한 시간(초). 큰 데이터의 첫 실행을 고려합니다.
+JOB_POLL_SECONDS = 0.01 # 백그라운드 작업이 끝났는지 다시 확인하는 간격
+
+COUNSELORS = ["김민준", "이서연", "박서준", "최지우", "정하준", "강지민", "조예린", "윤도윤"]
+CAUSES = ["단순 문의", "기능 사용법 문의", "오류/버그 리포트", "계정/인증 문제", "정책/규정 문의", "개선 제안", "기타"]
+TOPICS = ["로그인", "비밀번호 재설정", "결제 수단 변경", "환불 절차", "배송 조회", "회원 탈퇴", "알림 설정",
+          "쿠폰 적용", "주문 취소", "영수증 발급", "앱 업데이트", "계정 잠금", "주소 변경", "포인트 적립"]
+SYMPTOMS = ["화면이 멈춥니다", "오류 메시지가 나옵니다", "버튼이 눌리지 않습니다", "처리가 너무 느립니다",
+            "결과가 다르게 나옵니다", "인증 문자가 오지 않습니다", "페이지가 열리지 않습니다"]
+ANSWERS = ["설정 메뉴에서 {topic} 항목을 선택한 뒤 안내에 따라 진행해 주세요.",
+           "{topic} 관련 문제는 앱을 최신 버전으로 업데이트한 뒤 다시 시도해 주세요.",
+           "고객센터 운영 시간에 {topic} 요청을 접수해 주시면 영업일 기준 1~2일 내에 처리됩니다.",
+           "브라우저 캐시를 삭제하고 다시 로그인하면 {topic} 문제가 대부분 해결됩니다.",
+           "{topic}은(는) 마이페이지 > 계정 관리에서 직접 변경하실 수 있습니다."]
+
+
+# --- 합성 데이터 ---
+def _question(rng):
+    topic = rng.choice(TOPICS)
+    return topic, f"{topic} 하려고 하는데 {rng.choice(SYMPTOMS)}. 어떻게 해야 하나요?"
+
+def _answer(rng, topic):
+    return " ".join(rng.choice(ANSWERS).format(topic=topic) for _ in range(rng.randint(1, 3)))
+
+def generate_archive(root, size, seed=0, messages_per_history=MESSAGES_PER_HISTORY):
+    """root/history에 상담 size개, root/guide/guide.json에 가이드 size개를 만듭니다."""
+    rng = random.Random(seed)
+    history_dir = os.path.join(root, "history")
+    guide_dir = os.path.join(root, "guide")
+    os.makedirs(history_dir, exist_ok=True)
+    os.makedirs(os.path.join(guide_dir, "attachments"), exist_ok=True)
+    started = datetime(2024, 1, 1, 9, 0, 0)
+    for i in range(size):
+        start_time = started + timedelta(minutes=7 * i)
+        messages = []
+        for _ in range(messages_per_history // 2):
+            topic, question = _question(rng)
+            messages.append({"role": "user", "content": question})
+            messages.append({"role": "assistant", "content": _answer(rng, topic), "source": "https://docs.streamlit.io"})
+        data = {
+            "title": f"{rng.choice(TOPICS)} 문의 #{i}", "summary": "이곳에 상담 요약을 작성하세요.",
+            "counselor_name": rng.choice(COUNSELORS), "start_time": start_time.isoformat(),
+            "end_time": (start_time + timedelta(minutes=5)).isoformat(), "messages": messages,
+        }
+        # 실제 파일처럼 시작 시각으로 이름을 짓습니다 (7분 간격이라 겹치지 않습니다).
+        path = os.path.join(history_dir, f"history{start_time:%Y%m%d_%H%M%S}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    guides = []
+    for i in range(size):
+        topic, question = _question(rng)
+        guides.append({
+            "prompt": question, "response": _answer(rng, topic), "cause": rng.choice(CAUSES),
+            "attachment_path": None, "counselor_name": rng.choice(COUNSELORS),
+            "created_at": (started + timedelta(minutes=3 * i)).isoformat(), "original_source": "합성 데이터",
+        })
+    with open(os.path.join(guide_dir, "guide.json"), "w", encoding="utf-8") as f:
+        json.dump(guides, f, ensure_ascii=False, indent=2)
+
+def prepare_workdir(data_dir, size, seed):
+    """원본 데이터(없으면 생성)를 앱 소스와 함께 임시 폴더에 복사하고 그 경로를 반환합니다."""
+    pristine = os.path.join(data_dir, f"n{size}-s{seed}")
+    if not os.path.exists(os.path.join(pristine, "guide", "guide.json")):
+        shutil.rmtree(pristine, ignore_errors=True)
+        print(f"[생성] 상담/가이드 {size}건 -> {pristine}", flush=True)
+        generate_archive(pristine, size, seed=seed)
+    workdir = tempfile.mkdtemp(prefix=f"bench-n{size}-")
+    shutil.copytree(APP_DIR, workdir, dirs_exist_ok=True,
+                    ignore=shutil.ignore_patterns("history", "guide", "__pycache__", "app copy.py"))
+    shutil.copytree(os.path.join(pristine, "history"), os.path.join(workdir, "history"))
+    shutil.copytree(os.path.join(pristine, "guide"), os.path.join(workdir, "guide"))
+    return workdir
+
+
+# --- 측정 ---
+def _timed_run(at):
+    started = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - started
+    if at.exception:
+        raise RuntimeError(f"앱 실행 중 예외: {at.exception[0].value}")
+    return elapsed
+
+def _recent_jobs():
+    """앱이 맡긴 최근 작업 목록. AppTest는 같은 프로세스에서 앱을 실행하므로 앱이 쓰는 모듈을 그대로 씁니다."""
+    jobs, service = sys.modules["jobs"], sys.modules["service"]
+    return jobs.list_jobs(service.JOBS_DB_PATH)
+
+def _wait_job(job_id, started):
+    """작업이 끝날 때까지 jobs.get으로 확인하고, started부터 걸린 시간을 반환합니다."""
+    jobs, service = sys.modules["jobs"], sys.modules["service"]
+    deadline = started + RUN_TIMEOUT
+    while True:
+        job = jobs.get(service.JOBS_DB_PATH, job_id)
+        if job["status"] not in ("queued", "running"):
+            break
+        if time.perf_counter() > deadline:
+            raise RuntimeError(f"작업이 제한 시간 안에 끝나지 않았습니다: {job['kind']} {job_id}")
+        time.sleep(JOB_POLL_SECONDS)
+    elapsed = time.perf_counter() - started
+    if job["status"] != "done":
+        raise RuntimeError(f"작업 실패: {job['kind']} {job['error']}")
+    return elapsed
+
+def _button(widgets, label=None, key=None):
+    for widget in widgets:
+        if (label is None or widget.label == label) and (key is None or widget.key == key):
+            return widget
+    raise LookupError(f"버튼을 찾을 수 없습니다: {label or key}")
+
+def run_operations(workdir, repeat):
+    """workdir에서 앱을 실행하며 동작별 소요 시간 목록을 반환합니다."""
+    from streamlit.testing.v1 import AppTest
+
+    os.chdir(workdir)
+    timings = {}
+    record = lambda op, seconds: timings.setdefault(op, []).append(seconds)
+
+    at = AppTest.from_file(os.path.join(workdir, "app.py"), default_timeout=RUN_TIMEOUT)
+    record("cold_start", _timed_run(at))
+
+    for _ in range(repeat):
+        record("sidebar_list", _timed_run(at))
+
+    for i in range(repeat):
+        targets = [b for b in at.sidebar.button if "(담당:" in b.label and not b.disabled]
+        targets[i % len(targets)].click()
+        record("load_history", _timed_run(at))
+
+    for i in range(repeat):
+        question = f"벤치마크 질문 {i}: 결제 수단 변경이 안 됩니다"
+        _button(at.text_input, label="질문").input(question)
+        _button(at.button, label="전송").click()
+        record("append_message", _timed_run(at))
+
+    for _ in range(repeat):
+        _button(at.button, label="가이드에 추가").click()
+        at.run()
+        _button(at.selectbox, label="원인 분류").select("단순 문의")
+        known = {job["id"] for job in _recent_jobs()}
+        _button(at.button, label="💾 가이드 저장").click()
+        started = time.perf_counter()
+        elapsed = _timed_run(at)
+        if at.session_state.pending_guide: # 같은 대화를 반복 저장하므로 중복 확인이 뜨면 새 가이드로 저장
+            _button(at.button, key="save_duplicate").click()
+            elapsed += _timed_run(at)
+        record("save_guide", elapsed)
+        # 작업이 그 실행 안에 끝나면 화면 상태에서 빠지므로 작업 목록에서 방금 맡긴 작업을 찾습니다.
+        job_id = next(job["id"] for job in _recent_jobs() if job["id"] not in known and job["kind"] == "save_guide")
+        record("save_guide_done", _wait_job(job_id, started))
+
+    at.switch_page("pages/guide.py")
+    at.run()
+    for i in range(repeat):
+        _button(at.text_input, label="가이드 검색").input(f"{TOPICS[i % len(TOPICS)]} 오류")
+        record("search_guides", _timed_run(at))
+
+    _button(at.text_input, label="가이드 검색").input("")
+    at.run()
+    for _ in range(repeat):
+        delete = next(b for b in at.button if (b.key or "").startswith("delete_"))
+        delete.click()
+        record("delete_guide", _timed_run(at))
+
+    at.switch_page("pages/report.py")
+    record("report", _timed_run(at))
+    period_start = datetime(2024, 1, 1) # generate_archive의 상담 시작일
+    for i in range(repeat):
+        period = (period_start + timedelta(days=7 * i)).date()
+        at.date_input[0].set_value((period, period + timedelta(days=30)))
+        record("report", _timed_run(at))
+    return timings
+
+def summarize(size, timings):
+    rows = []
+    for op, runs in timings.items():
+        rows.append({
+            "size": size, "operation": op, "runs": [round(r, 4) for r in runs],
+            "median_s": round(statistics.median(runs), 4), "min_s": round(min(runs), 4), "max_s": round(max(runs), 4),
+        })
+    return rows
+
+
+# --- 결과 ---
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _metadata(args):
+    import streamlit
+    return {
+        "commit": _git_commit(), "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(), "streamlit": streamlit.__version__,
+        "platform": platform.platform(), "repeat": args.repeat, "seed": args.seed,
+    }
+
+def print_results(rows, baseline=None):
+    base = {(r["size"], r["operation"]): r["median_s"] for r in (baseline or {}).get("results", [])}
+    print(f"{'size':>9}  {'operation':<16}{'median_s':>10}{'min_s':>10}{'max_s':>10}" + ("   vs base" if base else ""))
+    for row in rows:
+        line = f"{row['size']:>9}  {row['operation']:<16}{row['median_s']:>10.4f}{row['min_s']:>10.4f}{row['max_s']:>10.4f}"
+        previous = base.get((row["size"], row["operation"]))
+        if previous:
+            line += f"   {row['median_s'] / previous:>6.2f}x"
+        print(line)
+
+
+# --- CLI ---
+def _measure_in_subprocess(workdir, repeat):
+    env = dict(os.environ)
+    # 네트워크/지연 없는 예시 답변으로 화면 처리 시간만 잽니다.
+    env.setdefault("CHATBOT_PROVIDER", "fake")
+    env.setdefault("CHATBOT_FAKE_DELAY", "0")
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", workdir, "--repeat", str(repeat)],
+        env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"측정 실패 ({workdir}):\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="쉼표로 구분한 데이터 크기 (예: 1000,10000,100000,1000000)")
+    parser.add_argument("--repeat", type=int, default=5, help="동작별 반복 횟수")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="생성한 원본 데이터를 보관할 폴더")
+    parser.add_argument("--output", help="결과 JSON 파일")
+    parser.add_argument("--compare", help="비교할 이전 결과 JSON 파일")
+    parser.add_argument("--keep", action="store_true", help="실행에 쓴 임시 폴더를 지우지 않습니다")
+    parser.add_argument("--worker", help=argparse.SUPPRESS) # 내부용: 이 폴더에서 측정하고 JSON 출력
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_operations(args.worker, args.repeat)))
+        return 0
+
+    rows = []
+    for size in [int(s) for s in args.sizes.split(",")]:
+        workdir = prepare_workdir(args.data_dir, size, args.seed)
+        try:
+            print(f"[측정] 크기 {size}", flush=True)
+            rows.extend(summarize(size, _measure_in_subprocess(workdir, args.repeat)))
+        finally:
+            if not args.keep:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(rows, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"meta": _metadata(args), "results": rows}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
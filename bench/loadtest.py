@@ -0,0 +1,200 @@
+"""nginx + Streamlit 레플리카 부하 테스트.
+
+가상 상담원마다 브라우저처럼 첫 페이지를 받아 고정 라우팅 쿠키(st_affinity)를 얻고,
+같은 쿠키로 Streamlit 웹소켓(`/_stcore/stream`)을 열어 화면 다시 그리기(rerun)를 반복합니다.
+rerun 한 번은 요청을 보내고 script_finished를 받을 때까지입니다.
+
+사용법:
+    # 이미 떠 있는 배포에 부하를 겁니다.
+    python bench/loadtest.py --url http://localhost --users 30 --duration 30
+
+    # docker compose로 레플리카 수를 바꿔 가며 처리량을 비교합니다 (저장소 최상위에서 실행).
+    python bench/loadtest.py --url http://localhost --users 30 --scale 1,2,4
+
+결과는 표로 출력하고, --output을 주면 JSON으로도 저장합니다.
+필요 패키지: streamlit(프로토콜 정의), websockets
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+# --- 상수 정의 ---
+AFFINITY_COOKIE = "st_affinity"
+STREAM_PATH = "/_stcore/stream"
+HEALTH_PATH = "/_stcore/health"
+RERUN_TIMEOUT = 60.0
+
+
+# --- 가상 사용자 ---
+def _open_session(base_url):
+    """첫 페이지를 받아 (Cookie 헤더, 응답한 upstream)을 반환합니다."""
+    with urllib.request.urlopen(base_url, timeout=10) as response:
+        cookie = SimpleCookie()
+        for header in response.headers.get_all("Set-Cookie") or []:
+            cookie.load(header)
+        upstream = response.headers.get("X-Upstream")
+    cookie_header = "; ".join(f"{name}={morsel.value}" for name, morsel in cookie.items())
+    return cookie_header, upstream
+
+def _stream_url(base_url):
+    parts = urlsplit(base_url)
+    scheme = "wss" if parts.scheme == "https" else "ws"
+    return f"{scheme}://{parts.netloc}{STREAM_PATH}"
+
+def _rerun_message():
+    message = BackMsg()
+    message.rerun_script.query_string = ""
+    message.rerun_script.page_script_hash = ""
+    return message.SerializeToString()
+
+async def _connect(url, cookie_header):
+    headers = {"Cookie": cookie_header} if cookie_header else {}
+    try:
+        return await websockets.connect(url, subprotocols=["streamlit"], max_size=None, additional_headers=headers)
+    except TypeError: # websockets < 14
+        return await websockets.connect(url, subprotocols=["streamlit"], max_size=None, extra_headers=headers)
+
+def _response_header(ws, name):
+    response = getattr(ws, "response", None)
+    headers = response.headers if response is not None else getattr(ws, "response_headers", {})
+    return headers.get(name)
+
+async def _rerun(ws, payload):
+    await ws.send(payload)
+    while True:
+        message = ForwardMsg()
+        message.ParseFromString(await ws.recv())
+        if message.WhichOneof("type") == "script_finished":
+            return
+
+async def _virtual_user(base_url, deadline, result):
+    cookie_header, page_upstream = await asyncio.to_thread(_open_session, base_url)
+    ws = await _connect(_stream_url(base_url), cookie_header)
+    try:
+        stream_upstream = _response_header(ws, "X-Upstream")
+        result["upstreams"].append(stream_upstream)
+        if page_upstream and stream_upstream and page_upstream != stream_upstream:
+            result["sticky_violations"] += 1
+        payload = _rerun_message()
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(_rerun(ws, payload), RERUN_TIMEOUT)
+            except (asyncio.TimeoutError, websockets.ConnectionClosed):
+                result["errors"] += 1
+                break
+            result["latencies"].append(time.perf_counter() - started)
+    finally:
+        await ws.close()
+
+async def run_load(base_url, users, duration, ramp_up=2.0):
+    """users명이 duration초 동안 rerun을 반복하고 처리량/지연 시간을 요약합니다."""
+    result = {"latencies": [], "errors": 0, "sticky_violations": 0, "upstreams": []}
+    started = time.monotonic()
+    deadline = started + ramp_up + duration
+    tasks = []
+    for i in range(users):
+        tasks.append(asyncio.create_task(_virtual_user(base_url, deadline, result)))
+        await asyncio.sleep(ramp_up / max(users, 1))
+    outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+    result["errors"] += sum(1 for outcome in outcomes if isinstance(outcome, Exception))
+    elapsed = time.monotonic() - started
+    return summarize(result, users, elapsed)
+
+def summarize(result, users, elapsed):
+    latencies = sorted(result["latencies"])
+
+    def percentile(p):
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+    return {
+        "users": users,
+        "elapsed_s": round(elapsed, 2),
+        "reruns": len(latencies),
+        "reruns_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(0.50) * 1000, 1) if latencies else None,
+        "p95_ms": round(percentile(0.95) * 1000, 1) if latencies else None,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 1) if latencies else None,
+        "errors": result["errors"],
+        "sticky_violations": result["sticky_violations"],
+        "replicas_seen": len({u for u in result["upstreams"] if u}),
+    }
+
+
+# --- docker compose 레플리카 조정 ---
+def scale_replicas(replicas, compose_file):
+    subprocess.run(
+        ["docker", "compose", "-f", compose_file, "up", "-d", "--no-recreate",
+         "--scale", f"streamlit-app={replicas}"],
+        check=True,
+    )
+    # nginx는 시작할 때 서비스 이름을 해석하므로 레플리카 수를 바꾸면 다시 시작해야 합니다.
+    subprocess.run(["docker", "compose", "-f", compose_file, "restart", "nginx"], check=True)
+
+def wait_healthy(base_url, timeout=120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(base_url.rstrip("/") + HEALTH_PATH, timeout=5) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(1)
+    raise TimeoutError(f"{base_url}: {timeout:.0f}초 안에 준비되지 않았습니다.")
+
+
+# --- CLI ---
+def _print_table(rows):
+    columns = ("replicas", "users", "reruns_per_s", "p50_ms", "p95_ms", "errors", "sticky_violations", "replicas_seen")
+    print("  ".join(f"{c:>17}" for c in columns))
+    for row in rows:
+        print("  ".join(f"{str(row.get(c, '-')):>17}" for c in columns))
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost", help="nginx 주소")
+    parser.add_argument("--users", type=int, default=30, help="동시 가상 상담원 수")
+    parser.add_argument("--duration", type=float, default=30.0, help="측정 시간(초)")
+    parser.add_argument("--scale", help="쉼표로 구분한 레플리카 수 목록 (예: 1,2,4). docker compose 필요")
+    parser.add_argument("--compose-file", default="docker-compose.yml")
+    parser.add_argument("--output", help="결과를 저장할 JSON 파일")
+    args = parser.parse_args(argv)
+
+    rows = []
+    for replicas in [int(n) for n in args.scale.split(",")] if args.scale else [None]:
+        if replicas is not None:
+            scale_replicas(replicas, args.compose_file)
+        wait_healthy(args.url)
+        row = asyncio.run(run_load(args.url, args.users, args.duration))
+        row["replicas"] = replicas if replicas is not None else "-"
+        rows.append(row)
+        _print_table(rows[-1:] if len(rows) > 1 else rows)
+
+    if len(rows) > 1:
+        print()
+        _print_table(rows)
+        base = rows[0]["reruns_per_s"] or 1.0
+        for row in rows[1:]:
+            print(f"레플리카 {row['replicas']}개: 처리량 {row['reruns_per_s'] / base:.2f}배")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
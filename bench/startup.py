@@ -0,0 +1,112 @@
+"""서버 시작 시간(콜드 스타트) 측정과 예산 확인.
+
+합성 데이터(bench/benchmark.py와 같은 형식)를 준비한 폴더에서 서버를 띄우고 다음을 잽니다.
+
+- healthy    : 프로세스 시작 ~ 헬스 체크(/_stcore/health) 통과. nginx가 레플리카를 받기 시작하는 시점
+- first_page : 그 직후 첫 세션의 첫 화면 실행(웹소켓 rerun 한 번)
+- ready      : healthy + first_page. 예산(--budget, 기본 STARTUP_BUDGET_SECONDS 또는 30초)과 비교합니다
+
+방식은 운영용 `python serve.py`(미리 읽기)와 `streamlit run app.py`(기존)입니다. 데이터 변환
+(guide.json 마이그레이션, 벡터 색인 파일 생성)은 첫 배포 한 번뿐이므로, 측정 전에 한 번 띄워 두고
+재시작 상황을 잽니다. serve 방식의 ready가 예산을 넘으면 종료 코드 1을 반환합니다.
+
+사용법 (저장소 최상위에서):
+    python bench/startup.py --sizes 1000,10000 --repeat 3
+필요 패키지: streamlit, websockets
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import benchmark  # noqa: E402
+import loadtest  # noqa: E402
+
+# --- 상수 정의 ---
+DEFAULT_BUDGET = float(os.environ.get("STARTUP_BUDGET_SECONDS", "30"))
+PORT = 8597
+START_TIMEOUT = 600.0
+MODES = {
+    "serve": [sys.executable, "serve.py", f"--server.port={PORT}"],
+    "streamlit": [sys.executable, "-m", "streamlit", "run", "app.py", f"--server.port={PORT}",
+                  "--server.headless=true", "--browser.gatherUsageStats=false"],
+}
+
+
+# --- 측정 ---
+def _wait_healthy(base_url, process, timeout=START_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"서버가 종료되었습니다 (종료 코드 {process.returncode})")
+        try:
+            with urllib.request.urlopen(base_url + loadtest.HEALTH_PATH, timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"{timeout:.0f}초 안에 준비되지 않았습니다.")
+
+async def _first_page(base_url):
+    ws = await loadtest._connect(loadtest._stream_url(base_url), "")
+    try:
+        await asyncio.wait_for(loadtest._rerun(ws, loadtest._rerun_message()), loadtest.RERUN_TIMEOUT)
+    finally:
+        await ws.close()
+
+def measure(workdir, mode):
+    """workdir에서 mode로 서버를 한 번 띄워 {"healthy", "first_page", "ready"}(초)를 반환합니다."""
+    base_url = f"http://localhost:{PORT}"
+    env = dict(os.environ, CHATBOT_PROVIDER="fake", CHATBOT_FAKE_DELAY="0")
+    started = time.perf_counter()
+    process = subprocess.Popen(MODES[mode], cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_healthy(base_url, process)
+        healthy = time.perf_counter() - started
+        page_started = time.perf_counter()
+        asyncio.run(_first_page(base_url))
+        first_page = time.perf_counter() - page_started
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return {"healthy": healthy, "first_page": first_page, "ready": healthy + first_page}
+
+
+# --- CLI ---
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000", help="쉼표로 구분한 데이터 크기 (상담 N개 + 가이드 N개)")
+    parser.add_argument("--repeat", type=int, default=3, help="방식별 반복 횟수 (중앙값을 출력)")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET, help="serve 방식 ready 예산(초)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=benchmark.DEFAULT_DATA_DIR, help="생성한 원본 데이터를 보관할 폴더")
+    args = parser.parse_args(argv)
+
+    over_budget = False
+    print(f"{'size':>8}  {'mode':>10}  {'healthy_s':>10}  {'first_page_s':>12}  {'ready_s':>8}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        workdir = benchmark.prepare_workdir(args.data_dir, size, args.seed)
+        try:
+            measure(workdir, "serve") # 첫 배포 변환(마이그레이션, 색인 파일)을 미리 끝내 둡니다.
+            for mode in MODES:
+                runs = [measure(workdir, mode) for _ in range(args.repeat)]
+                row = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+                print(f"{size:>8}  {mode:>10}  {row['healthy']:>10.2f}  {row['first_page']:>12.2f}  {row['ready']:>8.2f}", flush=True)
+                if mode == "serve" and row["ready"] > args.budget:
+                    over_budget = True
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    if over_budget:
+        print(f"예산 초과: serve 방식 ready가 {args.budget:g}초를 넘었습니다.")
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,3 +1,4 @@
 # Date: 20250612
+# 개발용: 소스를 연결하고 파일 변경 시 다시 실행합니다. 운영 이미지는 serve.py로 시작합니다 (Dockerfile CMD).
 docker build -t db-app:test . 
-docker run -it -p 8501:8501 -v ${PWD}/app:/app --name db-app-01 db-app:test bash
\ No newline at end of file
+docker run -it -p 8501:8501 -v ${PWD}/app:/app/app --name db-app-01 db-app:test streamlit run app.py --server.address=0.0.0.0 --server.runOnSave=true
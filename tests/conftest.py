@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 앱 모듈은 app/ 안에서 평면 import(import service 등)로 서로를 불러옵니다.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
@@ -0,0 +1,41 @@
+import answer_cache
+
+
+def test_get_defers_stats_until_flush(tmp_path):
+    path = str(tmp_path / "answer_cache.db")
+    answer_cache.put(path, "환불은 어떻게 하나요?", "마이페이지에서 신청하세요.")
+    conn = answer_cache._connect(path)
+    changes = conn.total_changes
+    assert answer_cache.get(path, "환불은 어떻게 하나요") == {"response": "마이페이지에서 신청하세요.", "source": None}
+    assert answer_cache.get(path, "배송 조회") is None
+    stats = answer_cache.stats(path) # 아직 쓰지 않은 횟수를 더해서 보여줍니다.
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert conn.total_changes == changes # 조회와 stats()는 쓰지 않습니다.
+    assert answer_cache._stat(conn, "hits") == 0
+    answer_cache.flush(path)
+    assert (answer_cache._stat(conn, "hits"), answer_cache._stat(conn, "misses")) == (1, 1)
+    assert answer_cache.stats(path)["hits"] == 1
+
+
+def test_entries_count_follows_put_evict_and_invalidate(tmp_path, monkeypatch):
+    monkeypatch.setattr(answer_cache, "MAX_ENTRIES", 2)
+    path = str(tmp_path / "answer_cache.db")
+    answer_cache.put(path, "질문 1", "답변 1", guide_ids=["g1"])
+    answer_cache.put(path, "질문 1", "답변 1 (수정)", guide_ids=["g1"])
+    answer_cache.put(path, "질문 2", "답변 2")
+    answer_cache.put(path, "질문 3", "답변 3")
+    assert answer_cache.stats(path)["entries"] == 2
+    answer_cache.invalidate_guides(path, removals=["g1"]) # 질문 1은 이미 밀려났습니다.
+    answer_cache.invalidate_guides(path, upserts=[{"prompt": "질문 2"}])
+    conn = answer_cache._connect(path)
+    assert answer_cache.stats(path)["entries"] == conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] == 1
+
+
+def test_expired_entry_is_deleted_on_flush(tmp_path, monkeypatch):
+    path = str(tmp_path / "answer_cache.db")
+    answer_cache.put(path, "질문", "답변")
+    monkeypatch.setattr(answer_cache, "TTL_SECONDS", -1)
+    assert answer_cache.get(path, "질문") is None
+    assert answer_cache.stats(path)["entries"] == 1 # 지우는 것도 flush 때 합니다.
+    answer_cache.flush(path)
+    assert answer_cache.stats(path)["entries"] == 0
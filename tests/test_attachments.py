@@ -0,0 +1,31 @@
+import io
+import os
+import stat
+
+import attachments
+
+
+class _Upload(io.BytesIO):
+    name = "manual.pdf"
+
+
+def test_saved_attachment_is_readable_by_others(tmp_path):
+    fields = attachments.save_upload(_Upload(b"attachment body"), str(tmp_path))
+    mode = os.stat(fields["attachment_path"]).st_mode
+    assert mode & stat.S_IROTH
+    assert not mode & stat.S_IWOTH
+
+
+def test_spooled_attachment_is_readable_by_others(tmp_path):
+    spooled = attachments.spool_upload(_Upload(b"spooled body"), str(tmp_path))
+    fields = attachments.save_spooled(spooled, attachments.spooled_fields(spooled, str(tmp_path)))
+    assert os.stat(fields["attachment_path"]).st_mode & stat.S_IROTH
+    assert fields["attachment_size"] == len(b"spooled body")
+
+
+def test_save_spooled_is_safe_to_repeat(tmp_path):
+    spooled = attachments.spool_upload(_Upload(b"spooled body"), str(tmp_path))
+    fields = attachments.spooled_fields(spooled, str(tmp_path))
+    attachments.save_spooled(spooled, fields)
+    assert attachments.save_spooled(spooled, fields) == fields
+    assert os.path.exists(fields["attachment_path"])
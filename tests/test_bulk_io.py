@@ -0,0 +1,49 @@
+import io
+import json
+
+import pytest
+
+import bulk_io
+import guide_store
+
+
+def test_import_guides_skips_repeated_id_in_same_batch(tmp_path):
+    db_path = str(tmp_path / "guide.db")
+    guide_store.init_store(db_path)
+    rows = [
+        {"id": "g1", "prompt": "질문 1", "response": "답변 1"},
+        {"id": "g1", "prompt": "질문 1 (다시)", "response": "답변 1 (다시)"},
+        {"id": "g2", "prompt": "질문 2", "response": "답변 2"},
+    ]
+    source = io.BytesIO("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8"))
+    result = bulk_io.import_guides(source, "jsonl", db_path)
+    assert (result["imported"], result["skipped"], result["error_count"]) == (2, 1, 0)
+    assert guide_store.get_guide(db_path, "g1")["prompt"] == "질문 1"
+
+
+def test_guide_export_import_round_trip_keeps_attachment_fields(tmp_path):
+    source_db = str(tmp_path / "source.db")
+    guide_store.init_store(source_db)
+    attachment = {
+        "attachment_path": "/data/attachments/sha256/ab/" + "ab" * 32, "attachment_name": "매뉴얼.pdf",
+        "attachment_sha256": "ab" * 32, "attachment_size": 1234,
+    }
+    guide_store.add_guides(source_db, [
+        dict({"id": "g1", "prompt": "질문 1", "response": "답변 1"}, **attachment),
+        {"id": "g2", "prompt": "질문 2", "response": "답변 2"},
+    ])
+    for fmt in ("csv", "jsonl"):
+        out = io.BytesIO()
+        bulk_io.export_guides(source_db, out, fmt)
+        out.seek(0)
+        db_path = str(tmp_path / f"{fmt}.db")
+        guide_store.init_store(db_path)
+        assert bulk_io.import_guides(out, fmt, db_path)["imported"] == 2
+        imported = guide_store.get_guide(db_path, "g1")
+        assert {key: imported.get(key) for key in attachment} == attachment
+        assert "attachment_name" not in guide_store.get_guide(db_path, "g2")
+
+
+def test_legacy_xls_is_rejected_as_unknown_format():
+    with pytest.raises(ValueError, match="지원하지 않는 형식"):
+        bulk_io.detect_format("가이드.xls")
@@ -0,0 +1,55 @@
+import guide_dedup
+import guide_store
+
+REFUND = "환불 신청은 마이페이지 주문 내역에서 해당 주문을 선택한 뒤 환불 요청 버튼을 누르면 됩니다 영업일 기준 삼일 이내 처리"
+
+
+def _guide(guide_id, response):
+    return {"id": guide_id, "prompt": "환불 방법", "response": response}
+
+
+def _chain():
+    """A~B, B~C는 0.7 이상이고 A~C는 0.7 미만인 가이드 세 개."""
+    a = _guide("a", REFUND)
+    b = _guide("b", REFUND + " 결제 수단으로 돌려드립니다")
+    c = _guide("c", REFUND + " 결제 수단으로 돌려드립니다 카드사 사정에 따라 며칠 더 걸릴 수 있습니다")
+    return a, b, c
+
+
+def test_groups_only_hold_duplicates_of_the_kept_guide():
+    index = guide_dedup.GuideDedupIndex()
+    index.upsert(_chain())
+    newest_first = {"a": 1, "b": 2, "c": 3}
+    assert index.groups(threshold=0.7, rank=newest_first.get) == [["c", "b"]] # a는 c와 중복이 아닙니다.
+    oldest_first = {"a": 3, "b": 2, "c": 1}
+    assert index.groups(threshold=0.7, rank=oldest_first.get) == [["a", "b"]]
+
+
+def test_find_ignores_case_and_spacing_but_not_different_guides():
+    index = guide_dedup.GuideDedupIndex()
+    index.upsert([_guide("refund", REFUND), _guide("login", "비밀번호를 다섯 번 틀리면 계정이 잠기며 본인 인증 후 해제할 수 있습니다")])
+    draft = {"prompt": "환불  방법", "response": REFUND.replace(" ", "  ").upper()}
+    assert index.find(draft) == [("refund", 1.0)]
+    assert index.find({"prompt": "배송 조회", "response": "주문 내역에서 운송장 번호를 확인하세요"}) == []
+    assert index.find(_guide("refund", REFUND)) == [] # 자기 자신은 빼고 찾습니다.
+
+
+def test_find_follows_updates_and_removals_in_sorted_and_tail_rows(monkeypatch):
+    monkeypatch.setattr(guide_dedup, "MAX_UNSORTED", 2)
+    index = guide_dedup.GuideDedupIndex()
+    a, b, c = _chain()
+    index.upsert([a])
+    index.upsert([_guide(f"other{i}", f"관련 없는 안내 {i}번 문서입니다 " * 3) for i in range(3)]) # 정렬을 일으킵니다.
+    index.upsert([c])
+    assert [guide_id for guide_id, _ in index.find(b, threshold=0.7)] == ["a", "c"]
+    index.remove(["a"])
+    index.upsert([_guide("c", "전혀 다른 답변으로 고쳤습니다 결제 수단 변경은 설정 메뉴에서")])
+    assert index.find(b, threshold=0.7) == []
+
+
+def test_store_finds_duplicates_before_saving(tmp_path):
+    db_path = str(tmp_path / "guide.db")
+    guide_store.init_store(db_path)
+    saved = guide_store.add_guides(db_path, [_guide(guide_store.new_guide_id(), REFUND)])[0]
+    duplicates = guide_store.find_duplicates(db_path, {"prompt": "환불 방법?", "response": REFUND + "."})
+    assert [(guide["id"], similarity >= guide_dedup.DUPLICATE_THRESHOLD) for guide, similarity in duplicates] == [(saved["id"], True)]
@@ -0,0 +1,63 @@
+import guide_search
+
+
+def _guide(guide_id, prompt, response="", cause="", created_at="2025-01-01T09:00:00"):
+    return {"id": guide_id, "prompt": prompt, "response": response, "cause": cause, "created_at": created_at}
+
+
+def _index(guides):
+    index = guide_search.GuideSearchIndex(lambda guide: guide["id"])
+    for guide in guides:
+        index.upsert(guide)
+    return index
+
+
+def test_tokenize_uses_bigrams_for_hangul_and_words_otherwise():
+    assert guide_search.tokenize("비밀번호 OTP 2단계") == ["비밀", "밀번", "번호", "otp", "2단", "단계"]
+    assert guide_search.tokenize("Ｌｏｇｉｎ!") == ["login"] # NFKC, 소문자
+
+
+def test_prompt_match_ranks_above_response_match():
+    index = _index([
+        _guide("answer", "결제 오류", response="환불은 마이페이지에서 신청합니다."),
+        _guide("question", "환불 신청 방법", response="고객센터로 문의하세요."),
+        _guide("other", "배송 조회", response="주문 내역에서 확인합니다."),
+    ])
+    total, hits = index.search("환불 신청")
+    assert total == 2
+    assert [doc_id for doc_id, _ in hits] == ["question", "answer"]
+
+
+def test_rare_terms_weigh_more_and_ties_go_to_newest():
+    index = _index([
+        _guide("old", "로그인 오류", created_at="2024-01-01T00:00:00"),
+        _guide("new", "로그인 오류", created_at="2025-01-01T00:00:00"),
+        _guide("rare", "로그인 잠금"),
+    ] + [_guide(f"filler{i}", f"오류 안내 {i}") for i in range(5)])
+    _, hits = index.search("로그인 잠금")
+    assert hits[0][0] == "rare"
+    assert [doc_id for doc_id, _ in hits[1:3]] == ["new", "old"]
+
+
+def test_paging_and_updates():
+    index = _index([_guide(f"g{i}", f"비밀번호 변경 {i}", created_at=f"2025-01-{i + 1:02d}") for i in range(5)])
+    total, first = index.search("비밀번호", limit=2)
+    _, second = index.search("비밀번호", limit=2, offset=2)
+    assert total == 5
+    assert [doc_id for doc_id, _ in first + second] == ["g4", "g3", "g2", "g1"]
+    index.upsert(_guide("g4", "주소 변경"))
+    index.remove("g3")
+    total, hits = index.search("비밀번호")
+    assert (total, [doc_id for doc_id, _ in hits]) == (3, ["g2", "g1", "g0"])
+    assert index.search("주소")[1][0][0] == "g4"
+    assert index.search("") == (0, [])
+
+
+def test_apply_changes_skips_index_from_other_version():
+    source = "test-guide-search.db"
+    guide_search.rebuild(source, 1, [_guide("g1", "환불 방법")], lambda guide: guide["id"])
+    guide_search.apply_changes(source, 1, 2, upserts=[_guide("g2", "환불 기간")])
+    assert guide_search.get_index(source, 2, lambda: [], None).search("환불")[0] == 2
+    guide_search.apply_changes(source, 5, 6, upserts=[_guide("g3", "환불 안내")]) # 다른 프로세스의 쓰기가 끼어듦
+    rebuilt = guide_search.get_index(source, 6, lambda: [_guide("g9", "환불 정책")], lambda guide: guide["id"])
+    assert [doc_id for doc_id, _ in rebuilt.search("환불")[1]] == ["g9"]
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+import history_store
+
+
+def _messages(n):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"메시지 {i} " + "가" * (i % 5)} for i in range(n)]
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    path = str(tmp_path / "history20250101_090000.jsonl")
+    history_store.create_history(path, {"title": "상담", "counselor_name": "김민준"})
+    return path
+
+
+@pytest.mark.parametrize("block_size", [7, 64, 64 * 1024]) # 한 줄보다 작은 블록, 여러 줄 블록, 기본값
+def test_read_last_messages_across_block_boundaries(log_path, monkeypatch, block_size):
+    monkeypatch.setattr(history_store, "READ_BLOCK_SIZE", block_size)
+    messages = _messages(25)
+    history_store.append_messages(log_path, messages[:10])
+    history_store.update_header(log_path, title="중간에 바꾼 제목") # 메시지 사이의 header 레코드는 건너뜁니다.
+    history_store.append_messages(log_path, messages[10:])
+    assert history_store.read_last_messages(log_path, 5) == messages[-5:]
+    assert history_store.read_last_messages(log_path, 2, skip=14) == messages[9:11]
+    assert history_store.read_last_messages(log_path, 10, skip=20) == messages[:5] # 앞쪽이 모자라면 있는 만큼
+    assert history_store.read_last_messages(log_path, 3, skip=25) == []
+    assert history_store.read_last_messages(log_path, 100) == messages
+
+
+def test_truncated_last_line_is_ignored(log_path):
+    messages = _messages(3)
+    history_store.append_messages(log_path, messages)
+    with open(log_path, "ab") as f:
+        f.write(b'{"type":"message","role":"user","cont') # 쓰기 도중 끊긴 줄
+    assert history_store.read_last_messages(log_path, 2) == messages[1:]
+    assert history_store.load_history(log_path)["messages"] == messages
+
+
+def test_later_header_records_override_earlier_ones(log_path):
+    history_store.append_messages(log_path, _messages(2))
+    assert history_store.update_header(log_path, expected_rev=0, title="새 제목") == 1
+    header, message_count = history_store.scan_metadata(log_path)
+    assert (header["title"], header["counselor_name"], header["rev"], message_count) == ("새 제목", "김민준", 1, 2)
+    assert history_store.load_history(log_path)["title"] == "새 제목"
+
+
+def test_compact_merges_headers_without_losing_messages(log_path):
+    messages = _messages(4)
+    history_store.append_messages(log_path, messages)
+    for i in range(3):
+        history_store.update_header(log_path, title=f"제목 {i}")
+    assert history_store.compact(log_path) > 0
+    with open(log_path, encoding="utf-8") as f:
+        types = [json.loads(line)["type"] for line in f]
+    assert types == ["header"] + ["message"] * 4
+    assert history_store.load_history(log_path)["messages"] == messages
+
+
+def test_import_legacy_keeps_original(tmp_path):
+    legacy = tmp_path / "history20250101_100000.json"
+    legacy.write_text(json.dumps({"title": "예전 상담", "messages": _messages(3)}, ensure_ascii=False), encoding="utf-8")
+    log_path = history_store.import_legacy(str(legacy))
+    assert log_path.endswith(".jsonl")
+    assert (tmp_path / "history20250101_100000.json.imported").exists()
+    assert history_store.read_last_messages(log_path, 3) == _messages(3)
+    assert history_store.import_legacy(str(legacy)) == log_path # 이미 옮겼으면 그 경로
@@ -0,0 +1,117 @@
+import time
+
+import pytest
+
+import jobs
+from sqlite_util import connect
+
+
+class Crash(BaseException):
+    """실행 도중 프로세스가 죽은 것처럼 run_job()이 결과를 기록하지 못하게 합니다."""
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.db")
+
+
+@pytest.fixture(autouse=True)
+def test_handlers(monkeypatch):
+    monkeypatch.setattr(jobs, "_handlers", {})
+
+
+def _set(db_path, job_id, **fields):
+    columns = ", ".join(f"{name} = ?" for name in fields)
+    connect(db_path).execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+
+def test_job_is_claimed_once(db_path):
+    job_id = jobs.enqueue(db_path, "noop", {"n": 1})
+    job = jobs._claim(db_path)
+    assert (job["id"], job["payload"]) == (job_id, {"n": 1})
+    assert jobs._claim(db_path) is None
+    running = jobs.get(db_path, job_id)
+    assert (running["status"], running["node"], running["attempts"]) == ("running", jobs.NODE, 1)
+
+
+def test_other_node_job_is_claimed_only_after_orphan_seconds(db_path):
+    job_id = jobs.enqueue(db_path, "noop")
+    _set(db_path, job_id, node="other-replica")
+    assert jobs._claim(db_path) is None
+    _set(db_path, job_id, created_at=time.time() - jobs.ORPHAN_SECONDS - 1) # 맡긴 프로세스가 가져가지 않았습니다.
+    assert jobs._claim(db_path)["id"] == job_id
+    cli_job_id = jobs.enqueue(db_path, "noop", local=False)
+    assert jobs._claim(db_path)["id"] == cli_job_id # 프로세스를 지정하지 않은 작업은 바로
+
+
+def test_run_job_records_result_and_error(db_path):
+    jobs.handler("add")(lambda payload, progress: payload["a"] + payload["b"])
+
+    @jobs.handler("broken")
+    def broken(payload, progress):
+        raise ValueError("잘못된 입력")
+
+    done_id = jobs.enqueue(db_path, "add", {"a": 1, "b": 2})
+    jobs.run_job(db_path, jobs._claim(db_path))
+    failed_id = jobs.enqueue(db_path, "broken")
+    jobs.run_job(db_path, jobs._claim(db_path))
+    unknown_id = jobs.enqueue(db_path, "missing")
+    jobs.run_job(db_path, jobs._claim(db_path))
+    done, failed, unknown = jobs.get_many(db_path, [done_id, failed_id, unknown_id])
+    assert (done["status"], done["progress"], done["result"]) == ("done", 1.0, 3)
+    assert (failed["status"], failed["error"], failed["error_type"]) == ("failed", "잘못된 입력", "ValueError")
+    assert (unknown["status"], unknown["error_type"]) == ("failed", "LookupError")
+
+
+def test_heartbeat_runs_while_handler_is_silent(db_path, monkeypatch):
+    monkeypatch.setattr(jobs, "HEARTBEAT_SECONDS", 0.05)
+    beats = []
+
+    @jobs.handler("slow")
+    def slow(payload, progress):
+        for _ in range(3):
+            time.sleep(0.15)
+            beats.append(jobs.get(db_path, job_id)["heartbeat"])
+
+    job_id = jobs.enqueue(db_path, "slow")
+    jobs.run_job(db_path, jobs._claim(db_path))
+    assert beats == sorted(beats) and beats[0] < beats[-1]
+
+
+def test_stale_running_job_is_retried_then_failed(db_path, monkeypatch):
+    monkeypatch.setattr(jobs, "MAX_ATTEMPTS", 2)
+    job_id = jobs.enqueue(db_path, "noop")
+    for attempt in (1, 2):
+        assert jobs._claim(db_path)["id"] == job_id
+        assert jobs.get(db_path, job_id)["attempts"] == attempt
+        _set(db_path, job_id, heartbeat=time.time() - jobs.STALE_SECONDS - 1) # heartbeat가 멈췄습니다.
+    assert jobs._claim(db_path) is None
+    failed = jobs.get(db_path, job_id)
+    assert (failed["status"], failed["attempts"]) == ("failed", 2)
+    assert failed["finished_at"] is not None
+
+
+def test_retry_resumes_from_checkpoint(db_path):
+    calls = []
+
+    @jobs.handler("move")
+    def move(payload, progress):
+        done = payload.get("done", [])
+        calls.append(list(done))
+        for name in ("a", "b"):
+            if name in done:
+                continue
+            done.append(name)
+            jobs.checkpoint(dict(payload, done=done))
+            if len(calls) == 1:
+                raise Crash()
+        return done
+
+    job_id = jobs.enqueue(db_path, "move", {"names": ["a", "b"]})
+    with pytest.raises(Crash):
+        jobs.run_job(db_path, jobs._claim(db_path))
+    assert jobs.get(db_path, job_id)["payload"] == {"names": ["a", "b"], "done": ["a"]}
+    _set(db_path, job_id, heartbeat=time.time() - jobs.STALE_SECONDS - 1)
+    jobs.run_job(db_path, jobs._claim(db_path))
+    assert calls == [[], ["a"]]
+    assert jobs.get(db_path, job_id)["result"] == ["a", "b"]
@@ -0,0 +1,16 @@
+import os
+
+import pytest
+
+import service
+
+
+@pytest.mark.parametrize("mode", ["jsonl", "json"])
+def test_create_history_twice_in_same_second(tmp_path, monkeypatch, mode):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(service, "HISTORY_STORAGE_MODE", mode)
+    os.makedirs(service.HISTORY_DIR)
+    first = service.create_history("담당자A")
+    second = service.create_history("담당자A")
+    assert first != second
+    assert os.path.exists(first) and os.path.exists(second)
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+import history_store
+import working_set
+
+
+@pytest.fixture(autouse=True)
+def no_timer_flush(monkeypatch):
+    # 디바운스 타이머가 테스트 도중 기록하지 않도록 충분히 늦춥니다.
+    monkeypatch.setattr(working_set, "FLUSH_DELAY", 60.0)
+
+
+class Writer:
+    def __init__(self, failures=0):
+        self.batches, self.failures = [], failures
+
+    def __call__(self, filepath, messages):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("디스크 오류")
+        self.batches.append(list(messages))
+
+
+def _message(i):
+    return {"role": "user", "content": f"질문 {i}"}
+
+
+def test_messages_are_batched_until_flush_batch(tmp_path):
+    path, writer = str(tmp_path / "history1.jsonl"), Writer()
+    for i in range(working_set.FLUSH_BATCH - 1):
+        working_set.add(path, [_message(i)], writer)
+    assert writer.batches == []
+    assert working_set.pending_count(path) == working_set.FLUSH_BATCH - 1
+    working_set.add(path, [_message(working_set.FLUSH_BATCH)], writer)
+    assert [len(batch) for batch in writer.batches] == [working_set.FLUSH_BATCH]
+    assert working_set.pending_count(path) == 0
+
+
+def test_old_pending_messages_are_written_after_max_pending_age(tmp_path):
+    path, writer = str(tmp_path / "history2.jsonl"), Writer()
+    working_set.add(path, [_message(1)], writer)
+    with working_set.locked(path) as active:
+        active.first_pending_at -= working_set.MAX_PENDING_AGE # 가장 오래된 메시지가 그만큼 기다렸습니다.
+    working_set.add(path, [_message(2)], writer)
+    assert writer.batches == [[_message(1), _message(2)]]
+
+
+def test_failed_write_keeps_messages_and_retries(tmp_path):
+    path, writer = str(tmp_path / "history3.jsonl"), Writer(failures=1)
+    working_set.add(path, [_message(1)], writer)
+    with pytest.raises(OSError):
+        working_set.flush(path)
+    with working_set.locked(path) as active:
+        assert active.pending == [_message(1)]
+        assert active.timer is not None # 잠시 뒤 다시 시도합니다.
+    assert working_set.flush(path) == 1
+    assert writer.batches == [[_message(1)]]
+
+
+def test_flush_does_not_recreate_removed_history(tmp_path):
+    path = str(tmp_path / "history4.jsonl")
+    history_store.create_history(path, {"title": "상담"})
+    working_set.add(path, [_message(1)], history_store.append_messages)
+    os.remove(path) # 다른 레플리카가 보관했습니다.
+    with pytest.raises(FileNotFoundError):
+        working_set.flush(path)
+    assert not os.path.exists(path)
+    with working_set.locked(path) as active:
+        assert active.pending == [_message(1)]
+        assert active.timer is None